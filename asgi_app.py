@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""BJJ Notebook - ASGI entry point with async chat endpoints.
+
+Serves /api/chat and /api/chat/stream on an event loop with the async OpenAI
+client, so a waiting chat holds no worker thread and one process can keep
+hundreds of chats in flight.  Every other path is handed to the Flask app,
+which needs the asgiref package.  Run with any ASGI server, for example:
+
+    uvicorn asgi_app:app --port 5000
+"""
+
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from src.chat_handler import ChatError, create_async_chat_handler
+from src.conversation_store import ConversationStore
+from web_app import (STREAM_ERROR_EVENT, app as flask_app, conversation_store, chat_retrievers,
+                     chat_tools)
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+CHAT_PATHS = ("/api/chat", "/api/chat/stream")
+
+
+async def _read_body(receive):
+    """Read the whole request body."""
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    """Send a complete JSON response."""
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())] + list(headers)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _session_serializer():
+    """Return the serializer Flask signs its session cookie with."""
+    return flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+def _get_conversation_id(scope):
+    """Return (conversation id, Set-Cookie headers) for the request.
+
+    The id is read from the signed Flask session cookie, so a chat started on
+    the Flask pages carries on here; a new id is issued (and the cookie
+    re-signed with the rest of the session kept) if there is none.
+    """
+    serializer = _session_serializer()
+    cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+    session = {}
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            cookie = SimpleCookie(value.decode("latin-1")).get(cookie_name)
+            if cookie is not None:
+                try:
+                    session = serializer.loads(
+                        cookie.value,
+                        max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+                except Exception:
+                    session = {}
+    if session.get("chat_id"):
+        return session["chat_id"], []
+
+    session["chat_id"] = ConversationStore.new_id()
+    attributes = [f"{cookie_name}={serializer.dumps(session)}", "Path=/", "HttpOnly"]
+    if flask_app.config["SESSION_COOKIE_SECURE"]:
+        attributes.append("Secure")
+    if flask_app.config["SESSION_COOKIE_SAMESITE"]:
+        attributes.append(f"SameSite={flask_app.config['SESSION_COOKIE_SAMESITE']}")
+    return session["chat_id"], [(b"set-cookie", "; ".join(attributes).encode("latin-1"))]
+
+
+async def _chat(scope, receive, send):
+    """Handle /api/chat and /api/chat/stream like the Flask routes do."""
+    if scope["method"] != "POST":
+        await _send_json(send, 405, {'error': 'Method not allowed', 'success': False})
+        return
+
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        user_message = json.loads(body or b"{}").get('message', '').strip()
+    except (ValueError, AttributeError):
+        await _send_json(send, 400, {'error': 'Invalid JSON body', 'success': False})
+        return
+    if not user_message:
+        await _send_json(send, 400, {'error': 'Message cannot be empty'})
+        return
+
+    try:
+        conversation_id, cookie_headers = _get_conversation_id(scope)
+        # The store may read from its SQLite spill file, so it is used off the loop
+        turns = await asyncio.to_thread(conversation_store.get, conversation_id)
+        chat_handler = create_async_chat_handler(turns, retrievers=chat_retrievers,
+                                                 tools=chat_tools)
+    except Exception as e:
+        flask_app.logger.error(f"Chat error: {str(e)}")
+        await _send_json(send, 500, {
+            'error': 'An error occurred while processing your request',
+            'success': False
+        })
+        return
+
+    if scope["path"] == "/api/chat":
+        try:
+            response = await chat_handler.chat(user_message)
+        except ChatError as e:
+            flask_app.logger.error(f"Chat error: {str(e)}")
+            await _send_json(send, 502, {
+                'error': 'The assistant could not answer, please try again',
+                'success': False
+            }, cookie_headers)
+            return
+        await asyncio.to_thread(conversation_store.append, conversation_id, user_message, response)
+        await _send_json(send, 200, {'response': response, 'timings': chat_handler.last_timings,
+                                     'success': True}, cookie_headers)
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no")] + cookie_headers
+    })
+    parts = []
+    tokens = chat_handler.chat_stream(user_message)
+    try:
+        async for token in tokens:
+            parts.append(token)
+            event = f"data: {json.dumps({'token': token})}\n\n"
+            await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+    except ChatError as e:
+        # The partial answer is not stored, so the user can send it again
+        flask_app.logger.error(f"Chat error: {str(e)}")
+        await send({"type": "http.response.body", "body": STREAM_ERROR_EVENT.encode()})
+        return
+    except Exception:
+        # A bug rather than the model failing; the client still gets an ending
+        flask_app.logger.exception("Chat stream failed")
+        await send({"type": "http.response.body", "body": STREAM_ERROR_EVENT.encode()})
+        return
+    finally:
+        # Closes the OpenAI stream too if the client went away mid-answer
+        await tokens.aclose()
+    await asyncio.to_thread(conversation_store.append, conversation_id, user_message,
+                            "".join(parts))
+    await send({"type": "http.response.body", "body": b"event: done\ndata: {}\n\n"})
+
+
+_flask_asgi = WsgiToAsgi(flask_app) if WsgiToAsgi is not None else None
+
+
+async def app(scope, receive, send):
+    """ASGI application: async chat endpoints, everything else via Flask."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["path"] in CHAT_PATHS:
+        await _chat(scope, receive, send)
+    elif _flask_asgi is not None:
+        await _flask_asgi(scope, receive, send)
+    else:
+        await _send_json(send, 404, {
+            'error': 'Only the chat endpoints are served without asgiref installed',
+            'success': False
+        })
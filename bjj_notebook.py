@@ -3,14 +3,23 @@
 
 import sys
 import os
-from src.chat_handler import BJJChatHandler
+import json
+from src.chat_handler import BJJChatHandler, ChatError
+from src.chat_tools import ChatTools
 from src.notes_manager import NotesManager
+from src.note_retrieval import NoteRetriever
+from src.rules_index import RulesIndex
 from src.bjj_reference import (
     get_all_positions,
     get_all_concepts,
     search_techniques,
-    BJJ_TECHNIQUES
+    search_positions,
+    get_techniques_by_sub_category,
+    get_techniques_by_type,
+    find_position_chains,
+    get_chain_positions
 )
+from src.bjj_rules import check_legality, get_legality_matrix, get_rule_divisions
 
 class BJJNotebook:
     """Main application class for BJJ Notebook."""
@@ -25,7 +34,19 @@ class BJJNotebook:
         """Initialize OpenAI chat handler."""
         if self.chat_handler is None:
             try:
-                self.chat_handler = BJJChatHandler()
+                retriever = NoteRetriever(
+                    self.notes_manager,
+                    k=int(os.getenv("CHAT_NOTES_K", "3")),
+                    max_tokens=int(os.getenv("CHAT_NOTES_TOKENS", "600"))
+                )
+                rules = RulesIndex(
+                    k=int(os.getenv("CHAT_RULES_K", "3")),
+                    max_tokens=int(os.getenv("CHAT_RULES_TOKENS", "500"))
+                )
+                if os.getenv("CHAT_TOOLS", "true").lower() == "true":
+                    self.chat_handler = BJJChatHandler(tools=ChatTools(retriever, rules))
+                else:
+                    self.chat_handler = BJJChatHandler(retrievers=(retriever, rules))
                 print("✓ OpenAI chat initialized successfully!\n")
                 return True
             except Exception as e:
@@ -44,7 +65,8 @@ class BJJNotebook:
         print("  2. Browse BJJ Reference")
         print("  3. Manage Notes")
         print("  4. Search Techniques")
-        print("  5. Exit")
+        print("  5. Competition Rules")
+        print("  6. Exit")
         print()
     
     def chat_menu(self):
@@ -81,9 +103,14 @@ class BJJNotebook:
                 continue
             
             # Get response from AI
+            # Print the response as it streams in
             print("\nBJJ Assistant: ", end="", flush=True)
-            response = self.chat_handler.chat(user_input)
-            print(response)
+            try:
+                for token in self.chat_handler.chat_stream(user_input):
+                    print(token, end="", flush=True)
+                print()
+            except ChatError as e:
+                print(f"\n✗ {e}")
     
     def reference_menu(self):
         """Browse BJJ reference information."""
@@ -93,7 +120,8 @@ class BJJNotebook:
             print("  1. View Positions")
             print("  2. View Key Concepts")
             print("  3. View Techniques by Category")
-            print("  4. Back to Main Menu")
+            print("  4. Find Transition Chains")
+            print("  5. Back to Main Menu")
             print()
             
             choice = input("Select option: ").strip()
@@ -105,6 +133,8 @@ class BJJNotebook:
             elif choice == '3':
                 self.show_techniques()
             elif choice == '4':
+                self.find_chains()
+            elif choice == '5':
                 break
     
     def show_positions(self):
@@ -136,6 +166,7 @@ class BJJNotebook:
         print("  2. Sweeps")
         print("  3. Passes")
         print("  4. Escapes")
+        print("  5. Transitions")
         print()
         
         choice = input("Select category: ").strip()
@@ -148,39 +179,75 @@ class BJJNotebook:
             self.show_category('passes')
         elif choice == '4':
             self.show_category('escapes')
+        elif choice == '5':
+            self.show_category('transitions')
     
     def show_submissions(self):
         """Display submissions."""
-        subs = BJJ_TECHNIQUES['submissions']
         print("\n🔒 Submissions:")
         print("-" * 60)
         
         print("\nChokes:")
-        for tech in subs['chokes']:
+        for tech in get_techniques_by_sub_category('chokes'):
             print(f"  • {tech['name']} (from {tech['position']})")
         
         print("\nArmlocks:")
-        for tech in subs['armlocks']:
+        for tech in get_techniques_by_sub_category('armlocks'):
             print(f"  • {tech['name']} (from {tech['position']})")
         
         print("\nLeglocks:")
-        for tech in subs['leglocks']:
+        for tech in get_techniques_by_sub_category('leglocks'):
             print(f"  • {tech['name']}")
     
     def show_category(self, category):
         """Display techniques from a category."""
-        techniques = BJJ_TECHNIQUES.get(category, [])
+        techniques = get_techniques_by_type(category) or ()
         print(f"\n🎯 {category.title()}:")
         print("-" * 60)
         
         for tech in techniques:
-            if 'from_position' in tech:
+            if 'to_position' in tech:
+                start = tech.get('from_position') or tech.get('position')
+                print(f"  • {tech['name']} (from {start} to {tech['to_position']})")
+            elif 'from_position' in tech:
                 print(f"  • {tech['name']} (from {tech['from_position']})")
             elif 'type' in tech:
                 print(f"  • {tech['name']} ({tech['type']})")
             else:
                 print(f"  • {tech['name']}")
     
+    def find_chains(self):
+        """Show the shortest chains of techniques from one position to another."""
+        print("\n🔀 Transition Chains")
+        print("-" * 60)
+        print("Positions: " + ", ".join(name for _, name in get_chain_positions()))
+        print()
+    
+        start = input("From position: ").strip()
+        goal = input("To position: ").strip()
+        if not start or not goal:
+            print("✗ Both positions are required")
+            return
+        side = input("Your side at the start (top/bottom, Enter for either): ").strip().lower()
+    
+        try:
+            chains = find_position_chains(start, goal, limit=5, start_side=side or None)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return
+    
+        if not chains:
+            print("\nNo chain of techniques in the reference leads there.")
+            return
+    
+        for i, chain in enumerate(chains, 1):
+            first = chain['positions'][0]
+            print(f"\n{i}. {chain['steps']} move(s)")
+            print(f"   {first['name']} ({first['side']})")
+            for techniques, position in zip(chain['moves'], chain['positions'][1:]):
+                print(f"     → {' / '.join(techniques)}")
+                print(f"   {position['name']} ({position['side']})")
+    
     def notes_menu(self):
         """Manage notes."""
         while True:
@@ -191,7 +258,9 @@ class BJJNotebook:
             print("  3. View Note")
             print("  4. Search Notes")
             print("  5. Delete Note")
-            print("  6. Back to Main Menu")
+            print("  6. Import Notes (JSONL)")
+            print("  7. Export Notes (JSONL)")
+            print("  8. Back to Main Menu")
             print()
             
             choice = input("Select option: ").strip()
@@ -207,6 +276,10 @@ class BJJNotebook:
             elif choice == '5':
                 self.delete_note()
             elif choice == '6':
+                self.import_notes()
+            elif choice == '7':
+                self.export_notes()
+            elif choice == '8':
                 break
     
     def create_note(self):
@@ -288,10 +361,10 @@ class BJJNotebook:
             print("-" * 60)
             
             # Show related notes
-            related_notes = self.notes_manager.get_related_notes(note_id)
+            related_notes = self.notes_manager.get_related_notes(note_id, k=5)
             if related_notes:
                 print("\n🔗 Related Notes:")
-                for related in related_notes[:5]:  # Show up to 5 related notes
+                for related in related_notes:
                     print(f"  • {related['title']} (Category: {related['category']})")
                     if related.get('common_tags'):
                         print(f"    Common tags: {', '.join(related['common_tags'])}")
@@ -302,19 +375,19 @@ class BJJNotebook:
     
     def search_notes(self):
         """Search notes."""
-        query = input("\nSearch query: ").strip()
+        query = input("\nSearch query (use OR to match any term): ").strip()
         
         if not query:
             print("✗ Search query cannot be empty")
             return
         
-        results = self.notes_manager.search_notes(query)
+        results = self.notes_manager.search_notes(query, limit=20)
         
         if not results:
             print(f"\n📝 No notes found matching '{query}'")
             return
         
-        print(f"\n📝 Search Results ({len(results)}):")
+        print(f"\n📝 Search Results ({len(results)}, best matches first):")
         print("-" * 60)
         
         for note in results:
@@ -338,23 +411,73 @@ class BJJNotebook:
         except Exception as e:
             print(f"✗ Error deleting note: {e}")
     
+    def import_notes(self):
+        """Import notes from a JSONL file."""
+        path = input("\nPath to JSONL file: ").strip()
+        
+        if not os.path.isfile(path):
+            print(f"✗ File not found: {path}")
+            return
+        
+        imported = failed = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for report in self.notes_manager.import_notes(f):
+                    if report['success']:
+                        imported += 1
+                    else:
+                        failed += 1
+                        print(f"  ✗ Line {report['line']}: {report['error']}")
+        except Exception as e:
+            print(f"✗ Error importing notes: {e}")
+            return
+        
+        print(f"✓ Imported {imported} note(s), {failed} failed")
+    
+    def export_notes(self):
+        """Export all notes to a JSONL file."""
+        path = input("\nExport to file (default: notes.jsonl): ").strip() or "notes.jsonl"
+        
+        count = 0
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for note in self.notes_manager.export_notes():
+                    f.write(json.dumps(note) + "\n")
+                    count += 1
+        except Exception as e:
+            print(f"✗ Error exporting notes: {e}")
+            return
+        
+        print(f"✓ Exported {count} note(s) to {path}")
+    
     def search_techniques_menu(self):
         """Search for techniques."""
         print("\n🔍 Search Techniques")
         print("-" * 60)
         
-        query = input("Enter technique name to search: ").strip()
+        query = input("Enter technique or position name to search: ").strip()
         
         if not query:
             print("✗ Search query cannot be empty")
             return
         
         results = search_techniques(query)
+        positions = search_positions(query)
         
-        if not results:
+        if not results and not positions:
             print(f"\n✗ No techniques found matching '{query}'")
             return
         
+        if positions:
+            print(f"\n🥋 Positions ({len(positions)}):")
+            print("-" * 60)
+            for position in positions:
+                print(f"\n  • {position['name']}")
+                print(f"    Types: {', '.join(position['types'])}")
+        
+        if not results:
+            return
+        
         print(f"\n🎯 Search Results ({len(results)}):")
         print("-" * 60)
         
@@ -368,6 +491,90 @@ class BJJNotebook:
             if 'type' in tech and tech['category'] != 'submissions':
                 print(f"    Type: {tech['type']}")
     
+    def rules_menu(self):
+        """Check technique legality for a division and belt."""
+        while True:
+            print("\n⚖️  Competition Rules")
+            print("-" * 60)
+            print("  1. Show Legality Table")
+            print("  2. Check a Technique or Position")
+            print("  3. Back to Main Menu")
+            print()
+            
+            choice = input("Select option: ").strip()
+            
+            if choice == '1':
+                self.show_legality_table()
+            elif choice == '2':
+                self.check_technique_legality()
+            elif choice == '3':
+                break
+    
+    def select_division_and_belt(self):
+        """Prompt for a division and belt; returns (division, belt) or None."""
+        divisions = list(get_rule_divisions().items())
+        print("\nDivisions:")
+        for i, (key, info) in enumerate(divisions, 1):
+            print(f"  {i}. {info['name']}")
+        
+        choice = input("Select division: ").strip()
+        if not choice.isdigit() or not 1 <= int(choice) <= len(divisions):
+            print("✗ Invalid division")
+            return None
+        division, info = divisions[int(choice) - 1]
+        
+        belt = input(f"Belt ({', '.join(info['belts'])}): ").strip().lower()
+        if belt not in info['belts']:
+            print(f"✗ {belt or 'That'} belt does not compete in {info['name']}")
+            return None
+        return division, belt
+    
+    def show_legality_table(self):
+        """Display every verdict for a division and belt."""
+        selection = self.select_division_and_belt()
+        if not selection:
+            return
+        
+        division, belt = selection
+        print(f"\n⚖️  {get_rule_divisions()[division]['name']}, {belt} belt:")
+        print("-" * 60)
+        
+        for item in get_legality_matrix(division, belt):
+            print(self.format_verdict(item))
+    
+    def check_technique_legality(self):
+        """Check a single technique or position for a division and belt."""
+        selection = self.select_division_and_belt()
+        if not selection:
+            return
+        
+        technique = input("Technique or position: ").strip()
+        if not technique:
+            print("✗ Technique cannot be empty")
+            return
+        
+        try:
+            item = check_legality(selection[0], selection[1], technique)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return
+        
+        print()
+        print(self.format_verdict(item))
+        print(f"    Source: {item['source']}")
+    
+    def format_verdict(self, item):
+        """Format a legality verdict as a line of text."""
+        if item['legal']:
+            line = f"  ✓ {item['name']}: legal"
+        else:
+            line = f"  ✗ {item['name']}: {item['severity'] or 'not allowed'}"
+            if item['penalty']:
+                line += f" ({item['penalty']})"
+        if item['note']:
+            line += f" - {item['note']}"
+        return line
+    
     def run(self):
         """Run the main application loop."""
         print("\n🥋 Welcome to BJJ Notebook!")
@@ -391,6 +598,8 @@ class BJJNotebook:
             elif choice == '4':
                 self.search_techniques_menu()
             elif choice == '5':
+                self.rules_menu()
+            elif choice == '6':
                 print("\n👋 Thank you for using BJJ Notebook! Train hard!")
                 self.running = False
             else:
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""BJJ Notebook - Validate the reference dataset and compile its snapshot."""
+
+import argparse
+import sys
+from src.reference_data import DEFAULT_REFERENCE_DIR, load_reference
+
+def main():
+    """Validate the dataset and write the compiled snapshot."""
+    parser = argparse.ArgumentParser(description="Validate and compile the reference dataset.")
+    parser.add_argument("--data-dir", default=None,
+                        help=f"Dataset directory (default: $REFERENCE_DATA_DIR or {DEFAULT_REFERENCE_DIR})")
+    parser.add_argument("--snapshot", default=None,
+                        help="Snapshot path (default: <data-dir>/.reference.pickle)")
+    parser.add_argument("--force", action="store_true",
+                        help="Compile even if the snapshot is current")
+    args = parser.parse_args()
+    
+    try:
+        reference, source = load_reference(args.data_dir, args.snapshot, force=args.force)
+    except ValueError as e:
+        print(f"✗ {str(e)}")
+        sys.exit(1)
+    
+    print(f"✓ Reference dataset {reference.version} ({'loaded from snapshot' if source == 'snapshot' else 'compiled'})")
+    print(f"  {len(reference.positions)} position(s), {len(reference.catalog.records)} technique(s), "
+          f"{len(reference.concepts)} concept(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""BJJ Notebook - Extract and chunk the IBJJF rule documents for search."""
+
+import argparse
+import sys
+from src.rules_index import DEFAULT_RULES_DIR, ingest_rules
+
+def main():
+    """Build or refresh the cached rule chunks."""
+    parser = argparse.ArgumentParser(description="Extract, chunk and cache the rule documents.")
+    parser.add_argument("--rules-dir", default=DEFAULT_RULES_DIR,
+                        help="Directory holding the rule PDFs and handouts (default: project root)")
+    parser.add_argument("--cache", default=None,
+                        help="Chunk cache path (default: <rules-dir>/.rules_chunks.json)")
+    parser.add_argument("--force", action="store_true", help="Re-parse every document")
+    args = parser.parse_args()
+    
+    chunks, report = ingest_rules(args.rules_dir, args.cache, force=args.force)
+    for source, status in sorted(report.items()):
+        mark = "✗" if status.startswith("skipped") else "✓"
+        print(f"{mark} {source}: {status}")
+    print(f"✓ {len(chunks)} rule passage(s) ready for search")
+    if any(status.startswith("skipped") for status in report.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""BJJ Notebook - Migrate JSON notes into the SQLite or log storage backend."""
+
+import argparse
+import os
+import sys
+
+def main():
+    """Run the one-shot JSON migration into another storage backend."""
+    parser = argparse.ArgumentParser(description="Copy JSON notes into a SQLite database or note log.")
+    parser.add_argument("--notes-dir", default="notes", help="Directory holding the JSON notes (default: notes)")
+    parser.add_argument("--backend", choices=("sqlite", "log"), default="sqlite",
+                        help="Storage backend to migrate into (default: sqlite)")
+    parser.add_argument("--db", default=None, help="SQLite database path (default: <notes-dir>/notes.db)")
+    parser.add_argument("--log-dir", default=None, help="Note log directory (default: <notes-dir>/segments)")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.notes_dir):
+        print(f"✗ Notes directory not found: {args.notes_dir}")
+        sys.exit(1)
+    
+    if args.backend == "sqlite":
+        from src.sqlite_storage import migrate_json_to_sqlite
+        db_path = args.db or os.path.join(args.notes_dir, "notes.db")
+        count = migrate_json_to_sqlite(args.notes_dir, db_path)
+        print(f"✓ Migrated {count} note(s) into {db_path}")
+        print("Set NOTES_BACKEND=sqlite (and NOTES_DB_PATH if you used --db) to use it.")
+    else:
+        from src.log_storage import migrate_json_to_log
+        log_dir = args.log_dir or os.path.join(args.notes_dir, "segments")
+        count = migrate_json_to_log(args.notes_dir, log_dir)
+        print(f"✓ Migrated {count} note(s) into {log_dir}")
+        print("Set NOTES_BACKEND=log (and NOTES_LOG_DIR if you used --log-dir) to use it.")
+
+if __name__ == "__main__":
+    main()
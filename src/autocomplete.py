@@ -0,0 +1,234 @@
+"""Prefix autocomplete over reference names and note tags and titles."""
+
+import heapq
+import re
+import threading
+from .bjj_reference import BJJ_CONCEPTS, BJJ_POSITIONS, TECHNIQUE_CATALOG
+
+KINDS = ("technique", "position", "concept", "tag", "title")
+
+# Most suggestions kept per trie node; requests may ask for up to this many
+MAX_SUGGESTIONS = 20
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Lowercase text and collapse everything but letters and digits to single spaces."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def _rank(entry):
+    """Sort key for suggestions: most popular first, then shortest, then alphabetical."""
+    return (-entry[2], len(entry[0]), entry[0])
+
+
+class _Node:
+    """A prefix trie node."""
+
+    __slots__ = ("children", "entries", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()   # keys of the entries indexed at exactly this prefix
+        self.top = None        # cached best suggestions below this node
+
+
+class PrefixTrie:
+    """Labels with popularity counts, completed from the start of any word.
+
+    "Rear Naked Choke" is found from "rea", "nak" or "cho".  Every node caches
+    its MAX_SUGGESTIONS best entries, built from its children's caches, so a
+    lookup walks the prefix and returns a cached list.  Changing an entry
+    clears the caches on its paths only; they are rebuilt by the next lookup.
+    Not thread-safe; Autocomplete guards it with a lock.
+    """
+
+    def __init__(self):
+        """Initialize an empty trie."""
+        self._root = _Node()
+        self._entries = {}     # normalized label -> [label, kind, count]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _paths(self, key):
+        """Yield the node path for every word start of key, creating nodes as needed."""
+        starts = [0] + [i + 1 for i, char in enumerate(key) if char == " "]
+        for start in starts:
+            path = [self._root]
+            node = self._root
+            for char in key[start:]:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                path.append(node)
+            yield path
+
+    def add(self, label, kind, count=1):
+        """Add count to label's popularity, adding it if it is new."""
+        key = normalize(label)
+        if not key:
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [label, kind, count]
+        else:
+            entry[2] += count
+        for path in self._paths(key):
+            path[-1].entries.add(key)
+            for node in path:
+                node.top = None
+
+    def remove(self, label, count=1):
+        """Subtract count from label's popularity, dropping it when none is left."""
+        key = normalize(label)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry[2] -= count
+        dropped = entry[2] <= 0
+        if dropped:
+            del self._entries[key]
+        for path in self._paths(key):
+            for node in path:
+                node.top = None
+            if dropped:
+                path[-1].entries.discard(key)
+                # Prune the nodes left with nothing below them
+                for parent, node, char in reversed(list(zip(path, path[1:], key[len(key) - len(path) + 1:]))):
+                    if node.entries or node.children:
+                        break
+                    del parent.children[char]
+
+    def _top(self, node):
+        """Return node's best suggestions, rebuilding stale caches below it.
+
+        The stale nodes are visited children first with an explicit stack,
+        as a long label makes a deep trie.
+        """
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if children_done:
+                candidates = [tuple(self._entries[key]) for key in current.entries]
+                for child in current.children.values():
+                    candidates.extend(child.top)
+                # An entry indexed under two word starts can reach a node twice
+                current.top = heapq.nsmallest(MAX_SUGGESTIONS, set(candidates), key=_rank)
+            elif current.top is None:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children.values()
+                             if child.top is None)
+        return node.top
+
+    def complete(self, prefix):
+        """Return the best (label, kind, count) entries for prefix, best first."""
+        node = self._root
+        for char in normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return self._top(node)
+
+
+class Autocomplete:
+    """Search-as-you-type suggestions for techniques, positions, concepts and notes.
+
+    Technique names, position names and variations, and concepts come from
+    the reference data; note tags and titles from notes_manager.  Each kind
+    has its own PrefixTrie.  A tag's popularity is the number of notes using
+    it.  The index is built on first use and then kept up to date through
+    storage change notifications, so a note write updates only its own tags
+    and title.
+    """
+
+    def __init__(self, notes_manager=None):
+        """Initialize the index; it is built on the first lookup."""
+        self.notes_manager = notes_manager
+        self._tries = None
+        self._notes = {}       # note id -> (title, tags) currently indexed
+        self._lock = threading.Lock()
+        # Held while building, which reads storage; _lock is never held
+        # around storage calls, as storage holds its own lock while notifying
+        self._build_lock = threading.Lock()
+
+    def _build(self):
+        """Index the reference data and subscribe to note changes."""
+        tries = {kind: PrefixTrie() for kind in KINDS}
+        for record in TECHNIQUE_CATALOG.records:
+            tries["technique"].add(record.name, "technique")
+        for position in BJJ_POSITIONS.values():
+            tries["position"].add(position["name"], "position")
+            for variation in position["types"]:
+                tries["position"].add(variation, "position")
+        for concept in BJJ_CONCEPTS:
+            tries["concept"].add(concept, "concept")
+        self._tries = tries
+
+        if self.notes_manager is not None:
+            storage = self.notes_manager.storage
+            storage.add_listener(self._on_note_change)
+            # Titles and tags are all that is indexed, so note bodies are not read
+            for meta in storage.list_metadata():
+                self._on_note_change(meta["id"], meta)
+
+    def _on_note_change(self, note_id, note):
+        """Move a note's title and tags from their old entries to their new ones."""
+        with self._lock:
+            # Listeners also hear about changes they have already seen
+            new = (note["title"], tuple(note.get("tags", []))) if note is not None else None
+            old = self._notes.get(note_id)
+            if new == old:
+                return
+            if old is not None:
+                self._tries["title"].remove(old[0])
+                for tag in set(old[1]):
+                    self._tries["tag"].remove(tag)
+            if new is not None:
+                self._tries["title"].add(new[0], "title")
+                for tag in set(new[1]):
+                    self._tries["tag"].add(tag, "tag")
+                self._notes[note_id] = new
+            else:
+                self._notes.pop(note_id, None)
+
+    def close(self):
+        """Stop following note changes, so a discarded index can be freed.
+
+        JSON storage shares one catalog per notes directory for the life of
+        the process; an index still subscribed to it is never released.  The
+        index is built again if it is used after closing.
+        """
+        with self._build_lock:
+            if self._tries is not None and self.notes_manager is not None:
+                self.notes_manager.storage.remove_listener(self._on_note_change)
+            with self._lock:
+                self._tries = None
+                self._notes = {}
+
+    def complete(self, prefix, limit=10, kinds=None):
+        """Return up to limit {"label", "kind", "count"} suggestions for prefix.
+
+        kinds restricts suggestions to some of KINDS, for example ("tag",)
+        for a tag field.  Raises ValueError for an unknown kind.
+        """
+        kinds = KINDS if kinds is None else tuple(kinds)
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unknown suggestion kind: {', '.join(sorted(unknown))}")
+        if not normalize(prefix):
+            return []
+
+        with self._build_lock:
+            if self._tries is None:
+                self._build()
+        if self.notes_manager is not None:
+            # Picks up notes written by other processes
+            self.notes_manager.storage.refresh()
+
+        with self._lock:
+            candidates = [entry for kind in kinds for entry in self._tries[kind].complete(prefix)]
+        best = heapq.nsmallest(min(limit, MAX_SUGGESTIONS), candidates, key=_rank)
+        return [{"label": label, "kind": kind, "count": count} for label, kind, count in best]
@@ -1,115 +1,94 @@
 """BJJ reference data including positions, techniques, and concepts."""
 
-BJJ_POSITIONS = {
-    "guard": {
-        "name": "Guard",
-        "description": "Bottom position with legs controlling opponent",
-        "types": ["Closed Guard", "Open Guard", "Half Guard", "Butterfly Guard", "Spider Guard", "De La Riva"],
-        "key_concepts": ["Distance control", "Hip mobility", "Grip fighting"]
-    },
-    "mount": {
-        "name": "Mount",
-        "description": "Top position sitting on opponent's torso",
-        "types": ["Full Mount", "High Mount", "S-Mount", "Technical Mount"],
-        "key_concepts": ["Weight distribution", "Base", "Posture"]
-    },
-    "side_control": {
-        "name": "Side Control",
-        "description": "Top position perpendicular to opponent",
-        "types": ["Standard Side Control", "Kesa Gatame", "North-South", "Reverse Kesa Gatame"],
-        "key_concepts": ["Pressure", "Shoulder of justice", "Hip control"]
-    },
-    "back_control": {
-        "name": "Back Control",
-        "description": "Position behind opponent with hooks",
-        "types": ["Standard Back Control", "Body Triangle"],
-        "key_concepts": ["Hooks", "Seat belt grip", "Head control"]
-    },
-    "turtle": {
-        "name": "Turtle",
-        "description": "Defensive position on hands and knees",
-        "types": ["Standard Turtle", "Sitting Turtle"],
-        "key_concepts": ["Posture", "Hand fighting", "Preventing back take"]
-    }
-}
-
-BJJ_TECHNIQUES = {
-    "submissions": {
-        "chokes": [
-            {"name": "Rear Naked Choke", "position": "back_control", "type": "blood choke"},
-            {"name": "Guillotine", "position": "guard", "type": "blood choke"},
-            {"name": "Triangle Choke", "position": "guard", "type": "blood choke"},
-            {"name": "Ezekiel Choke", "position": "mount", "type": "blood choke"},
-            {"name": "Bow and Arrow Choke", "position": "back_control", "type": "blood choke"},
-        ],
-        "armlocks": [
-            {"name": "Armbar", "position": "guard", "target": "elbow"},
-            {"name": "Kimura", "position": "side_control", "target": "shoulder"},
-            {"name": "Americana", "position": "mount", "target": "shoulder"},
-            {"name": "Straight Armbar", "position": "mount", "target": "elbow"},
-        ],
-        "leglocks": [
-            {"name": "Straight Ankle Lock", "target": "ankle"},
-            {"name": "Heel Hook", "target": "knee"},
-            {"name": "Knee Bar", "target": "knee"},
-        ]
-    },
-    "sweeps": [
-        {"name": "Scissor Sweep", "from_position": "closed_guard"},
-        {"name": "Hip Bump Sweep", "from_position": "closed_guard"},
-        {"name": "Butterfly Sweep", "from_position": "butterfly_guard"},
-        {"name": "Flower Sweep", "from_position": "closed_guard"},
-    ],
-    "passes": [
-        {"name": "Toreando Pass", "type": "standing"},
-        {"name": "Knee Slice", "type": "pressure"},
-        {"name": "Over-Under Pass", "type": "pressure"},
-        {"name": "X-Pass", "type": "standing"},
-    ],
-    "escapes": [
-        {"name": "Bridge and Roll", "from_position": "mount"},
-        {"name": "Elbow Escape (Shrimp)", "from_position": "side_control"},
-        {"name": "Hip Escape", "from_position": "side_control"},
-        {"name": "Back Escape", "from_position": "back_control"},
-    ]
-}
-
-BJJ_CONCEPTS = [
-    "Position before submission",
-    "Base and posture",
-    "Frames and angles",
-    "Hip mobility and movement",
-    "Grip fighting",
-    "Weight distribution",
-    "Breathing and staying calm",
-    "Timing and leverage over strength"
-]
+from functools import lru_cache
+from types import MappingProxyType
+from .reference_data import load_reference
+from .technique_catalog import (INDEXED_FIELDS, Technique, TechniqueCatalog, _index_key,
+                                flatten_techniques)
+
+# Loaded from the dataset in data/reference, or its compiled snapshot
+_REFERENCE, _ = load_reference()
+
+REFERENCE_VERSION = _REFERENCE.version
+BJJ_POSITIONS = _REFERENCE.positions
+BJJ_TECHNIQUES = _REFERENCE.techniques
+BJJ_CONCEPTS = _REFERENCE.concepts
+
+# Other names techniques and positions are known by, searchable like their names
+TECHNIQUE_ALIASES = _REFERENCE.technique_aliases
+POSITION_ALIASES = _REFERENCE.position_aliases
+
+TECHNIQUE_CATALOG = _REFERENCE.catalog
+_POSITION_INDEX = _REFERENCE.position_index
+POSITION_GRAPH = _REFERENCE.position_graph
+
+# Techniques by category, and submissions also by sub-category, for browsing
+_TECHNIQUE_GROUPS = MappingProxyType({**TECHNIQUE_CATALOG.indexes["category"],
+                                      **TECHNIQUE_CATALOG.indexes["sub_category"]})
 
 def get_position_info(position_key):
     """Get information about a specific BJJ position."""
     return BJJ_POSITIONS.get(position_key.lower().replace(" ", "_"))
 
 def get_techniques_by_type(technique_type):
-    """Get techniques by type (submissions, sweeps, passes, escapes)."""
-    return BJJ_TECHNIQUES.get(technique_type.lower())
+    """Get techniques by type (submissions, sweeps, passes, escapes), or None."""
+    return TECHNIQUE_CATALOG.indexes["category"].get(_index_key(technique_type))
+
+def get_techniques_by_sub_category(sub_category):
+    """Get submissions of one kind (chokes, armlocks, leglocks)."""
+    return TECHNIQUE_CATALOG.lookup("sub_category", sub_category)
+
+def get_technique_groups():
+    """Get techniques keyed by category (sweeps, ...) and submission kind (chokes, ...)."""
+    return _TECHNIQUE_GROUPS
+
+def find_techniques(**criteria):
+    """Get techniques by category, sub_category, position, target and/or type."""
+    unknown = set(criteria) - set(INDEXED_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot filter techniques by {', '.join(sorted(unknown))}")
+    return TECHNIQUE_CATALOG.find(**criteria)
+
+@lru_cache(maxsize=1024)
+def _search_techniques(query_lower):
+    """Search the catalog once per distinct query."""
+    return TECHNIQUE_CATALOG.search(query_lower)
 
 def search_techniques(query):
-    """Search for techniques by name."""
-    query_lower = query.lower()
-    results = []
-    
-    for category, items in BJJ_TECHNIQUES.items():
-        if category == "submissions":
-            for sub_category, techniques in items.items():
-                for technique in techniques:
-                    if query_lower in technique["name"].lower():
-                        results.append({**technique, "category": category, "sub_category": sub_category})
-        else:
-            for technique in items:
-                if query_lower in technique["name"].lower():
-                    results.append({**technique, "category": category})
+    """Search for techniques by name or alias, tolerating typos."""
+    return list(_search_techniques(query.lower()))
+
+def search_positions(query):
+    """Search for positions by name, variation or alias, tolerating typos."""
+    return [{"key": key, **BJJ_POSITIONS[key]} for key in _POSITION_INDEX.search(query)]
+
+def _graph_position(name):
+    """Resolve a position or variation name, key or alias to its key in the position graph."""
+    key = _index_key(name)
+    if key in POSITION_GRAPH.names:
+        return key
+    matches = _POSITION_INDEX.search(name, limit=1)
+    if not matches:
+        raise ValueError(f"Unknown position '{name}'")
+    return matches[0]
+
+@lru_cache(maxsize=1024)
+def _find_position_chains(start, goal, limit, start_side, goal_side):
+    """Describe the stored chains for one query once."""
+    return tuple(POSITION_GRAPH.find_chains(start, goal, limit, start_side, goal_side))
+
+def find_position_chains(start, goal, limit=3, start_side=None, goal_side=None):
+    """Get the shortest chains of techniques from one position to another.
     
-    return results
+    Positions may be given by name, variation or alias, and sides as
+    "top" or "bottom" (either side if None).
+    """
+    return list(_find_position_chains(_graph_position(start), _graph_position(goal),
+                                      limit, start_side, goal_side))
+
+def get_chain_positions():
+    """Get (key, name) for the positions and variations chains can start or end in."""
+    return [(key, POSITION_GRAPH.names[key]) for key in POSITION_GRAPH.connected]
 
 def get_all_positions():
     """Get all BJJ positions."""
@@ -0,0 +1,262 @@
+"""IBJJF competition legality data and lookup tables.
+
+Verdicts are transcribed from the rule documents shipped with the project:
+the 2024 IBJJF illegal moves chart (20240101_GolpesProibidos_EN.pdf), the
+knee reaping handout and the leg lock position legality handout.  The
+official rules at www.ibjjf.org/rules prevail over this summary.
+"""
+
+GOLPES_SOURCE = "IBJJF illegal moves chart (2024)"
+REAPING_SOURCE = "IBJJF knee reaping handout (2024)"
+LEG_LOCK_SOURCE = "IBJJF leg lock position legality handout (2024)"
+
+KIDS_BELTS = ["white", "grey", "yellow", "orange", "green"]
+JUVENILE_BELTS = ["white", "blue", "purple"]
+ADULT_BELTS = ["white", "blue", "purple", "brown", "black"]
+
+RULE_DIVISIONS = {
+    "kids_4_12": {"name": "Kids (4–12)", "belts": KIDS_BELTS},
+    "kids_13_15": {"name": "Teens (13–15)", "belts": KIDS_BELTS},
+    "juvenile": {"name": "Juvenile (16–17)", "belts": JUVENILE_BELTS},
+    "adult_gi": {"name": "Adult Gi", "belts": ADULT_BELTS},
+    "adult_nogi": {"name": "Adult No-Gi", "belts": ADULT_BELTS},
+    "masters_gi": {"name": "Masters Gi", "belts": ADULT_BELTS},
+    "masters_nogi": {"name": "Masters No-Gi", "belts": ADULT_BELTS}
+}
+
+# Columns of the illegal moves chart; every technique lists the columns it is illegal in
+CHART_COLUMNS = {
+    "4_12": "4 to 12 years old",
+    "13_15": "13 to 15 years old",
+    "juvenile_white": "16 & 17 years old (all ranks) and white belts",
+    "blue_purple": "Adult to Master 7, blue & purple belts",
+    "brown_black": "Adult to Master 7, brown & black belts (except Adult No-Gi)",
+    "brown_black_nogi": "Adult No-Gi, brown & black belts"
+}
+
+_BELOW_BROWN = ["4_12", "13_15", "juvenile_white", "blue_purple"]
+_BELOW_NOGI_BROWN = _BELOW_BROWN + ["brown_black"]
+_EVERYONE = _BELOW_NOGI_BROWN + ["brown_black_nogi"]
+
+SEVERE_FOUL = {"severity": "severe foul", "penalty": "Disqualification"}
+SERIOUS_FOUL = {"severity": "serious foul", "penalty": "Stop, reset, warning and penalty"}
+NOT_PENALIZED = {"severity": "not penalized", "penalty": "None, although the technique is prohibited"}
+
+CHART_TECHNIQUES = [
+    {"key": "stretching_legs_apart", "name": "Submission techniques stretching legs apart",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "choke_with_spinal_lock", "name": "Choke with spinal lock",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "straight_foot_lock", "name": "Straight foot lock",
+     "illegal_in": ["4_12", "13_15"], **SEVERE_FOUL},
+    {"key": "ezequiel_choke", "name": "Forearm choke using the sleeve (Ezequiel choke)",
+     "illegal_in": ["4_12", "13_15"], **SEVERE_FOUL},
+    {"key": "frontal_guillotine", "name": "Frontal guillotine choke",
+     "illegal_in": ["4_12"], **SEVERE_FOUL},
+    {"key": "omoplata", "name": "Omoplata",
+     "illegal_in": ["4_12", "13_15"], **SEVERE_FOUL},
+    {"key": "triangle_pulling_head", "name": "Triangle (pulling head)",
+     "illegal_in": ["4_12", "13_15"], **SEVERE_FOUL},
+    {"key": "arm_triangle", "name": "Arm triangle",
+     "illegal_in": ["4_12", "13_15"], **SEVERE_FOUL},
+    {"key": "kidney_compression", "name": "Closed guard lock compressing kidneys or ribs",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "wrist_lock", "name": "Wrist lock",
+     "illegal_in": ["4_12", "13_15", "juvenile_white"], **SEVERE_FOUL},
+    {"key": "single_leg_head_outside", "name": "Single leg takedown with the head outside the opponent's body",
+     "illegal_in": ["4_12", "13_15", "juvenile_white"], **NOT_PENALIZED},
+    {"key": "bicep_slicer", "name": "Bicep slicer",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "calf_slicer", "name": "Calf slicer",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "knee_bar", "name": "Knee bar",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "toe_hold", "name": "Toe hold",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "foot_lock_turning_away", "name": "Straight foot lock turning toward the foot not under attack",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "heel_hook", "name": "Heel hook",
+     "illegal_in": _BELOW_NOGI_BROWN, **SEVERE_FOUL},
+    {"key": "knee_twisting_lock", "name": "Locks twisting the knees",
+     "illegal_in": _BELOW_NOGI_BROWN, **SEVERE_FOUL},
+    # The reaping handout permits brown and black belts, gi and no-gi, to cross
+    # the midline; twisting the knee stays illegal as knee_twisting_lock
+    {"key": "knee_reaping", "name": "Knee reaping",
+     "illegal_in": _BELOW_BROWN, **SEVERE_FOUL},
+    {"key": "toe_hold_outward", "name": "Toe hold applying outward pressure on the foot",
+     "illegal_in": _BELOW_NOGI_BROWN, **SEVERE_FOUL},
+    {"key": "slam", "name": "Slam",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL},
+    {"key": "spinal_lock", "name": "Spinal lock without choke",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL},
+    {"key": "scissor_takedown", "name": "Scissor takedown",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL},
+    {"key": "finger_bending", "name": "Bending fingers backwards",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL},
+    {"key": "belt_throw_on_head", "name": "Throwing the opponent on their head by the belt when defending a single leg",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL},
+    {"key": "suplex_on_head", "name": "Suplex landing the opponent on their head or neck",
+     "illegal_in": _EVERYONE, **SEVERE_FOUL}
+]
+
+# Leg positions from the two handouts, with a verdict per handout group:
+# children (4-15), juvenile, white-purple and brown-black (adult and masters)
+LEG_POSITIONS = [
+    {"key": "leg_across_body_same_side", "name": "Leg lock across the body, same side (foot in same-side armpit)",
+     "source": LEG_LOCK_SOURCE,
+     "verdicts": {
+         "children": {"legal": False, "note": "Not allowed in this division"},
+         "juvenile": {"legal": False, "note": "Not allowed in this division"},
+         "white_purple": {"legal": True, "note": "Legal as a straight foot lock"},
+         "brown_black": {"legal": True, "note": "Legal if no torque is applied to the knee"}
+     }},
+    {"key": "foot_across_midline", "name": "Foot crossing the opponent's midline, no twisting",
+     "source": REAPING_SOURCE,
+     "verdicts": {
+         "children": {"legal": False, **SEVERE_FOUL},
+         "juvenile": {"legal": False, **SERIOUS_FOUL},
+         "white_purple": {"legal": False, **SERIOUS_FOUL},
+         "brown_black": {"legal": True, "note": "Permitted provided no twisting pressure is applied"}
+     }},
+    {"key": "inward_knee_torque", "name": "Twisting inward pressure on the knee with the leg across the body",
+     "source": REAPING_SOURCE,
+     "verdicts": {
+         "children": {"legal": False, **SEVERE_FOUL},
+         "juvenile": {"legal": False, **SEVERE_FOUL},
+         "white_purple": {"legal": False, **SEVERE_FOUL},
+         "brown_black": {"legal": False, **SEVERE_FOUL}
+     }}
+]
+
+# Moves that are fouls only for some belts regardless of division
+BELT_RULES = [
+    {"key": "jump_to_closed_guard", "name": "Jumping to closed guard while the opponent is standing",
+     "source": GOLPES_SOURCE, "illegal_for": ["white"],
+     "note": "The referee stops the match and restarts it standing", **SERIOUS_FOUL}
+]
+
+def _chart_column(division, belt):
+    """Return the illegal moves chart column a competitor falls in."""
+    if division == "kids_4_12":
+        return "4_12"
+    if division == "kids_13_15":
+        return "13_15"
+    if division == "juvenile" or belt == "white":
+        return "juvenile_white"
+    if belt in ("blue", "purple"):
+        return "blue_purple"
+    return "brown_black_nogi" if division == "adult_nogi" else "brown_black"
+
+def _handout_group(division, belt):
+    """Return the handout group (children, juvenile, white_purple, brown_black) of a competitor."""
+    if division.startswith("kids_"):
+        return "children"
+    if division == "juvenile":
+        return "juvenile"
+    return "brown_black" if belt in ("brown", "black") else "white_purple"
+
+def _verdict(key, name, legal, source, severity=None, penalty=None, note=None):
+    """Build an immutable lookup table entry."""
+    return (key, name, legal, severity, penalty, note, source)
+
+def compile_legality_table():
+    """Compile the rules into {(division, belt, item): verdict} plus the item names.
+    
+    Every valid division, belt and technique or position combination gets
+    its own entry, so a lookup is a single dictionary access.
+    """
+    table = {}
+    names = {}
+    for division, info in RULE_DIVISIONS.items():
+        for belt in info["belts"]:
+            column = _chart_column(division, belt)
+            group = _handout_group(division, belt)
+            
+            for item in CHART_TECHNIQUES:
+                illegal = column in item["illegal_in"]
+                table[(division, belt, item["key"])] = _verdict(
+                    item["key"], item["name"], not illegal, GOLPES_SOURCE,
+                    item["severity"] if illegal else None,
+                    item["penalty"] if illegal else None)
+                names[item["key"]] = item["name"]
+            
+            for item in LEG_POSITIONS:
+                verdict = item["verdicts"][group]
+                table[(division, belt, item["key"])] = _verdict(
+                    item["key"], item["name"], verdict["legal"], item["source"],
+                    verdict.get("severity"), verdict.get("penalty"), verdict.get("note"))
+                names[item["key"]] = item["name"]
+            
+            for item in BELT_RULES:
+                illegal = belt in item["illegal_for"]
+                table[(division, belt, item["key"])] = _verdict(
+                    item["key"], item["name"], not illegal, item["source"],
+                    item["severity"] if illegal else None,
+                    item["penalty"] if illegal else None,
+                    item["note"] if illegal else None)
+                names[item["key"]] = item["name"]
+    return table, names
+
+LEGALITY_TABLE, RULE_ITEMS = compile_legality_table()
+
+# Item lookups also accept the display name and common spellings
+_ITEM_ALIASES = {}
+for _key, _name in RULE_ITEMS.items():
+    for _alias in (_key, _name, _key.replace("_", " ")):
+        _ITEM_ALIASES[" ".join(_alias.lower().replace("_", " ").replace("-", " ").split())] = _key
+
+def _normalize(value):
+    """Normalize a division, belt or item name for lookup."""
+    return " ".join(str(value).lower().replace("_", " ").replace("-", " ").split())
+
+def _resolve(division, belt, item=None):
+    """Return canonical (division, belt, item) keys, raising ValueError for unknown values."""
+    division_key = _normalize(division).replace(" ", "_")
+    if division_key not in RULE_DIVISIONS:
+        raise ValueError(f"Unknown division '{division}'. Choose one of: {', '.join(RULE_DIVISIONS)}")
+    belt_key = _normalize(belt)
+    if belt_key not in RULE_DIVISIONS[division_key]["belts"]:
+        raise ValueError(f"{belt} belts do not compete in {RULE_DIVISIONS[division_key]['name']}")
+    if item is None:
+        return division_key, belt_key, None
+    item_key = _ITEM_ALIASES.get(_normalize(item))
+    if item_key is None:
+        raise ValueError(f"Unknown technique or position '{item}'")
+    return division_key, belt_key, item_key
+
+def _as_dict(division, belt, entry):
+    """Convert a lookup table entry into a result dictionary."""
+    key, name, legal, severity, penalty, note, source = entry
+    return {
+        "division": division,
+        "belt": belt,
+        "key": key,
+        "name": name,
+        "legal": legal,
+        "severity": severity,
+        "penalty": penalty,
+        "note": note,
+        "source": source
+    }
+
+def check_legality(division, belt, item):
+    """Return the verdict for a technique or position in a division and belt.
+    
+    Raises ValueError for an unknown division, technique or position, or a
+    belt that does not compete in the division.
+    """
+    division, belt, item = _resolve(division, belt, item)
+    return _as_dict(division, belt, LEGALITY_TABLE[(division, belt, item)])
+
+def get_legality_matrix(division, belt):
+    """Return the verdicts for every technique and position in a division and belt."""
+    division, belt, _ = _resolve(division, belt)
+    return [_as_dict(division, belt, LEGALITY_TABLE[(division, belt, key)]) for key in RULE_ITEMS]
+
+def get_rule_divisions():
+    """Get all competition divisions with their belts."""
+    return RULE_DIVISIONS
+
+def get_rule_items():
+    """Get every technique and position with a legality verdict, as {key: name}."""
+    return RULE_ITEMS
@@ -1,42 +1,185 @@
 """OpenAI chat integration for BJJ assistant."""
 
+import asyncio
 import os
-from openai import OpenAI
+import threading
+import time
+from functools import lru_cache
+from openai import (
+    OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, Timeout
+)
 from dotenv import load_dotenv
+from .context_window import ContextWindow
+from .response_cache import ResponseCache, make_key
+from .chat_tools import UNCACHEABLE_TOOLS
 from .bjj_reference import (
     get_all_positions, 
     get_all_concepts, 
     BJJ_TECHNIQUES
 )
 
+try:
+    import httpx
+except ImportError:  # newer openai releases bundle their own HTTP client
+    httpx = None
+
 # Load environment variables
 load_dotenv()
 
-class BJJChatHandler:
-    """Handles OpenAI chat interactions for BJJ assistance."""
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+_async_client = None
+_async_client_key = None
+
+_cache = None
+_cache_pid = None
+
+
+def _get_api_key():
+    """Return the OpenAI API key, raising ValueError if it is not set."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "OPENAI_API_KEY not found in environment variables. "
+            "Please create a .env file with your OpenAI API key."
+        )
+    return api_key
+
+
+def _http_client_options():
+    """Return the pool and timeout settings shared by the sync and async clients."""
+    pool_size = int(os.getenv("OPENAI_POOL_SIZE", "10"))
+    options = {
+        "timeout": Timeout(float(os.getenv("OPENAI_TIMEOUT", "60")),
+                           connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")))
+    }
+    if httpx is not None:
+        options["limits"] = httpx.Limits(max_connections=pool_size,
+                                         max_keepalive_connections=pool_size,
+                                         keepalive_expiry=30.0)
+    return options
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client, creating it on first use.
     
-    def __init__(self):
-        """Initialize the chat handler with OpenAI client."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "OPENAI_API_KEY not found in environment variables. "
-                "Please create a .env file with your OpenAI API key."
-            )
+    The client keeps a pool of keep-alive connections, so every chat after
+    the first skips TCP and TLS setup.  Pool size and timeouts are read from
+    OPENAI_POOL_SIZE, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT and
+    OPENAI_MAX_RETRIES.  A forked worker process builds its own client.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            return _client
         
-        self.client = OpenAI(api_key=api_key)
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        self.conversation_history = []
-        
-        # Initialize with BJJ context
-        self._initialize_system_context()
+        _client = OpenAI(api_key=_get_api_key(),
+                         max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+                         http_client=DefaultHttpxClient(**_http_client_options()))
+        _client_pid = os.getpid()
+        return _client
+
+
+def get_async_openai_client():
+    """Return the AsyncOpenAI client for the running event loop.
     
-    def _initialize_system_context(self):
-        """Set up the system message with BJJ knowledge."""
-        positions = get_all_positions()
-        concepts = get_all_concepts()
+    Like get_openai_client(), one pooled client is shared by every chat, but
+    async connections belong to the event loop that opened them, so a new
+    client is built for each process and event loop.  Must be called from a
+    coroutine.
+    """
+    global _async_client, _async_client_key
+    key = (os.getpid(), asyncio.get_running_loop())
+    with _client_lock:
+        if _async_client is not None and _async_client_key == key:
+            return _async_client
         
-        system_message = f"""You are a knowledgeable Brazilian Jiu-Jitsu (BJJ) instructor and assistant. 
+        _async_client = AsyncOpenAI(api_key=_get_api_key(),
+                                    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+                                    http_client=DefaultAsyncHttpxClient(**_http_client_options()))
+        _async_client_key = key
+        return _async_client
+
+
+def get_response_cache():
+    """Return the process-wide response cache, or None if caching is off.
+    
+    Set CHAT_CACHE=true to enable it.  CHAT_CACHE_PATH adds an on-disk layer
+    shared by worker processes, CHAT_CACHE_TTL sets the entry lifetime in
+    seconds, CHAT_CACHE_MAX_ENTRIES / CHAT_CACHE_MAX_DISK_ENTRIES bound
+    the memory and disk layers, and CHAT_CACHE_WAIT is how many seconds a
+    request waits for an identical one in progress before asking itself.
+    """
+    global _cache, _cache_pid
+    if os.getenv("CHAT_CACHE", "false").lower() != "true":
+        return None
+    with _client_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = ResponseCache(
+                max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000")),
+                ttl=int(os.getenv("CHAT_CACHE_TTL", str(7 * 24 * 3600))),
+                path=os.getenv("CHAT_CACHE_PATH") or None,
+                max_disk_entries=int(os.getenv("CHAT_CACHE_MAX_DISK_ENTRIES", "10000")),
+                wait_timeout=float(os.getenv("CHAT_CACHE_WAIT", "60"))
+            )
+            _cache_pid = os.getpid()
+        return _cache
+
+
+def create_chat_handler(turns=None, retrievers=(), tools=None):
+    """Return a new chat handler that shares the process-wide client.
+    
+    turns is an optional list of earlier {"user", "assistant"} exchanges to
+    resume the conversation from; retrievers and tools are passed to the
+    handler.
+    """
+    handler = BJJChatHandler(client=get_openai_client(), retrievers=retrievers, tools=tools)
+    for turn in turns or []:
+        handler.add_turn(turn["user"], turn["assistant"])
+    return handler
+
+
+def create_async_chat_handler(turns=None, retrievers=(), tools=None):
+    """Return a new async chat handler that shares the event loop's client.
+    
+    Must be called from a coroutine; turns, retrievers and tools are as for
+    create_chat_handler().
+    """
+    handler = AsyncBJJChatHandler(client=get_async_openai_client(), retrievers=retrievers,
+                                  tools=tools)
+    for turn in turns or []:
+        handler.add_turn(turn["user"], turn["assistant"])
+    return handler
+
+
+@lru_cache(maxsize=None)
+def get_system_message(tools=False):
+    """Return the assistant's system prompt, built once per process.
+    
+    With tools the model looks reference data up as it needs it, so the
+    prompt only tells it to; without, the reference contents are listed.
+    """
+    if tools:
+        return """You are a knowledgeable Brazilian Jiu-Jitsu (BJJ) instructor and assistant. 
+Your role is to help students learn BJJ techniques, understand positions, and improve their practice.
+
+Use the tools to look up positions, techniques, the student's own notes and the IBJJF
+competition rules instead of guessing; call several at once when they are independent.
+
+When answering questions:
+1. Be clear and instructional
+2. Focus on proper technique and safety
+3. Base details on what the tools return, and say so when they have nothing
+4. Encourage proper training under qualified instruction
+
+Always prioritize safety and remind users to train under supervision."""
+    
+    positions = get_all_positions()
+    concepts = get_all_concepts()
+    
+    return f"""You are a knowledgeable Brazilian Jiu-Jitsu (BJJ) instructor and assistant. 
 Your role is to help students learn BJJ techniques, understand positions, and improve their practice.
 
 You have access to a reference database containing:
@@ -53,30 +196,194 @@ When answering questions:
 
 Always prioritize safety and remind users to train under supervision."""
 
+
+class ChatError(Exception):
+    """Raised when the assistant could not answer, with the reason as its message."""
+
+
+def _new_timings():
+    """Return zeroed model and tool timings for a turn."""
+    return {"model_seconds": 0.0, "tool_seconds": 0.0, "tool_calls": 0, "rounds": 0}
+
+
+def _merge_tool_call_deltas(pending, deltas):
+    """Merge streamed tool call fragments into pending, {index: [id, name, arguments]}."""
+    for delta in deltas:
+        call = pending.setdefault(delta.index, ["", "", ""])
+        if delta.id:
+            call[0] = delta.id
+        if delta.function is not None:
+            if delta.function.name:
+                call[1] += delta.function.name
+            if delta.function.arguments:
+                call[2] += delta.function.arguments
+
+
+class BJJChatHandler:
+    """Handles OpenAI chat interactions for BJJ assistance."""
+    
+    def __init__(self, client=None, cache=None, retrievers=(), tools=None):
+        """Initialize the chat handler with the shared OpenAI client and response cache.
+        
+        retrievers are optional sources of reference text, such as a
+        NoteRetriever or RulesIndex: each has a context_message(question)
+        method, and whatever they return for a message is sent along with it.
+        tools is an optional ChatTools whose functions the model may call;
+        the handler runs them and asks again, for up to CHAT_TOOL_ROUNDS
+        rounds, until the model answers.
+        """
+        self.client = client if client is not None else get_openai_client()
+        self.cache = cache if cache is not None else get_response_cache()
+        self.retrievers = list(retrievers)
+        self._retrieved_context = None
+        self.tools = tools
+        self.max_tool_rounds = int(os.getenv("CHAT_TOOL_ROUNDS", "4"))
+        self._tool_messages = []
+        self._cacheable = True
+        self.last_timings = _new_timings()
+        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.conversation_history = []
+        
+        # Only the system prompt and the latest turns that fit the budget are sent
+        self.context = ContextWindow(
+            max_tokens=int(os.getenv("CHAT_CONTEXT_TOKENS", "3000")),
+            summary_tokens=int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+        )
+        
+        # Initialize with BJJ context
+        self._initialize_system_context()
+    
+    def _initialize_system_context(self):
+        """Set up the system message with BJJ knowledge."""
         self.conversation_history.append({
             "role": "system",
-            "content": system_message
+            "content": get_system_message(self.tools is not None)
         })
     
-    def chat(self, user_message):
-        """Send a message and get a response from the BJJ assistant."""
-        # Add user message to history
+    def _begin_turn(self, user_message):
+        """Add user_message to the history and return its response cache key, or None.
+        
+        Relevant reference text is looked up first.  Only opening questions
+        are cached: once the conversation has earlier turns the answer
+        depends on them.  The key covers the reference text too, so an answer
+        is not reused after the notes it drew on change; an answer that read
+        notes or rules through a tool is not cached at all.
+        """
+        contexts = []
+        for retriever in self.retrievers:
+            try:
+                context = retriever.context_message(user_message)
+            except Exception:
+                # Reference text is an extra; chat still works without it
+                context = None
+            if context:
+                contexts.append(context)
+        self._retrieved_context = "\n\n".join(contexts) or None
+        self._tool_messages = []
+        self._cacheable = True
+        self.last_timings = _new_timings()
+        
+        cache_key = None
+        if self.cache is not None and len(self.conversation_history) == 1:
+            cache_key = make_key(self.model, self.temperature,
+                                 self.conversation_history[0]["content"] + (self._retrieved_context or ""),
+                                 user_message)
+        
         self.conversation_history.append({
             "role": "user",
             "content": user_message
         })
+        return cache_key
+    
+    def _abandon_turn(self):
+        """Remove the unanswered user message of a failed turn from the history."""
+        if self.conversation_history[-1]["role"] == "user":
+            self.conversation_history.pop()
+    
+    def _messages(self):
+        """Return the messages to send: the context window, reference text and tool calls."""
+        messages = self.context.build(self.conversation_history)
+        if self._retrieved_context:
+            messages.insert(1, {"role": "system", "content": self._retrieved_context})
+        messages.extend(self._tool_messages)
+        return messages
+    
+    def _request_options(self, **options):
+        """Return the arguments for a completion request for the current turn."""
+        options.update(
+            model=self.model,
+            messages=self._messages(),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
+        if self.tools is not None:
+            options["tools"] = self.tools.definitions
+            if self.last_timings["rounds"] >= self.max_tool_rounds:
+                # Out of rounds: the model has to answer with what it has
+                options["tool_choice"] = "none"
+        return options
+    
+    def _begin_tool_round(self, content, calls):
+        """Record the model's (id, name, arguments) tool calls in the turn and return them."""
+        self._tool_messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [{"id": call_id, "type": "function",
+                            "function": {"name": name, "arguments": arguments}}
+                           for call_id, name, arguments in calls]
+        })
+        self.last_timings["rounds"] += 1
+        self.last_timings["tool_calls"] += len(calls)
+        if any(name in UNCACHEABLE_TOOLS for _, name, _ in calls):
+            self._cacheable = False
+        return calls
+    
+    def _complete(self):
+        """Request a completion for the current history and return its text.
         
-        try:
-            # Get response from OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.conversation_history,
-                temperature=0.7,
-                max_tokens=1000
-            )
+        Tool calls the model makes are run and their results sent back until
+        it answers.
+        """
+        while True:
+            started = time.perf_counter()
+            response = self.client.chat.completions.create(**self._request_options())
+            self.last_timings["model_seconds"] += time.perf_counter() - started
             
-            # Extract assistant's response
-            assistant_message = response.choices[0].message.content
+            message = response.choices[0].message
+            if not message.tool_calls:
+                # A refusal or filtered answer has no content
+                return message.content or ""
+            
+            calls = self._begin_tool_round(message.content, [
+                (call.id, call.function.name, call.function.arguments)
+                for call in message.tool_calls
+            ])
+            started = time.perf_counter()
+            self._tool_messages.extend(self.tools.run(calls))
+            self.last_timings["tool_seconds"] += time.perf_counter() - started
+    
+    def chat(self, user_message):
+        """Send a message and get a response from the BJJ assistant.
+        
+        Raises ChatError if OpenAI could not be reached or failed; the
+        message is then left out of the history.
+        """
+        # Add user message to history
+        cache_key = self._begin_turn(user_message)
+        
+        try:
+            # Get response from the cache or OpenAI
+            assistant_message = self.cache.claim(cache_key) if cache_key is not None else None
+            if assistant_message is None:
+                started = time.perf_counter()
+                try:
+                    assistant_message = self._complete()
+                finally:
+                    if cache_key is not None:
+                        self.cache.release(cache_key, assistant_message,
+                                           time.perf_counter() - started, keep=self._cacheable)
             
             # Add to conversation history
             self.conversation_history.append({
@@ -87,7 +394,88 @@ Always prioritize safety and remind users to train under supervision."""
             return assistant_message
             
         except Exception as e:
-            return f"Error communicating with OpenAI: {str(e)}"
+            self._abandon_turn()
+            raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+    
+    def chat_stream(self, user_message):
+        """Send a message and yield the response in pieces as the model writes it.
+        
+        The complete response is added to the conversation history once the
+        stream ends.  If the caller stops early (closes the generator, or a
+        web client disconnects), the stream is closed so its connection goes
+        back to the pool, and the turn is dropped from the history.  A cached
+        response is yielded in one piece.  If OpenAI fails, ChatError is
+        raised, possibly after part of the response, and the turn is dropped.
+        """
+        cache_key = self._begin_turn(user_message)
+        claimed = False
+        response = None
+        started = time.perf_counter()
+        try:
+            if cache_key is not None:
+                cached = self.cache.claim(cache_key)
+                if cached is not None:
+                    response = cached
+                    self.conversation_history.append({
+                        "role": "assistant",
+                        "content": cached
+                    })
+                    yield cached
+                    return
+                claimed = True
+            
+            parts = []
+            while True:
+                round_started = time.perf_counter()
+                round_parts = []
+                pending = {}
+                try:
+                    stream = self.client.chat.completions.create(**self._request_options(stream=True))
+                except Exception as e:
+                    raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+                
+                try:
+                    for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            round_parts.append(delta.content)
+                            yield delta.content
+                        if delta.tool_calls:
+                            _merge_tool_call_deltas(pending, delta.tool_calls)
+                except Exception as e:
+                    raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+                finally:
+                    stream.close()
+                    self.last_timings["model_seconds"] += time.perf_counter() - round_started
+                
+                parts.extend(round_parts)
+                if not pending:
+                    break
+                calls = self._begin_tool_round("".join(round_parts) or None,
+                                               [tuple(pending[index]) for index in sorted(pending)])
+                tools_started = time.perf_counter()
+                self._tool_messages.extend(self.tools.run(calls))
+                self.last_timings["tool_seconds"] += time.perf_counter() - tools_started
+            
+            response = "".join(parts)
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": response
+            })
+        finally:
+            if response is None:
+                # Failed or abandoned by the caller: the turn never happened
+                self._abandon_turn()
+            if claimed:
+                self.cache.release(cache_key, response, time.perf_counter() - started,
+                                   keep=self._cacheable)
+    
+    def add_turn(self, user_message, assistant_message):
+        """Append an earlier exchange to the history without calling the model."""
+        self.conversation_history.append({"role": "user", "content": user_message})
+        self.conversation_history.append({"role": "assistant", "content": assistant_message or ""})
     
     def get_conversation_history(self):
         """Get the full conversation history."""
@@ -107,3 +495,150 @@ Always prioritize safety and remind users to train under supervision."""
             role = "You" if msg["role"] == "user" else "BJJ Assistant"
             exported.append(f"{role}: {msg['content']}\n")
         return "\n".join(exported)
+
+
+class AsyncBJJChatHandler(BJJChatHandler):
+    """Chat handler whose chat methods are coroutines, for use on an event loop.
+    
+    While a request waits on OpenAI the event loop is free to serve other
+    chats, so one process can hold many conversations in flight at once.
+    History, export and clearing work as in BJJChatHandler.
+    """
+    
+    def __init__(self, client=None, cache=None, retrievers=(), tools=None):
+        """Initialize the chat handler with the event loop's AsyncOpenAI client."""
+        super().__init__(client=client if client is not None else get_async_openai_client(),
+                         cache=cache, retrievers=retrievers, tools=tools)
+    
+    async def _begin_turn_async(self, user_message):
+        """Begin a turn as _begin_turn() does, off the event loop.
+        
+        Returns (cache key, cached response): retrieval and the cache's
+        on-disk layer would otherwise block every other chat on the loop.
+        """
+        cache_key = await asyncio.to_thread(self._begin_turn, user_message)
+        if cache_key is None:
+            return None, None
+        return cache_key, await asyncio.to_thread(self.cache.lookup, cache_key)
+    
+    async def _complete_async(self):
+        """Request a completion for the current history and return its text.
+        
+        Tool calls are run off the event loop, concurrently, as in _complete().
+        """
+        while True:
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(**self._request_options())
+            self.last_timings["model_seconds"] += time.perf_counter() - started
+            
+            message = response.choices[0].message
+            if not message.tool_calls:
+                # A refusal or filtered answer has no content
+                return message.content or ""
+            
+            calls = self._begin_tool_round(message.content, [
+                (call.id, call.function.name, call.function.arguments)
+                for call in message.tool_calls
+            ])
+            started = time.perf_counter()
+            self._tool_messages.extend(await self.tools.run_async(calls))
+            self.last_timings["tool_seconds"] += time.perf_counter() - started
+    
+    async def chat(self, user_message):
+        """Send a message and get a response from the BJJ assistant.
+        
+        Cached responses are used as in BJJChatHandler.chat(), but identical
+        requests in flight at the same time are not collapsed, as waiting on
+        them would block the event loop.  Raises ChatError on failure.
+        """
+        cache_key, cached = await self._begin_turn_async(user_message)
+        
+        try:
+            if cached is not None:
+                assistant_message = cached
+            else:
+                started = time.perf_counter()
+                assistant_message = await self._complete_async()
+                if cache_key is not None and assistant_message is not None and self._cacheable:
+                    await asyncio.to_thread(self.cache.store, cache_key, assistant_message,
+                                            time.perf_counter() - started)
+            
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": assistant_message
+            })
+            
+            return assistant_message
+            
+        except Exception as e:
+            self._abandon_turn()
+            raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+    
+    async def chat_stream(self, user_message):
+        """Send a message and yield the response in pieces as the model writes it.
+        
+        Behaves like BJJChatHandler.chat_stream(), as an async generator,
+        including raising ChatError if OpenAI fails and dropping the turn if
+        the caller stops early (aclose(), or a cancelled task).
+        """
+        cache_key, cached = await self._begin_turn_async(user_message)
+        
+        if cached is not None:
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": cached
+            })
+            yield cached
+            return
+        
+        parts = []
+        response = None
+        started = time.perf_counter()
+        try:
+            while True:
+                round_started = time.perf_counter()
+                round_parts = []
+                pending = {}
+                try:
+                    stream = await self.client.chat.completions.create(**self._request_options(stream=True))
+                except Exception as e:
+                    raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+                
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            round_parts.append(delta.content)
+                            yield delta.content
+                        if delta.tool_calls:
+                            _merge_tool_call_deltas(pending, delta.tool_calls)
+                except Exception as e:
+                    raise ChatError(f"Error communicating with OpenAI: {str(e)}") from e
+                finally:
+                    await stream.close()
+                    self.last_timings["model_seconds"] += time.perf_counter() - round_started
+                
+                parts.extend(round_parts)
+                if not pending:
+                    break
+                calls = self._begin_tool_round("".join(round_parts) or None,
+                                               [tuple(pending[index]) for index in sorted(pending)])
+                tools_started = time.perf_counter()
+                self._tool_messages.extend(await self.tools.run_async(calls))
+                self.last_timings["tool_seconds"] += time.perf_counter() - tools_started
+            
+            response = "".join(parts)
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": response
+            })
+        finally:
+            if response is None:
+                # Failed or abandoned by the caller: the turn never happened
+                self._abandon_turn()
+        
+        if cache_key is not None and self._cacheable:
+            await asyncio.to_thread(self.cache.store, cache_key, response,
+                                    time.perf_counter() - started)
@@ -0,0 +1,265 @@
+"""Local functions the chat assistant can call as OpenAI tools."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .bjj_reference import (BJJ_POSITIONS, BJJ_TECHNIQUES, find_position_chains,
+                            get_position_info, get_techniques_by_type, search_techniques)
+from .bjj_rules import RULE_DIVISIONS, check_legality
+
+# Longest tool result sent back to the model, in characters
+MAX_RESULT_CHARS = 4000
+
+# Stats key that calls to tools the model made up are counted under
+UNKNOWN_TOOL = "(unknown)"
+
+# Tools that read the user's notes or the rule documents, which can change
+# between two identical questions; answers that used them are not cached
+UNCACHEABLE_TOOLS = frozenset(["search_notes", "search_rules"])
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the process-wide pool tool calls run on, creating it on first use."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=int(os.getenv("CHAT_TOOL_WORKERS", "4")),
+                                           thread_name_prefix="chat-tool")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _largest_list(value):
+    """Return the non-empty list within value whose JSON is longest, or None."""
+    lists = []
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, list) and item:
+            lists.append(item)
+        if isinstance(item, (dict, list)):
+            pending.extend(item.values() if isinstance(item, dict) else item)
+    return max(lists, key=lambda item: len(json.dumps(item)), default=None)
+
+
+def _truncate(data, limit):
+    """Return data as JSON text of at most limit characters, marked "truncated": true.
+
+    Items are dropped from the end of the longest list until it fits, so
+    the model still gets valid JSON and as many whole results as fit.
+    """
+    result = json.loads(json.dumps(data, default=dict))
+    result = {**result, "truncated": True} if isinstance(result, dict) else {
+        "results": result, "truncated": True}
+    text = json.dumps(result)
+    while len(text) > limit:
+        largest = _largest_list(result)
+        if largest is None:
+            return json.dumps({"truncated": True})
+        if len(largest) > 1:
+            # Keep about the share of the items that fits
+            del largest[max(1, len(largest) * limit // len(text)):]
+        else:
+            largest.clear()
+        text = json.dumps(result)
+    return text
+
+
+def _function(name, description, properties, required):
+    """Return an OpenAI tool definition for a function."""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": required
+            }
+        }
+    }
+
+
+REFERENCE_TOOLS = [
+    _function("search_techniques",
+              "Search the BJJ technique reference by name, e.g. 'armbar' or 'sweep'. "
+              "Returns matching techniques with their category and starting position.",
+              {"query": {"type": "string", "description": "Technique name or part of it"}},
+              ["query"]),
+    _function("get_position_info",
+              "Get the reference entry for a position: description, variations and key concepts.",
+              {"position": {"type": "string",
+                            "description": f"Position name, one of {', '.join(BJJ_POSITIONS)}"}},
+              ["position"]),
+    _function("get_techniques_by_type",
+              "List every technique of one type from the reference.",
+              {"technique_type": {"type": "string", "enum": list(BJJ_TECHNIQUES)}},
+              ["technique_type"]),
+    _function("find_position_chains",
+              "Find the shortest chains of techniques from one position to another, e.g. "
+              "from closed guard to back control. Each chain lists the positions passed "
+              "through and the techniques for each move.",
+              {"start": {"type": "string", "description": "Starting position or variation"},
+               "goal": {"type": "string", "description": "Position to reach"},
+               "start_side": {"type": "string", "enum": ["top", "bottom"],
+                              "description": "The student's side at the start, if known"}},
+              ["start", "goal"])
+]
+
+NOTES_TOOL = _function(
+    "search_notes",
+    "Search the student's own training notes. Returns excerpts of the most relevant notes.",
+    {"query": {"type": "string", "description": "Keywords to look for"}},
+    ["query"]
+)
+
+RULES_TOOLS = [
+    _function("search_rules",
+              "Search the official IBJJF rule documents. Returns the most relevant passages "
+              "with their source document.",
+              {"query": {"type": "string", "description": "What to look up in the rules"}},
+              ["query"]),
+    _function("check_legality",
+              "Check whether a technique or leg lock position is legal in an IBJJF division "
+              "for a belt, with the foul severity and penalty if it is not.",
+              {"division": {"type": "string", "enum": list(RULE_DIVISIONS)},
+               "belt": {"type": "string",
+                        "enum": ["white", "grey", "yellow", "orange", "green", "blue",
+                                 "purple", "brown", "black"]},
+               "technique": {"type": "string",
+                             "description": "Technique or position, e.g. heel hook, knee reaping"}},
+              ["division", "belt", "technique"])
+]
+
+
+class ChatTools:
+    """The local functions offered to the model, and their execution.
+
+    Reference and legality lookups are always offered; note and rule search
+    only when a note retriever or rules index is given.  Calls the model
+    requests together are run concurrently on a shared thread pool.  Call
+    counts, errors and time spent are kept per tool, separately from model
+    time.
+    """
+
+    def __init__(self, note_retriever=None, rules_index=None):
+        """Initialize the tools over optional notes and rules sources."""
+        self.note_retriever = note_retriever
+        self.rules_index = rules_index
+        self.functions = {
+            "search_techniques": search_techniques,
+            "get_position_info": self._position_info,
+            "get_techniques_by_type": self._techniques_by_type,
+            "find_position_chains": find_position_chains,
+            "check_legality": self._check_legality
+        }
+        self.definitions = list(REFERENCE_TOOLS) + [RULES_TOOLS[1]]
+        if note_retriever is not None:
+            self.functions["search_notes"] = self._search_notes
+            self.definitions.append(NOTES_TOOL)
+        if rules_index is not None:
+            self.functions["search_rules"] = self._search_rules
+            self.definitions.append(RULES_TOOLS[0])
+        self._stats = {name: {"calls": 0, "errors": 0, "seconds": 0.0} for name in self.functions}
+        self._lock = threading.Lock()
+
+    def _position_info(self, position):
+        """Return a position's reference entry, or an error naming the known positions."""
+        info = get_position_info(position)
+        if info is None:
+            raise ValueError(f"Unknown position '{position}'. Known positions: "
+                             f"{', '.join(BJJ_POSITIONS)}")
+        return info
+
+    def _techniques_by_type(self, technique_type):
+        """Return the techniques of one type."""
+        techniques = get_techniques_by_type(technique_type)
+        if techniques is None:
+            raise ValueError(f"Unknown technique type '{technique_type}'")
+        return techniques
+
+    def _check_legality(self, division, belt, technique):
+        """Return the legality verdict for a technique in a division and belt."""
+        return check_legality(division, belt, technique)
+
+    def _search_notes(self, query):
+        """Return excerpts of the notes most relevant to query."""
+        return self.note_retriever.retrieve(query)
+
+    def _search_rules(self, query):
+        """Return the rule passages most relevant to query."""
+        return [{"source": chunk["source"], "page": chunk["page"],
+                 "heading": chunk["heading"], "text": chunk["text"]}
+                for chunk in self.rules_index.search(query, limit=3)]
+
+    def call(self, name, arguments):
+        """Run one tool call and return its result as a JSON string.
+
+        arguments is the JSON text the model sent.  Errors, such as an
+        unknown tool or bad arguments, are returned to the model as
+        {"error": ...} so it can correct itself.  A result too long to send
+        loses items from its longest list and gains "truncated": true.
+        """
+        started = time.perf_counter()
+        failed = False
+        try:
+            function = self.functions.get(name)
+            if function is None:
+                raise ValueError(f"Unknown tool '{name}'")
+            # Reference lookups return read-only mappings, serialized as plain objects
+            data = function(**json.loads(arguments or "{}"))
+            result = json.dumps(data, default=dict)
+            if len(result) > MAX_RESULT_CHARS:
+                result = _truncate(data, MAX_RESULT_CHARS)
+        except Exception as e:
+            failed = True
+            result = json.dumps({"error": str(e)[:MAX_RESULT_CHARS // 2]})
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = self._stats.setdefault(name if name in self.functions else UNKNOWN_TOOL,
+                                           {"calls": 0, "errors": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += failed
+            stats["seconds"] += elapsed
+        return result
+
+    def run(self, calls):
+        """Run the (id, name, arguments) calls and return their tool messages, in order."""
+        if len(calls) == 1:
+            results = [self.call(calls[0][1], calls[0][2])]
+        else:
+            executor = _get_executor()
+            futures = [executor.submit(self.call, name, arguments) for _, name, arguments in calls]
+            results = [future.result() for future in futures]
+        return [{"role": "tool", "tool_call_id": call_id, "content": result}
+                for (call_id, _, _), result in zip(calls, results)]
+
+    async def run_async(self, calls):
+        """Run the calls like run(), without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(_get_executor(), self.call, name, arguments)
+            for _, name, arguments in calls
+        ])
+        return [{"role": "tool", "tool_call_id": call_id, "content": result}
+                for (call_id, _, _), result in zip(calls, results)]
+
+    def stats(self):
+        """Return calls, errors and seconds spent per tool."""
+        with self._lock:
+            tools = {name: {**stats, "seconds": round(stats["seconds"], 4)}
+                     for name, stats in self._stats.items()}
+        return {
+            "calls": sum(stats["calls"] for stats in tools.values()),
+            "seconds": round(sum(stats["seconds"] for stats in tools.values()), 4),
+            "tools": tools
+        }
@@ -0,0 +1,103 @@
+"""Token-budgeted view of a chat conversation."""
+
+import re
+from functools import lru_cache
+
+# Tokens a chat message costs beyond its text (role and separators)
+MESSAGE_OVERHEAD = 4
+
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Estimate the number of model tokens in text, without any network access.
+
+    Words are counted as one token per four characters and each punctuation
+    mark as one token, which tracks OpenAI's tokenizers closely enough for
+    budgeting English text.  None, the content of a message without text,
+    counts as empty.
+    """
+    if not text:
+        return 0
+    return len(_TOKEN_RE.findall(text))
+
+
+def message_tokens(message):
+    """Estimate the tokens a chat message costs."""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def _first_sentence(text, max_words=30):
+    """Return the first sentence of text, cut to max_words words."""
+    sentence = _SENTENCE_END_RE.split(text.strip(), 1)[0]
+    words = sentence.split()
+    if len(words) > max_words:
+        return " ".join(words[:max_words]) + " ..."
+    return " ".join(words)
+
+
+class ContextWindow:
+    """Chooses which messages of a conversation to send to the model.
+
+    The system prompt is always sent, followed by as many of the most recent
+    turns as fit in max_tokens.  Turns that no longer fit are replaced by a
+    short summary of at most summary_tokens, made of the opening sentence of
+    each of the latest dropped questions and answers.  Only the turns near
+    the cut are looked at, so building the context costs the same however
+    long the conversation has run.
+    """
+
+    def __init__(self, max_tokens=3000, summary_tokens=300):
+        """Initialize a window of max_tokens, of which summary_tokens may hold the summary."""
+        if summary_tokens >= max_tokens:
+            raise ValueError("summary_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self._summary_cache = (None, None, None)   # (cut, last summarized text, summary message)
+
+    def build(self, history):
+        """Return the messages of history to send, within the token budget.
+
+        history starts with the system message; the latest message is always
+        included, even if it alone is over budget.
+        """
+        budget = self.max_tokens - self.summary_tokens - message_tokens(history[0])
+
+        # Walk back from the newest message, keeping whole turns while they fit
+        cut = len(history)
+        used = 0
+        for index in range(len(history) - 1, 0, -1):
+            used += message_tokens(history[index])
+            if used > budget and cut < len(history):
+                break
+            if history[index]["role"] == "user":
+                cut = index
+        if cut <= 1:
+            return list(history)
+
+        return [history[0], self._summary(history, cut)] + history[cut:]
+
+    def _summary(self, history, cut):
+        """Return a system message summarizing history[1:cut], reusing the last one if unchanged."""
+        last = history[cut - 1]["content"]
+        if self._summary_cache[0] == cut and self._summary_cache[1] == last:
+            return self._summary_cache[2]
+
+        header = "Summary of earlier parts of this conversation:"
+        lines = []
+        used = count_tokens(header) + MESSAGE_OVERHEAD
+        for index in range(cut - 1, 0, -1):
+            message = history[index]
+            prefix = "Student asked" if message["role"] == "user" else "You answered"
+            line = f"- {prefix}: {_first_sentence(message['content'] or '')}"
+            used += count_tokens(line)
+            if used > self.summary_tokens:
+                break
+            lines.append(line)
+
+        lines.reverse()
+        summary = {"role": "system", "content": "\n".join([header] + lines)}
+        self._summary_cache = (cut, last, summary)
+        return summary
@@ -0,0 +1,171 @@
+"""Server-side storage for chat conversations."""
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-turn bookkeeping overhead added to the text size, in bytes
+_TURN_OVERHEAD = 200
+
+
+def _turns_size(turns):
+    """Return the approximate memory footprint of a list of turns."""
+    return sum(len(turn["user"]) + len(turn["assistant"]) + _TURN_OVERHEAD for turn in turns)
+
+
+class ConversationStore:
+    """Keeps chat conversations server-side, keyed by an opaque session id.
+
+    Each conversation is a list of {"user", "assistant"} turns.  Conversations
+    live in memory in least-recently-used order; an idle conversation expires
+    after ttl seconds, and the least recently used ones are evicted once there
+    are more than max_conversations or their text exceeds max_bytes.
+
+    With a path, every turn is also written to a SQLite database there, and
+    memory only caches it.  Evicted conversations are then loaded back on
+    their next use instead of being lost, and several processes (for example
+    gunicorn workers) given the same path share their conversations: a read
+    checks the database for turns another process has added since.
+    """
+
+    def __init__(self, max_conversations=1000, ttl=24 * 3600, max_bytes=64 * 1024 * 1024,
+                 path=None):
+        """Initialize an empty store."""
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        self._conversations = OrderedDict()   # id -> (turns, size, last used)
+        self._bytes = 0
+        self._db = None
+        self._purged_at = time.time()
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            # Transactions are begun explicitly, so a turn's read and write
+            # are not interleaved with another process's
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, turns TEXT NOT NULL, last_used REAL NOT NULL)")
+
+    @staticmethod
+    def new_id():
+        """Return a new random conversation id."""
+        return secrets.token_urlsafe(16)
+
+    def __len__(self):
+        """Return the number of conversations held in memory."""
+        return len(self._conversations)
+
+    def _load(self, conversation_id, now):
+        """Return the live turns for conversation_id, or None; the caller holds the lock."""
+        entry = self._conversations.get(conversation_id)
+        if self._db is None:
+            if entry is None:
+                return None
+            if now - entry[2] <= self.ttl:
+                self._conversations.move_to_end(conversation_id)
+                return entry[0]
+            self._drop(conversation_id)
+            return None
+
+        # The database is the source of truth, as other processes write to it
+        row = self._db.execute("SELECT turns, last_used FROM conversations WHERE id = ?",
+                               (conversation_id,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            self._drop(conversation_id)
+            return None
+        if entry is not None and entry[2] >= row[1]:
+            self._conversations.move_to_end(conversation_id)
+            return entry[0]
+        turns = json.loads(row[0])
+        self._insert(conversation_id, turns, row[1])
+        return turns
+
+    def _insert(self, conversation_id, turns, now):
+        """Store turns in memory as most recently used; the caller holds the lock."""
+        self._drop(conversation_id)
+        size = _turns_size(turns)
+        self._conversations[conversation_id] = (turns, size, now)
+        self._bytes += size
+        self._evict(now)
+
+    def _drop(self, conversation_id):
+        """Remove a conversation from memory; the caller holds the lock."""
+        entry = self._conversations.pop(conversation_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self, now):
+        """Expire idle conversations and evict the least recently used over the limits.
+
+        The most recently used conversation is always kept, even if it alone
+        is larger than max_bytes.  Evicted conversations stay in the database.
+        """
+        while self._conversations:
+            oldest_id, (_, _, last_used) = next(iter(self._conversations.items()))
+            expired = now - last_used > self.ttl
+            over_limit = (len(self._conversations) > self.max_conversations or
+                          self._bytes > self.max_bytes) and len(self._conversations) > 1
+            if not expired and not over_limit:
+                break
+            self._drop(oldest_id)
+
+    def get(self, conversation_id):
+        """Return a copy of the turns of a conversation (empty if unknown or expired)."""
+        with self._lock:
+            turns = self._load(conversation_id, time.time())
+            return list(turns) if turns else []
+
+    def append(self, conversation_id, user_message, assistant_message):
+        """Add a turn to a conversation, creating it if needed."""
+        turn = {"user": user_message, "assistant": assistant_message}
+        with self._lock:
+            now = time.time()
+            if self._db is None:
+                turns = self._load(conversation_id, now) or []
+                self._insert(conversation_id, turns + [turn], now)
+                return
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                turns = (self._load(conversation_id, now) or []) + [turn]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO conversations (id, turns, last_used) VALUES (?, ?, ?)",
+                    (conversation_id, json.dumps(turns), now))
+                if now - self._purged_at > 60:
+                    self._purged_at = now
+                    self._db.execute("DELETE FROM conversations WHERE last_used < ?",
+                                     (now - self.ttl,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._drop(conversation_id)
+                raise
+            self._insert(conversation_id, turns, now)
+
+    def clear(self, conversation_id):
+        """Forget a conversation."""
+        with self._lock:
+            self._drop(conversation_id)
+            if self._db is not None:
+                self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def purge_expired(self):
+        """Drop every expired conversation, in memory and in the database."""
+        with self._lock:
+            now = time.time()
+            for conversation_id in [conversation_id for conversation_id, entry
+                                    in self._conversations.items() if now - entry[2] > self.ttl]:
+                self._drop(conversation_id)
+            if self._db is not None:
+                self._db.execute("DELETE FROM conversations WHERE last_used < ?",
+                                 (now - self.ttl,))
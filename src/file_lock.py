@@ -0,0 +1,98 @@
+"""Advisory file locks shared between threads and processes."""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+def _lock_file(f, blocking):
+    """Take an exclusive lock on an open file, returning False if busy."""
+    if fcntl is not None:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f.fileno(), flags)
+        except BlockingIOError:
+            return False
+        return True
+    if msvcrt is not None:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                threading.Event().wait(0.05)
+    # No OS-level locking available; only threads are serialized
+    return True
+
+
+def _unlock_file(f):
+    """Release a lock taken by _lock_file."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Reentrant exclusive lock backed by an advisory lock on path.
+
+    Threads of one process are serialized by an in-process lock; processes
+    are serialized by flock() (or msvcrt.locking() on Windows).  On platforms
+    with neither, only the in-process lock applies.  The lock file is
+    reopened after a fork so that parent and child never share a lock.
+    """
+
+    def __init__(self, path):
+        """Initialize a lock on path; the file is created on first use."""
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self._pid = None
+
+    def acquire(self, blocking=True):
+        """Acquire the lock, returning False if blocking is False and it is held."""
+        if not self._lock.acquire(blocking):
+            return False
+        if self._depth == 0:
+            try:
+                if self._file is None or self._pid != os.getpid():
+                    self._file = open(self.path, "a+b")
+                    self._pid = os.getpid()
+                if not _lock_file(self._file, blocking):
+                    self._lock.release()
+                    return False
+            except Exception:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        """Release one level of the lock."""
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_file(self._file)
+        self._lock.release()
+
+    def __enter__(self):
+        """Acquire the lock for a with block."""
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """Release the lock at the end of a with block."""
+        self.release()
@@ -0,0 +1,156 @@
+"""Typo-tolerant name matching with a character trigram index."""
+
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def fold(text):
+    """Lowercase text, strip accents and collapse punctuation to single spaces."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def trigrams(text):
+    """Return the set of character trigrams of each word of folded text, padded with spaces."""
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def max_typos(query):
+    """Return the edit distance tolerated for a folded query of this length."""
+    length = len(query)
+    if length < 4:
+        return 0
+    if length < 6:
+        return 1
+    return 2
+
+
+def bounded_edit_distance(a, b, bound):
+    """Return the Levenshtein distance between a and b, or bound + 1 if it exceeds bound.
+
+    Only the diagonal band of width 2 * bound + 1 is filled in, and the scan
+    stops as soon as a whole row exceeds bound.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if len(a) > len(b):
+        a, b = b, a
+    over = bound + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low = max(1, i - bound)
+        high = min(len(b), i + bound)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= bound else over
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        if min(current[low - 1:high + 1]) > bound:
+            return over
+        previous = current
+    return min(previous[len(b)], over)
+
+
+class FuzzyIndex:
+    """Finds items whose names or aliases are spelled like a query.
+
+    Every name is folded (lowercase, no accents or punctuation) and indexed
+    by its word trigrams.  A query first gathers candidates sharing enough
+    trigrams with it, ranked by the share of the query's trigrams they
+    contain; only the best candidates are then checked with an edit distance
+    bounded by max_typos(), against each run of as many words as the query
+    has.  Exact word prefixes, such as "rnc" for the alias "RNC", always
+    match.
+    """
+
+    def __init__(self, min_similarity=0.3, max_candidates=50):
+        """Initialize an empty index."""
+        self.min_similarity = min_similarity
+        self.max_candidates = max_candidates
+        self._items = []       # item number -> item
+        self._names = []       # name number -> (folded name, item number)
+        self._postings = {}    # trigram -> array of name numbers, compact and quick to pickle
+
+    def add(self, item, names):
+        """Index item under each of names."""
+        number = len(self._items)
+        self._items.append(item)
+        for name in names:
+            folded = fold(name)
+            if not folded:
+                continue
+            name_number = len(self._names)
+            self._names.append((folded, number))
+            for gram in trigrams(folded):
+                self._postings.setdefault(gram, array("I")).append(name_number)
+
+    def _distance(self, query, name, bound):
+        """Return the smallest bounded distance between query and a run of words of name."""
+        words = name.split()
+        width = len(query.split())
+        best = bound + 1
+        for start in range(max(len(words) - width + 1, 1)):
+            window = " ".join(words[start:start + width])
+            if window.startswith(query):
+                return 0
+            best = min(best, bounded_edit_distance(query, window, bound))
+            if best == 0:
+                break
+        return best
+
+    def containing(self, query):
+        """Return the items with a name that may contain query, in the order added.
+
+        Each trigram inside a word of the folded query must occur in such a
+        name, so their posting lists are intersected, shortest first; callers
+        check the survivors themselves.  Returns None if the query has no word
+        of three or more characters to narrow the names down with.
+        """
+        grams = {word[i:i + 3] for word in fold(query).split() for i in range(len(word) - 2)}
+        if not grams:
+            return None
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        names = set(postings[0])
+        for posting in postings[1:]:
+            if not names:
+                break
+            names.intersection_update(posting)
+        numbers = sorted({self._names[name_number][1] for name_number in names})
+        return [self._items[number] for number in numbers]
+
+    def search(self, query, limit=10):
+        """Return up to limit (None for all) items matching query, closest first, each item once."""
+        query = fold(query)
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        needed = self.min_similarity * len(grams)
+        candidates = [(count, name_number) for name_number, count in shared.items()
+                      if count >= needed]
+        candidates.sort(reverse=True)
+
+        bound = max_typos(query)
+        best = {}
+        for count, name_number in candidates[:self.max_candidates]:
+            name, number = self._names[name_number]
+            distance = self._distance(query, name, bound)
+            if distance > bound:
+                continue
+            rank = (distance, -count / len(grams), len(name))
+            if number not in best or rank < best[number]:
+                best[number] = rank
+        ranked = sorted(best, key=lambda number: (best[number], number))
+        return [self._items[number] for number in ranked[:limit]]
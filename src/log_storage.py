@@ -0,0 +1,372 @@
+"""Append-only, log-structured storage backend for notes."""
+
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from .file_lock import FileLock
+from .note_storage import (
+    NoteStorage, JsonNoteStorage, NoteMetadataIndex, SEARCH_FIELD_WEIGHTS, _manifest_metadata
+)
+from .search_index import InvertedIndex
+
+# Record header: crc32 of the rest of the record, kind, key length, value length
+_HEADER = struct.Struct(">IBHI")
+_PUT = 1
+_DELETE = 2
+
+_SEGMENT_RE = re.compile(r"^segment-(\d{8})-(\d{4})\.log$")
+
+
+def _segment_name(key):
+    """Return the file name of the segment with key (sequence, generation)."""
+    return f"segment-{key[0]:08d}-{key[1]:04d}.log"
+
+
+def _encode_record(kind, note_id, value):
+    """Encode a record as header + key + value bytes."""
+    key = note_id.encode("utf-8")
+    body = _HEADER.pack(0, kind, len(key), len(value))[4:] + key + value
+    return struct.pack(">I", zlib.crc32(body)) + body
+
+
+class _Segment:
+    """An open segment file and its space accounting."""
+
+    __slots__ = ("path", "file", "size", "dead_bytes")
+
+    def __init__(self, path, file, size):
+        self.path = path
+        self.file = file
+        self.size = size
+        self.dead_bytes = 0
+
+
+class LogNoteStorage(NoteStorage):
+    """Stores notes as records appended to segment files in log_dir.
+
+    Every write (new note, update or tombstone for a delete) is a sequential
+    append to the active segment.  An in-memory index maps each note ID to
+    the (segment, offset, length) of its latest record, so a read is one seek.
+    When superseded records make up more than compaction_threshold of the
+    sealed segments, a background thread copies the live records into a new
+    segment and deletes the old ones.  On start-up the index is rebuilt by
+    replaying the segments in order; a torn record at the end of the last
+    segment (from a crash mid-write) is truncated away.
+
+    The index lives in one process's memory, so the log must only be opened
+    by a single process at a time; opening it from a second process (or
+    writing from a forked child) raises an exception.  Use the JSON or
+    SQLite backend to serve notes from several worker processes.
+    """
+
+    def __init__(self, log_dir, segment_size=4 * 1024 * 1024,
+                 compaction_threshold=0.5, sync=False):
+        """Open the log in log_dir, recovering the index from its segments."""
+        super().__init__()
+        self.log_dir = log_dir
+        self.segment_size = segment_size
+        self.compaction_threshold = compaction_threshold
+        self.sync = sync
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self._owner = FileLock(os.path.join(log_dir, "LOCK"))
+        if not self._owner.acquire(blocking=False):
+            raise Exception(f"Note log {log_dir} is already open in another process")
+        self._pid = os.getpid()
+        self._segments = {}        # (sequence, generation) -> _Segment
+        self._locations = {}       # note id -> (segment key, offset, length)
+        self._meta = NoteMetadataIndex()
+        self._index = None         # full-text index, built on first search
+        self._active = None
+        self._compactor = None
+        self._compaction_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._recover()
+
+    def _recover(self):
+        """Rebuild the in-memory index by replaying every segment."""
+        keys = []
+        for name in os.listdir(self.log_dir):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                keys.append((int(match.group(1)), int(match.group(2))))
+            elif name.endswith(".tmp"):
+                # Left behind by a compaction that never finished
+                os.remove(os.path.join(self.log_dir, name))
+        keys.sort()
+
+        for position, key in enumerate(keys):
+            path = os.path.join(self.log_dir, _segment_name(key))
+            last = position == len(keys) - 1
+            segment = _Segment(path, open(path, "a+b" if last else "rb"), 0)
+            self._segments[key] = segment
+            segment.size = self._replay(key, segment, truncate_tail=last)
+
+        if keys and self._segments[keys[-1]].size < self.segment_size:
+            self._active = keys[-1]
+        else:
+            self._roll((keys[-1][0] + 1 if keys else 1, 0))
+
+    def _replay(self, key, segment, truncate_tail):
+        """Apply every valid record in a segment, returning its valid length."""
+        segment.file.seek(0)
+        data = segment.file.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            crc, kind, key_len, value_len = _HEADER.unpack_from(data, offset)
+            end = offset + _HEADER.size + key_len + value_len
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                break
+            start = offset + _HEADER.size
+            note_id = data[start:start + key_len].decode("utf-8")
+            if kind == _PUT:
+                note = json.loads(data[start + key_len:end])
+                self._set_location(note_id, (key, offset, end - offset))
+                self._meta.add(_manifest_metadata(note))
+            else:
+                self._clear_location(note_id)
+                self._meta.remove(note_id)
+                segment.dead_bytes += end - offset
+            offset = end
+
+        if offset < len(data):
+            if truncate_tail:
+                segment.file.truncate(offset)
+            else:
+                segment.dead_bytes += len(data) - offset
+        return offset
+
+    def _roll(self, key):
+        """Start a new active segment."""
+        path = os.path.join(self.log_dir, _segment_name(key))
+        self._segments[key] = _Segment(path, open(path, "a+b"), 0)
+        if self._active is not None:
+            active = self._segments[self._active]
+            active.file.close()
+            active.file = open(active.path, "rb")
+        self._active = key
+
+    def _set_location(self, note_id, location):
+        """Point note_id at a new record, marking the old one dead."""
+        self._clear_location(note_id)
+        self._locations[note_id] = location
+
+    def _clear_location(self, note_id):
+        """Forget note_id's record, marking it dead."""
+        old = self._locations.pop(note_id, None)
+        if old is not None:
+            self._segments[old[0]].dead_bytes += old[2]
+
+    def _append(self, records):
+        """Append encoded records to the active segment; return their locations."""
+        if os.getpid() != self._pid:
+            raise Exception("Note log cannot be written from a forked process")
+        segment = self._segments[self._active]
+        locations = []
+        for record in records:
+            locations.append((self._active, segment.size, len(record)))
+            segment.size += len(record)
+        segment.file.write(b"".join(records))
+        segment.file.flush()
+        if self.sync:
+            os.fsync(segment.file.fileno())
+        if segment.size >= self.segment_size:
+            self._roll((self._active[0] + 1, 0))
+        return locations
+
+    def _read(self, location):
+        """Read and decode the note stored at location (one seek)."""
+        key, offset, length = location
+        segment = self._segments[key]
+        segment.file.seek(offset)
+        data = segment.file.read(length)
+        _, _, key_len, _ = _HEADER.unpack_from(data)
+        return json.loads(data[_HEADER.size + key_len:])
+
+    def get(self, note_id):
+        """Return the note with note_id, or None if it does not exist."""
+        with self._lock:
+            location = self._locations.get(note_id)
+            return self._read(location) if location else None
+
+    def put(self, note):
+        """Append a note record."""
+        self.put_many([note])
+
+    def put_many(self, notes):
+        """Append records for several notes in one sequential write."""
+        notes = list(notes)
+        records = [_encode_record(_PUT, note["id"], json.dumps(note).encode("utf-8"))
+                   for note in notes]
+        with self._lock:
+            for note, location in zip(notes, self._append(records)):
+                self._set_location(note["id"], location)
+                self._meta.add(_manifest_metadata(note))
+                if self._index is not None:
+                    self._index.add(note["id"], note)
+        for note in notes:
+            self._notify(note["id"], note)
+        self._maybe_compact()
+
+    def delete(self, note_id):
+        """Append a tombstone for a note, returning False if it did not exist."""
+        with self._lock:
+            if note_id not in self._locations:
+                return False
+            (location,) = self._append([_encode_record(_DELETE, note_id, b"")])
+            self._clear_location(note_id)
+            self._segments[location[0]].dead_bytes += location[2]
+            self._meta.remove(note_id)
+            if self._index is not None:
+                self._index.remove(note_id)
+        self._notify(note_id, None)
+        self._maybe_compact()
+        return True
+
+    def iter_notes(self):
+        """Yield every stored note."""
+        with self._lock:
+            note_ids = list(self._locations)
+        for note_id in note_ids:
+            note = self.get(note_id)
+            if note is not None:
+                yield note
+
+    def list_metadata(self, category=None, tag=None, limit=None, after=None):
+        """List note metadata, newest first, optionally filtered and paged."""
+        with self._lock:
+            return [dict(meta, tags=list(meta["tags"]))
+                    for meta in self._meta.select(category, tag, limit, after)]
+
+    def ids_with_tag(self, tag):
+        """Return the IDs of notes carrying tag."""
+        with self._lock:
+            return self._meta.ids_with_tag(tag)
+
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of the newest notes in category."""
+        with self._lock:
+            return self._meta.ids_in_category(category, limit)
+
+    def metadata_for(self, note_ids):
+        """Return {note id: metadata} for the existing notes among note_ids."""
+        with self._lock:
+            return self._meta.metadata_for(note_ids)
+
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        with self._lock:
+            return self._meta.categories()
+
+    def search(self, query, limit=None, operator=None):
+        """Return notes matching query, ranked by BM25 relevance."""
+        with self._lock:
+            if self._index is None:
+                index = InvertedIndex(SEARCH_FIELD_WEIGHTS)
+                for note_id, location in self._locations.items():
+                    index.add(note_id, self._read(location))
+                self._index = index
+            ranked = self._index.search(query, limit=limit, operator=operator)
+            return [self._read(self._locations[note_id]) for note_id, _ in ranked]
+
+    def dead_ratio(self):
+        """Return the fraction of sealed-segment bytes held by dead records."""
+        with self._lock:
+            sealed = [segment for key, segment in self._segments.items() if key != self._active]
+            total = sum(segment.size for segment in sealed)
+            return sum(segment.dead_bytes for segment in sealed) / total if total else 0.0
+
+    def _maybe_compact(self):
+        """Start background compaction once dead space passes the threshold."""
+        with self._lock:
+            if self._compactor is not None or self.dead_ratio() < self.compaction_threshold:
+                return
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """Rewrite the live records of every sealed segment into one new segment.
+
+        The new segment takes the highest sealed sequence number with a newer
+        generation, so it replays after the segments it replaces but before
+        the active one.  Writes continue to the active segment meanwhile; any
+        note rewritten during compaction keeps pointing at its newer record.
+        """
+        try:
+            with self._compaction_lock:
+                self._compact()
+        finally:
+            with self._lock:
+                if self._compactor is threading.current_thread():
+                    self._compactor = None
+
+    def _compact(self):
+        """Run one compaction; the caller must hold the compaction lock."""
+        with self._lock:
+            sealed = sorted(key for key in self._segments if key != self._active)
+            if not sealed:
+                return
+            moves = [(note_id, location) for note_id, location in self._locations.items()
+                     if location[0] in sealed]
+        target = (sealed[-1][0], max(generation for _, generation in sealed) + 1)
+        path = os.path.join(self.log_dir, _segment_name(target))
+        tmp_path = path + ".tmp"
+
+        new_locations = []
+        with open(tmp_path, "wb") as out:
+            offset = 0
+            for note_id, (key, old_offset, length) in moves:
+                with self._lock:
+                    segment = self._segments[key]
+                    segment.file.seek(old_offset)
+                    record = segment.file.read(length)
+                out.write(record)
+                new_locations.append((target, offset, length))
+                offset += length
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            compacted = _Segment(path, open(path, "rb"), offset)
+            self._segments[target] = compacted
+            for (note_id, old_location), new_location in zip(moves, new_locations):
+                if self._locations.get(note_id) == old_location:
+                    self._locations[note_id] = new_location
+                else:
+                    compacted.dead_bytes += new_location[2]
+            for key in sealed:
+                segment = self._segments.pop(key)
+                segment.file.close()
+                os.remove(segment.path)
+
+    def close(self):
+        """Wait for any running compaction and close every segment."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            for segment in self._segments.values():
+                segment.file.close()
+            if self._segments:
+                self._owner.release()
+            self._segments.clear()
+
+
+def migrate_json_to_log(notes_dir, log_dir):
+    """Copy every JSON note in notes_dir into the note log in log_dir.
+
+    Notes already in the log are superseded by the copied version, so the
+    migration can be re-run safely.  Returns the number of notes migrated.
+    """
+    source = JsonNoteStorage(notes_dir)
+    target = LogNoteStorage(log_dir)
+    try:
+        notes = list(source.iter_notes())
+        target.put_many(notes)
+        return len(notes)
+    finally:
+        target.close()
@@ -0,0 +1,112 @@
+"""Retrieval of relevant note excerpts for the chat assistant."""
+
+import re
+from .context_window import count_tokens
+from .search_index import tokenize
+
+# Words too common in questions to say anything about which note is relevant
+STOPWORDS = frozenset(tokenize(
+    "a about after again all also am an and any are as at be because been before "
+    "being between both but by can could did do does doing don down during each "
+    "few for from further get got had has have having he her here him his how i "
+    "if in into is it its just me more most my myself no nor not now of off on "
+    "once only or other our out over own same she should so some such than that "
+    "the their them then there these they this those through to too under until "
+    "up very was we were what when where which while who whom why will with would "
+    "you your yours explain tell show help know want need like best good way ways "
+    "thing things really please"
+))
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def question_terms(question):
+    """Return the distinct content words of a question, in order."""
+    terms = []
+    for term in tokenize(question):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def excerpt(text, terms, max_tokens):
+    """Return the sentences of text that best match terms, within max_tokens.
+
+    Sentences are ranked by how many distinct query terms they contain and
+    returned in their original order, joined with " ... " where text was
+    skipped.
+    """
+    sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
+    wanted = set(terms)
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: (-len(wanted.intersection(tokenize(sentences[i]))), i))
+
+    chosen = []
+    used = 0
+    for index in ranked:
+        cost = count_tokens(sentences[index])
+        if used + cost > max_tokens:
+            if not chosen:
+                # Cut an overlong best sentence down to the budget
+                words = sentences[index].split()
+                chosen.append((index, " ".join(words[:max_tokens // 2]) + " ..."))
+            break
+        chosen.append((index, sentences[index]))
+        used += cost
+    chosen.sort()
+
+    parts = []
+    previous = None
+    for index, sentence in chosen:
+        if previous is not None and index != previous + 1:
+            parts.append("...")
+        parts.append(sentence)
+        previous = index
+    return " ".join(parts)
+
+
+class NoteRetriever:
+    """Finds the user's notes relevant to a chat message.
+
+    Notes are ranked with the notes manager's full-text search, whose index
+    is kept up to date by the storage backend as notes change, so a lookup
+    touches only the notes containing the question's terms.  The top k notes
+    are cut down to excerpts that together stay within max_tokens.
+    """
+
+    def __init__(self, notes_manager, k=3, max_tokens=600):
+        """Initialize a retriever over notes_manager's notes."""
+        self.notes_manager = notes_manager
+        self.k = k
+        self.max_tokens = max_tokens
+
+    def retrieve(self, question):
+        """Return [{"id", "title", "excerpt"}] for the notes most relevant to question."""
+        terms = question_terms(question)
+        if not terms or self.k <= 0:
+            return []
+        notes = self.notes_manager.search_notes(" ".join(terms), limit=self.k, operator="or")
+        if not notes:
+            return []
+
+        per_note = self.max_tokens // len(notes)
+        results = []
+        for note in notes:
+            budget = max(per_note - count_tokens(note["title"]), 1)
+            results.append({
+                "id": note["id"],
+                "title": note["title"],
+                "excerpt": excerpt(note.get("content", ""), terms, budget)
+            })
+        return results
+
+    def context_message(self, question):
+        """Return note excerpts relevant to question as prompt text, or None."""
+        results = self.retrieve(question)
+        if not results:
+            return None
+        lines = ["Excerpts from the student's own notes that may be relevant "
+                 "(refer to them when they help):"]
+        for result in results:
+            lines.append(f"[{result['title']}] {result['excerpt']}")
+        return "\n".join(lines)
@@ -0,0 +1,879 @@
+"""Storage backends for notes.
+
+NotesManager persists notes through a NoteStorage backend.  The default
+JsonNoteStorage keeps one JSON file per note; other backends (such as the
+SQLite backend in sqlite_storage) implement the same interface.
+"""
+
+import os
+import bisect
+import json
+import threading
+import time
+from .file_lock import FileLock
+from .search_index import InvertedIndex
+
+# Relative importance of each note field in full-text search ranking
+SEARCH_FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "content": 1.0}
+
+# Metadata manifest kept inside the notes directory (not a .json note file)
+MANIFEST_NAME = ".manifest"
+MANIFEST_VERSION = 1
+MANIFEST_JOURNAL_MIN = 256
+
+# Lock file serializing writers, and a stamp replaced on every write so that
+# other processes can tell cheaply that their cached view is stale
+LOCK_NAME = ".lock"
+GENERATION_NAME = ".generation"
+
+
+def _copy_note(note):
+    """Return a copy of a cached note that callers may safely mutate."""
+    copied = dict(note)
+    copied["tags"] = list(note.get("tags", []))
+    return copied
+
+
+def sort_key(note):
+    """Return the (created_at, id) key that orders notes stably by age."""
+    return (note.get("created_at", ""), note["id"])
+
+
+def note_metadata(note):
+    """Return the listing metadata for a note."""
+    return {
+        "id": note["id"],
+        "title": note["title"],
+        "created_at": note["created_at"],
+        "tags": list(note.get("tags", [])),
+        "category": note.get("category", "general")
+    }
+
+
+def _manifest_metadata(note):
+    """Return the metadata kept in the manifest for a note."""
+    return {
+        "id": note["id"],
+        "title": note.get("title", ""),
+        "category": note.get("category", "general"),
+        "tags": list(note.get("tags", [])),
+        "created_at": note.get("created_at", ""),
+        "updated_at": note.get("updated_at", "")
+    }
+
+
+class NoteMetadataIndex:
+    """Note metadata with a listing order and tag/category posting lists.
+    
+    Every posting list is a sorted list of (created_at, id) keys, so pages of
+    notes (newest first, optionally filtered) can be read with a bisect and a
+    walk of O(page size).  Not thread-safe; owners guard it with their lock.
+    """
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self._meta = {}        # note id -> metadata
+        self._order = []       # sorted (created_at, id) keys of every note
+        self._by_tag = {}      # tag -> sorted (created_at, id) keys
+        self._by_category = {} # category -> sorted (created_at, id) keys
+    
+    def __len__(self):
+        """Return the number of indexed notes."""
+        return len(self._meta)
+    
+    def __contains__(self, note_id):
+        """Return True if note_id is indexed."""
+        return note_id in self._meta
+    
+    def ids(self):
+        """Return the IDs of every indexed note."""
+        return list(self._meta)
+    
+    def get(self, note_id):
+        """Return the stored metadata for note_id, or None."""
+        return self._meta.get(note_id)
+    
+    def add(self, meta):
+        """Index a note's metadata, replacing any previous entry."""
+        self.remove(meta["id"])
+        self._meta[meta["id"]] = meta
+        key = sort_key(meta)
+        bisect.insort(self._order, key)
+        for tag in set(meta.get("tags", [])):
+            bisect.insort(self._by_tag.setdefault(tag, []), key)
+        bisect.insort(self._by_category.setdefault(meta.get("category", "general"), []), key)
+    
+    def remove(self, note_id):
+        """Remove and return a note's metadata, or None if it is not indexed."""
+        meta = self._meta.pop(note_id, None)
+        if meta is None:
+            return None
+        key = sort_key(meta)
+        _discard_key(self._order, key)
+        for tag in set(meta.get("tags", [])):
+            _discard_posting(self._by_tag, tag, key)
+        _discard_posting(self._by_category, meta.get("category", "general"), key)
+        return meta
+    
+    def clear(self):
+        """Remove every entry."""
+        self.__init__()
+    
+    def select(self, category=None, tag=None, limit=None, after=None):
+        """Return metadata newest first, optionally filtered and paged.
+        
+        after is a (created_at, id) sort key; only notes that sort before it
+        are returned.  Filtering walks the smallest matching posting list, so
+        a page costs O(limit) rather than O(number of notes).
+        """
+        keys = self._order
+        if category is not None:
+            keys = self._by_category.get(category, [])
+        if tag is not None:
+            tagged = self._by_tag.get(tag, [])
+            if len(tagged) < len(keys):
+                keys = tagged
+        
+        end = bisect.bisect_left(keys, tuple(after)) if after else len(keys)
+        results = []
+        for position in range(end - 1, -1, -1):
+            if limit is not None and len(results) >= limit:
+                break
+            meta = self._meta[keys[position][1]]
+            if category is not None and meta.get("category", "general") != category:
+                continue
+            if tag is not None and tag not in meta.get("tags", []):
+                continue
+            results.append(meta)
+        return results
+    
+    def ids_with_tag(self, tag):
+        """Return the IDs of notes carrying tag."""
+        return [note_id for _, note_id in self._by_tag.get(tag, ())]
+    
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of the newest notes in category."""
+        keys = self._by_category.get(category, [])
+        start = 0 if limit is None else max(len(keys) - limit, 0)
+        return [note_id for _, note_id in reversed(keys[start:])]
+    
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        return sorted(self._by_category)
+    
+    def metadata_for(self, note_ids):
+        """Return {note id: listing metadata} for the indexed notes among note_ids."""
+        return {note_id: note_metadata(self._meta[note_id])
+                for note_id in note_ids if note_id in self._meta}
+
+
+class _Manifest:
+    """On-disk manifest of note metadata for a notes directory.
+    
+    The manifest is a JSON snapshot mapping each note file to its mtime,
+    size and metadata, plus an append-only journal of changes made since the
+    snapshot.  Appending a journal line keeps each write O(1); the journal is
+    folded into a new snapshot (written to a temporary file and renamed into
+    place) once it grows past a fraction of the notebook.  The manifest is
+    only a cache: every entry is checked against the file's mtime and size
+    before it is trusted.
+    """
+    
+    def __init__(self, notes_dir):
+        """Initialize the manifest paths for notes_dir."""
+        self.path = os.path.join(notes_dir, MANIFEST_NAME)
+        self.journal_path = self.path + ".log"
+        self._journal_entries = 0
+    
+    def load(self):
+        """Return {filename: (mtime_ns, size, metadata or None)} from disk."""
+        entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                for filename, (mtime_ns, size, meta) in data["files"].items():
+                    entries[filename] = (mtime_ns, size, meta)
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            entries = {}
+        
+        self._journal_entries = 0
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted append
+                        continue
+                    self._journal_entries += 1
+                    if record.get("d"):
+                        entries.pop(record["f"], None)
+                    else:
+                        entries[record["f"]] = (record["s"][0], record["s"][1], record.get("m"))
+        except OSError:
+            pass
+        return entries
+    
+    def append(self, changes):
+        """Journal the current state of each (filename, entry, metadata) change.
+        
+        entry is None for a file that is gone.  All changes are written with a
+        single append.
+        """
+        lines = []
+        for filename, entry, meta in changes:
+            if entry is None:
+                record = {"f": filename, "d": True}
+            else:
+                record = {"f": filename, "s": [entry[0], entry[1]], "m": meta}
+            lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if not lines:
+            return
+        try:
+            with open(self.journal_path, 'a') as f:
+                f.write("".join(lines))
+            self._journal_entries += len(lines)
+        except OSError:
+            pass
+    
+    def needs_compaction(self, file_count):
+        """Return True once the journal is large relative to the notebook."""
+        return self._journal_entries > max(MANIFEST_JOURNAL_MIN, file_count // 4)
+    
+    def write_snapshot(self, files, metadata):
+        """Atomically replace the snapshot and clear the journal."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": {
+                filename: [mtime_ns, size, metadata.get(note_id) if note_id is not None else None]
+                for filename, (mtime_ns, size, note_id) in files.items()
+            }
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
+        except OSError:
+            pass
+
+
+class _NoteCatalog:
+    """Process-wide cache of note metadata for a single notes directory.
+    
+    Metadata (title, category, tags, timestamps) for every note is kept in
+    memory and persisted to a manifest inside notes_dir, so a cold start
+    reads the manifest and only stats the note files instead of parsing them.
+    Note bodies are parsed lazily and cached.  On refresh the directory is
+    re-stat'ed and only files whose mtime or size changed are parsed again.
+    Tag/category posting lists are kept in step with every change, and a
+    full-text index is built on the first search and maintained thereafter.
+    
+    Writers hold lock (an advisory lock on notes_dir/.lock) and replace the
+    notes_dir/.generation stamp after every change, so a refresh in another
+    process notices the change from a single stat.
+    """
+    
+    def __init__(self, notes_dir, revalidate_interval=1.0):
+        """Initialize an empty catalog for notes_dir."""
+        self.notes_dir = notes_dir
+        self.revalidate_interval = revalidate_interval
+        self._files = {}       # filename -> (mtime_ns, size, note id or None)
+        self._owners = {}      # note id -> filename the note was read from
+        self._meta = NoteMetadataIndex()
+        self._bodies = {}      # note id -> full note, parsed on demand
+        self._index = None     # full-text index, built on first search
+        self._listeners = []
+        self._manifest = _Manifest(notes_dir)
+        self._manifest_loaded = False
+        self._reconciling = False
+        self._dirty = False
+        self._pending = None   # manifest changes batched by store_many
+        self._dir_mtime = None
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.lock = FileLock(os.path.join(notes_dir, LOCK_NAME))
+    
+    def _read_file(self, filepath):
+        """Parse a note file, returning None if it is unreadable."""
+        try:
+            with open(filepath, 'r') as f:
+                note = json.load(f)
+            if not isinstance(note, dict) or "id" not in note:
+                return None
+            return note
+        except Exception:
+            return None
+    
+    def add_listener(self, callback):
+        """Call callback(note_id, note) whenever a cached note changes.
+        
+        note is None when the note has been removed.  Changes made by other
+        processes are reported when a refresh discovers them.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Stop calling a callback registered with add_listener."""
+        with self._lock:
+            self._listeners = [listener for listener in self._listeners
+                               if listener != callback]
+    
+    def _add_note(self, note):
+        """Cache a parsed note and index it."""
+        note_id = note["id"]
+        self._remove_note(note_id, notify=False)
+        self._meta.add(_manifest_metadata(note))
+        self._bodies[note_id] = note
+        if self._index is not None:
+            self._index.add(note_id, note)
+        for callback in self._listeners:
+            callback(note_id, note)
+    
+    def _remove_note(self, note_id, notify=True):
+        """Drop a cached note from every index."""
+        if self._meta.remove(note_id) is None:
+            return
+        self._bodies.pop(note_id, None)
+        if self._index is not None:
+            self._index.remove(note_id)
+        if notify:
+            for callback in self._listeners:
+                callback(note_id, None)
+    
+    def _forget_file(self, filename, notify=True):
+        """Drop a file and the note it held from the catalog."""
+        if filename not in self._files:
+            return
+        _, _, note_id = self._files.pop(filename)
+        if note_id is not None and self._owners.get(note_id) == filename:
+            self._remove_note(note_id, notify=notify)
+            del self._owners[note_id]
+        self._record_manifest(filename)
+    
+    def _remember_file(self, filename, stat, note):
+        """Record a parsed note file and its stat signature."""
+        # A file rewritten with the same note is reported as a single change
+        previous_id = self._files.get(filename, (None, None, None))[2]
+        self._forget_file(filename, notify=note is None or note["id"] != previous_id)
+        note_id = None
+        if note is not None:
+            note_id = note["id"]
+            self._add_note(note)
+            self._owners[note_id] = filename
+        self._files[filename] = (stat.st_mtime_ns, stat.st_size, note_id)
+        self._record_manifest(filename)
+    
+    def _record_manifest(self, filename):
+        """Persist the catalog entry for filename to the manifest."""
+        if self._reconciling:
+            # Reconciliation writes one fresh manifest snapshot at the end
+            self._dirty = True
+            return
+        entry = self._files.get(filename)
+        meta = self._meta.get(entry[2]) if entry and entry[2] is not None else None
+        if self._pending is not None:
+            self._pending.append((filename, entry, meta))
+            return
+        self._manifest.append([(filename, entry, meta)])
+        if self._manifest.needs_compaction(len(self._files)):
+            self._manifest.write_snapshot(self._files, self._meta)
+    
+    def _load_manifest(self):
+        """Seed the catalog from the on-disk manifest without parsing notes."""
+        self._manifest_loaded = True
+        for filename, (mtime_ns, size, meta) in self._manifest.load().items():
+            note_id = meta["id"] if meta else None
+            if note_id is not None:
+                if note_id in self._meta:
+                    continue
+                self._meta.add(meta)
+                self._owners[note_id] = filename
+            self._files[filename] = (mtime_ns, size, note_id)
+    
+    def refresh(self, force=False):
+        """Revalidate the catalog against the files on disk.
+        
+        A full stat pass runs when the directory itself changed (files added,
+        removed or renamed), when another process bumped the generation stamp,
+        or when revalidate_interval has elapsed, which catches notes edited by
+        hand outside the application.  The first pass starts
+        from the manifest, so only notes missing from it or changed since it
+        was written are parsed; the manifest is rewritten if anything differed.
+        """
+        with self._lock:
+            if not self._manifest_loaded:
+                self._load_manifest()
+                force = True
+            
+            try:
+                dir_mtime = os.stat(self.notes_dir).st_mtime_ns
+            except OSError:
+                for filename in list(self._files):
+                    self._forget_file(filename)
+                self._dir_mtime = None
+                return
+            
+            generation = self._generation_stamp()
+            now = time.monotonic()
+            if (not force and dir_mtime == self._dir_mtime and generation == self._generation and
+                    now - self._checked_at < self.revalidate_interval):
+                return
+            
+            self._reconciling = True
+            try:
+                seen = set()
+                with os.scandir(self.notes_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith('.json'):
+                            continue
+                        try:
+                            if not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        seen.add(entry.name)
+                        cached = self._files.get(entry.name)
+                        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                            continue
+                        self._remember_file(entry.name, stat, self._read_file(entry.path))
+                
+                for filename in set(self._files) - seen:
+                    self._forget_file(filename)
+            finally:
+                self._reconciling = False
+            
+            if self._dirty:
+                self._manifest.write_snapshot(self._files, self._meta)
+                self._dirty = False
+                dir_mtime = os.stat(self.notes_dir).st_mtime_ns
+            
+            self._dir_mtime = dir_mtime
+            self._generation = generation
+            self._checked_at = now
+    
+    def _generation_stamp(self):
+        """Return the identity of the current generation file, or None."""
+        try:
+            stat = os.stat(os.path.join(self.notes_dir, GENERATION_NAME))
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _bump_generation(self):
+        """Replace the generation file to tell other processes about a change.
+        
+        The caller must hold lock and have refreshed first, so that no other
+        process's change is hidden behind this one.  The catalog is then
+        current, so the new directory mtime is recorded as already seen.
+        """
+        path = os.path.join(self.notes_dir, GENERATION_NAME)
+        try:
+            with open(path, 'r') as f:
+                generation = int(f.read() or 0)
+        except (OSError, ValueError):
+            generation = 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(str(generation + 1))
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._generation = self._generation_stamp()
+        try:
+            self._dir_mtime = os.stat(self.notes_dir).st_mtime_ns
+        except OSError:
+            self._dir_mtime = None
+    
+    def _body(self, note_id):
+        """Return the full note for note_id, parsing its file if needed."""
+        note = self._bodies.get(note_id)
+        if note is not None:
+            return note
+        filename = self._owners.get(note_id)
+        if filename is None:
+            return None
+        filepath = os.path.join(self.notes_dir, filename)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            self._forget_file(filename)
+            return None
+        note = self._read_file(filepath)
+        cached = self._files.get(filename)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size) and note and note["id"] == note_id:
+            self._bodies[note_id] = note
+        else:
+            self._remember_file(filename, stat, note)
+        return self._bodies.get(note_id)
+    
+    def notes(self):
+        """Return every full note, parsing any bodies not yet cached."""
+        self.refresh()
+        with self._lock:
+            notes = (self._body(note_id) for note_id in self._meta.ids())
+            return [note for note in notes if note is not None]
+    
+    def select(self, category=None, tag=None, limit=None, after=None):
+        """Return note metadata newest first, optionally filtered and paged."""
+        self.refresh()
+        with self._lock:
+            return self._meta.select(category, tag, limit, after)
+    
+    def ids_with_tag(self, tag):
+        """Return the IDs of cached notes carrying tag."""
+        self.refresh()
+        with self._lock:
+            return self._meta.ids_with_tag(tag)
+    
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of the newest cached notes in category."""
+        self.refresh()
+        with self._lock:
+            return self._meta.ids_in_category(category, limit)
+    
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        self.refresh()
+        with self._lock:
+            return self._meta.categories()
+    
+    def metadata_for(self, note_ids):
+        """Return {note id: metadata} for the cached notes among note_ids."""
+        self.refresh()
+        with self._lock:
+            return self._meta.metadata_for(note_ids)
+    
+    def search(self, query, limit=None, operator=None):
+        """Return cached notes matching query, ranked by relevance."""
+        self.refresh()
+        with self._lock:
+            if self._index is None:
+                index = InvertedIndex(SEARCH_FIELD_WEIGHTS)
+                for note_id in self._meta.ids():
+                    note = self._body(note_id)
+                    if note is not None:
+                        index.add(note_id, note)
+                self._index = index
+            ranked = self._index.search(query, limit=limit, operator=operator)
+            notes = (self._body(note_id) for note_id, _ in ranked)
+            return [note for note in notes if note is not None]
+    
+    def get(self, note_id):
+        """Return the cached note for note_id, revalidating its file."""
+        filename = f"{note_id}.json"
+        filepath = os.path.join(self.notes_dir, filename)
+        with self._lock:
+            if not self._manifest_loaded:
+                self.refresh()
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                self._forget_file(filename)
+                return None
+            cached = self._files.get(filename)
+            if not cached or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+                self._remember_file(filename, stat, self._read_file(filepath))
+                cached = self._files[filename]
+            note_id = cached[2]
+            return self._body(note_id) if note_id is not None else None
+    
+    def store(self, note):
+        """Update the catalog in place after note has been written to disk."""
+        self.store_many([note])
+    
+    def store_many(self, notes):
+        """Update the catalog after several notes have been written to disk.
+        
+        The manifest changes for the whole batch are journaled in one append.
+        """
+        with self._lock:
+            if not self._manifest_loaded:
+                self.refresh()
+            self._pending = []
+            try:
+                for note in notes:
+                    filename = f"{note['id']}.json"
+                    try:
+                        stat = os.stat(os.path.join(self.notes_dir, filename))
+                    except OSError:
+                        self._forget_file(filename)
+                        continue
+                    self._remember_file(filename, stat, _copy_note(note))
+            finally:
+                pending, self._pending = self._pending, None
+                self._manifest.append(pending)
+                if self._manifest.needs_compaction(len(self._files)):
+                    self._manifest.write_snapshot(self._files, self._meta)
+                self._bump_generation()
+    
+    def discard(self, note_id):
+        """Remove a deleted note from the catalog."""
+        with self._lock:
+            if not self._manifest_loaded:
+                self.refresh()
+            self._forget_file(f"{note_id}.json")
+            self._bump_generation()
+
+
+def _discard_key(keys, key):
+    """Remove key from a sorted list of sort keys if present."""
+    position = bisect.bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        del keys[position]
+
+
+def _discard_posting(postings, name, key):
+    """Remove key from postings[name], dropping the list once empty."""
+    keys = postings.get(name)
+    if keys is not None:
+        _discard_key(keys, key)
+        if not keys:
+            del postings[name]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def _get_catalog(notes_dir):
+    """Return the shared catalog for notes_dir, creating it on first use."""
+    key = os.path.abspath(notes_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = _NoteCatalog(key)
+        return catalog
+
+
+class NoteStorage:
+    """Interface for note persistence backends.
+    
+    Backends must implement get, put, delete and iter_notes.  The query
+    methods have scan-based defaults which backends override with indexed
+    versions.  Notes returned by a backend are owned by the caller.
+    """
+    
+    def __init__(self):
+        """Initialize the listener registry."""
+        self._listeners = []
+        self._write_lock = threading.RLock()
+    
+    def lock(self):
+        """Return a reentrant lock that serializes writers.
+        
+        Hold it across a read-modify-write, such as choosing a free note ID
+        and then saving under it.  Backends that can be shared between
+        processes return a lock that also excludes other processes.
+        """
+        return self._write_lock
+    
+    def add_listener(self, callback):
+        """Call callback(note_id, note) whenever a note is written or deleted.
+        
+        note is None when the note has been deleted.  Listeners let derived
+        indexes stay up to date incrementally.
+        """
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Stop calling a callback registered with add_listener."""
+        self._listeners = [listener for listener in self._listeners if listener != callback]
+    
+    def _notify(self, note_id, note):
+        """Report a change to every registered listener."""
+        for callback in self._listeners:
+            callback(note_id, note)
+    
+    def refresh(self):
+        """Pick up changes made outside this process, notifying listeners."""
+    
+    def get(self, note_id):
+        """Return the note with note_id, or None if it does not exist."""
+        raise NotImplementedError
+    
+    def put(self, note):
+        """Insert or replace a note."""
+        raise NotImplementedError
+    
+    def put_many(self, notes):
+        """Insert or replace several notes."""
+        for note in notes:
+            self.put(note)
+    
+    def delete(self, note_id):
+        """Delete a note, returning False if it did not exist."""
+        raise NotImplementedError
+    
+    def iter_notes(self):
+        """Yield every stored note."""
+        raise NotImplementedError
+    
+    def list_metadata(self, category=None, tag=None, limit=None, after=None):
+        """List note metadata, newest first, optionally filtered and paged.
+        
+        after is the (created_at, id) sort key of the last note on the
+        previous page; only notes sorting before it are returned.
+        """
+        notes = [note for note in self.iter_notes()
+                 if (category is None or note.get("category", "general") == category) and
+                    (tag is None or tag in note.get("tags", [])) and
+                    (after is None or sort_key(note) < tuple(after))]
+        notes.sort(key=sort_key, reverse=True)
+        return [note_metadata(note) for note in notes[:limit]]
+    
+    def ids_with_tag(self, tag):
+        """Return the IDs of notes carrying tag."""
+        return [meta["id"] for meta in self.list_metadata(tag=tag)]
+    
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of notes in category."""
+        return [meta["id"] for meta in self.list_metadata(category=category)][:limit]
+    
+    def metadata_for(self, note_ids):
+        """Return {note id: metadata} for the existing notes among note_ids."""
+        wanted = set(note_ids)
+        return {meta["id"]: meta for meta in self.list_metadata() if meta["id"] in wanted}
+    
+    def search(self, query, limit=None, operator=None):
+        """Return notes matching query, ranked by relevance."""
+        notes = {}
+        index = InvertedIndex(SEARCH_FIELD_WEIGHTS)
+        for note in self.iter_notes():
+            notes[note["id"]] = note
+            index.add(note["id"], note)
+        return [notes[note_id] for note_id, _ in index.search(query, limit, operator)]
+    
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        return sorted({note.get("category", "general") for note in self.iter_notes()})
+    
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class JsonNoteStorage(NoteStorage):
+    """Stores each note as a JSON file named after its ID in notes_dir.
+    
+    Safe to share between processes (e.g. several WSGI workers): files are
+    written to a temporary name and renamed into place, so readers never see
+    a partial note, and every change is made under the directory's file lock.
+    """
+    
+    def __init__(self, notes_dir):
+        """Initialize the backend, creating notes_dir if needed."""
+        super().__init__()
+        self.notes_dir = notes_dir
+        if not os.path.exists(notes_dir):
+            os.makedirs(notes_dir)
+        self._catalog = _get_catalog(notes_dir)
+    
+    def _path(self, note_id):
+        """Return the file path for note_id, rejecting paths outside notes_dir."""
+        filename = os.path.join(self.notes_dir, f"{note_id}.json")
+        if not os.path.abspath(filename).startswith(os.path.abspath(self.notes_dir)):
+            raise ValueError("Invalid note ID")
+        return filename
+    
+    def _write(self, note):
+        """Atomically write a note file via a temporary file and rename."""
+        path = self._path(note["id"])
+        tmp_path = os.path.join(self.notes_dir, f".{note['id']}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(note, indent=2))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def lock(self):
+        """Return the notes directory's cross-process file lock."""
+        return self._catalog.lock
+    
+    def add_listener(self, callback):
+        """Call callback(note_id, note) whenever a note changes on disk."""
+        self._catalog.add_listener(callback)
+    
+    def remove_listener(self, callback):
+        """Stop calling a callback registered with add_listener."""
+        self._catalog.remove_listener(callback)
+    
+    def refresh(self):
+        """Revalidate the shared catalog against the notes directory."""
+        self._catalog.refresh()
+    
+    def get(self, note_id):
+        """Return the note with note_id, or None if it does not exist."""
+        self._path(note_id)
+        note = self._catalog.get(note_id)
+        return _copy_note(note) if note else None
+    
+    def put(self, note):
+        """Write a note file and update the shared catalog."""
+        self.put_many([note])
+    
+    def put_many(self, notes):
+        """Write several note files, updating the catalog once for the batch."""
+        notes = list(notes)
+        with self._catalog.lock:
+            # Absorb other processes' changes before stamping a new generation
+            self._catalog.refresh()
+            written = []
+            try:
+                for note in notes:
+                    self._write(note)
+                    written.append(note)
+            finally:
+                self._catalog.store_many(written)
+    
+    def delete(self, note_id):
+        """Delete a note file, returning False if it did not exist."""
+        filename = self._path(note_id)
+        with self._catalog.lock:
+            self._catalog.refresh()
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                return False
+            self._catalog.discard(note_id)
+        return True
+    
+    def iter_notes(self):
+        """Yield every stored note."""
+        for note in self._catalog.notes():
+            yield _copy_note(note)
+    
+    def list_metadata(self, category=None, tag=None, limit=None, after=None):
+        """List note metadata, newest first, optionally filtered and paged."""
+        return [note_metadata(note) for note in self._catalog.select(category, tag, limit, after)]
+    
+    def ids_with_tag(self, tag):
+        """Return the IDs of notes carrying tag."""
+        return self._catalog.ids_with_tag(tag)
+    
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of notes in category."""
+        return self._catalog.ids_in_category(category, limit)
+    
+    def metadata_for(self, note_ids):
+        """Return {note id: metadata} for the existing notes among note_ids."""
+        return self._catalog.metadata_for(note_ids)
+    
+    def search(self, query, limit=None, operator=None):
+        """Return notes matching query, ranked by BM25 relevance."""
+        return [_copy_note(note)
+                for note in self._catalog.search(query, limit=limit, operator=operator)]
+    
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        return self._catalog.categories()
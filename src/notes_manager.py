@@ -1,29 +1,121 @@
 """Notes management for BJJ training sessions and techniques."""
 
 import os
+import base64
+import heapq
 import json
+import re
+import threading
+from collections import Counter
 from datetime import datetime
+from .note_storage import JsonNoteStorage
+from .similarity import ContentSimilarityIndex
+
+# Storage backends selectable through the NOTES_BACKEND environment variable
+STORAGE_BACKENDS = ("json", "sqlite", "log")
+
+# Notes written per storage batch by import_notes
+IMPORT_BATCH_SIZE = 500
+
+
+class NotePage(list):
+    """A page of note metadata from list_notes.
+    
+    Behaves as a plain list; next_cursor is the opaque cursor for the
+    following page, or None when this is the last page.
+    """
+    
+    def __init__(self, notes, next_cursor=None):
+        """Initialize the page with its notes and continuation cursor."""
+        super().__init__(notes)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(note):
+    """Encode a note's (created_at, id) position as an opaque page cursor."""
+    raw = json.dumps([note["created_at"], note["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Decode a page cursor back into a (created_at, id) sort key."""
+    try:
+        created_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(created_at, str) or not isinstance(note_id, str):
+            raise ValueError
+        return (created_at, note_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
 
 class NotesManager:
     """Manages user notes for BJJ training."""
     
-    def __init__(self, notes_dir="notes"):
-        """Initialize notes manager with storage directory."""
+    def __init__(self, notes_dir="notes", storage=None):
+        """Initialize notes manager with storage directory.
+        
+        storage may be any NoteStorage backend.  When omitted, the backend is
+        chosen by the NOTES_BACKEND environment variable ("json" by default,
+        or "sqlite" to use NOTES_DB_PATH, default notes_dir/notes.db).
+        """
         self.notes_dir = notes_dir
         self._ensure_notes_directory()
+        self.storage = storage if storage is not None else self._create_storage()
+        self._similarity = None
+        self._similarity_lock = threading.Lock()
     
     def _ensure_notes_directory(self):
         """Create notes directory if it doesn't exist."""
         if not os.path.exists(self.notes_dir):
             os.makedirs(self.notes_dir)
     
+    def _create_storage(self):
+        """Create the storage backend configured in the environment."""
+        backend = os.getenv("NOTES_BACKEND", "json").lower()
+        if backend == "json":
+            return JsonNoteStorage(self.notes_dir)
+        if backend == "sqlite":
+            from .sqlite_storage import SQLiteNoteStorage
+            db_path = os.getenv("NOTES_DB_PATH", os.path.join(self.notes_dir, "notes.db"))
+            return SQLiteNoteStorage(db_path)
+        if backend == "log":
+            from .log_storage import LogNoteStorage
+            log_dir = os.getenv("NOTES_LOG_DIR", os.path.join(self.notes_dir, "segments"))
+            return LogNoteStorage(log_dir)
+        raise ValueError(
+            f"Unknown NOTES_BACKEND '{backend}'. Choose one of: {', '.join(STORAGE_BACKENDS)}"
+        )
+    
+    def _base_id(self, title, timestamp):
+        """Build the note ID for a title saved at timestamp."""
+        slug = re.sub(r"[^\w-]+", "_", title.lower()).strip("_") or "note"
+        return f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{slug}"
+    
+    def _unique_ids(self, base_ids, reserved=None):
+        """Return collision-free note IDs for base_ids.
+        
+        An ID already in storage or in reserved gets a _2, _3, ... suffix.
+        reserved maps each ID handed out so far to the last suffix tried for
+        it, so repeated titles within one import don't re-probe from _2.
+        """
+        reserved = {} if reserved is None else reserved
+        existing = self.storage.metadata_for(set(base_ids))
+        ids = []
+        for base in base_ids:
+            note_id = base
+            suffix = reserved.get(base, 1)
+            while (note_id in reserved or note_id in existing or
+                   (note_id != base and self.storage.metadata_for([note_id]))):
+                suffix += 1
+                note_id = f"{base}_{suffix}"
+            reserved[base] = suffix
+            reserved.setdefault(note_id, 1)
+            ids.append(note_id)
+        return ids
+    
     def save_note(self, title, content, tags=None, category=None):
         """Save a new note with timestamp."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        note_id = f"{timestamp}_{title.replace(' ', '_').lower()}"
-        
         note = {
-            "id": note_id,
             "title": title,
             "content": content,
             "tags": tags or [],
@@ -32,11 +124,12 @@ class NotesManager:
             "updated_at": datetime.now().isoformat()
         }
         
-        filename = os.path.join(self.notes_dir, f"{note_id}.json")
-        
         try:
-            with open(filename, 'w') as f:
-                json.dump(note, f, indent=2)
+            # Hold the storage lock so no other worker can claim the same ID
+            with self.storage.lock():
+                note_id = self._unique_ids([self._base_id(title, datetime.now())])[0]
+                note = {"id": note_id, **note}
+                self.storage.put(note)
             return note_id
         except Exception as e:
             raise Exception(f"Error saving note: {str(e)}")
@@ -47,47 +140,31 @@ class NotesManager:
         if not note_id or '..' in note_id or '/' in note_id or '\\' in note_id:
             return None
         
-        filename = os.path.join(self.notes_dir, f"{note_id}.json")
-        
-        # Ensure the resolved path is still within notes_dir
-        if not os.path.abspath(filename).startswith(os.path.abspath(self.notes_dir)):
-            return None
-        
-        if not os.path.exists(filename):
-            return None
-        
         try:
-            with open(filename, 'r') as f:
-                return json.load(f)
+            return self.storage.get(note_id)
+        except ValueError:
+            return None
         except Exception as e:
             raise Exception(f"Error reading note: {str(e)}")
     
-    def list_notes(self):
-        """List all notes with metadata."""
-        notes = []
-        
-        if not os.path.exists(self.notes_dir):
-            return notes
-        
-        for filename in os.listdir(self.notes_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.notes_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        note = json.load(f)
-                        notes.append({
-                            "id": note["id"],
-                            "title": note["title"],
-                            "created_at": note["created_at"],
-                            "tags": note.get("tags", []),
-                            "category": note.get("category", "general")
-                        })
-                except Exception:
-                    continue
-        
-        # Sort by creation date, newest first
-        notes.sort(key=lambda x: x["created_at"], reverse=True)
-        return notes
+    def list_notes(self, limit=None, cursor=None, category=None, tag=None):
+        """List notes with metadata, newest first.
+        
+        Returns a NotePage.  With a limit, at most limit notes are returned and
+        page.next_cursor can be passed back as cursor to fetch the next page.
+        Ordering is by (created_at, id), so pages stay stable while notes are
+        added.  Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        if limit is None:
+            return NotePage(self.storage.list_metadata(category=category, tag=tag, after=after))
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        
+        # Fetch one extra note to learn whether another page follows
+        notes = self.storage.list_metadata(category=category, tag=tag, limit=limit + 1, after=after)
+        next_cursor = encode_cursor(notes[limit - 1]) if len(notes) > limit else None
+        return NotePage(notes[:limit], next_cursor)
     
     def update_note(self, note_id, title=None, content=None, tags=None, category=None):
         """Update an existing note."""
@@ -95,34 +172,29 @@ class NotesManager:
         if not note_id or '..' in note_id or '/' in note_id or '\\' in note_id:
             raise ValueError(f"Invalid note ID")
         
-        note = self.get_note(note_id)
-        
-        if not note:
-            raise ValueError(f"Note with ID {note_id} not found")
-        
-        if title:
-            note["title"] = title
-        if content:
-            note["content"] = content
-        if tags is not None:
-            note["tags"] = tags
-        if category is not None:
-            note["category"] = category
-        
-        note["updated_at"] = datetime.now().isoformat()
-        
-        filename = os.path.join(self.notes_dir, f"{note_id}.json")
-        
-        # Ensure the resolved path is still within notes_dir
-        if not os.path.abspath(filename).startswith(os.path.abspath(self.notes_dir)):
-            raise ValueError(f"Invalid note ID")
-        
-        try:
-            with open(filename, 'w') as f:
-                json.dump(note, f, indent=2)
-            return note
-        except Exception as e:
-            raise Exception(f"Error updating note: {str(e)}")
+        # Read and write under the storage lock so concurrent edits aren't lost
+        with self.storage.lock():
+            note = self.get_note(note_id)
+            
+            if not note:
+                raise ValueError(f"Note with ID {note_id} not found")
+            
+            if title:
+                note["title"] = title
+            if content:
+                note["content"] = content
+            if tags is not None:
+                note["tags"] = tags
+            if category is not None:
+                note["category"] = category
+            
+            note["updated_at"] = datetime.now().isoformat()
+            
+            try:
+                self.storage.put(note)
+                return note
+            except Exception as e:
+                raise Exception(f"Error updating note: {str(e)}")
     
     def delete_note(self, note_id):
         """Delete a note by ID."""
@@ -130,128 +202,247 @@ class NotesManager:
         if not note_id or '..' in note_id or '/' in note_id or '\\' in note_id:
             raise ValueError(f"Invalid note ID")
         
-        filename = os.path.join(self.notes_dir, f"{note_id}.json")
-        
-        # Ensure the resolved path is still within notes_dir
-        if not os.path.abspath(filename).startswith(os.path.abspath(self.notes_dir)):
-            raise ValueError(f"Invalid note ID")
-        
-        if not os.path.exists(filename):
-            raise ValueError(f"Note with ID {note_id} not found")
-        
         try:
-            os.remove(filename)
-            return True
+            deleted = self.storage.delete(note_id)
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error deleting note: {str(e)}")
-    
-    def search_notes(self, query):
-        """Search notes by title, content, or tags."""
-        results = []
-        query_lower = query.lower()
         
-        if not os.path.exists(self.notes_dir):
-            return results
+        if not deleted:
+            raise ValueError(f"Note with ID {note_id} not found")
+        return True
+    
+    def search_notes(self, query, limit=None, operator=None):
+        """Search notes by title, content, or tags.
+        
+        Results are ranked by BM25 relevance, best first.  Query terms are
+        combined with AND unless operator is "or" or the query contains OR
+        between terms (e.g. "mount OR guard").
+        """
+        return self.storage.search(query, limit=limit, operator=operator)
+    
+    def get_related_notes(self, note_id, k=10, scoring="shared"):
+        """Get up to k notes related to the given note by tags and category.
         
-        for filename in os.listdir(self.notes_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.notes_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        note = json.load(f)
-                        
-                        # Search in title, content, and tags
-                        if (query_lower in note["title"].lower() or
-                            query_lower in note["content"].lower() or
-                            any(query_lower in tag.lower() for tag in note.get("tags", []))):
-                            results.append(note)
-                except Exception:
-                    continue
+        Candidates come from the tag and category posting lists, so unrelated
+        notes are never examined.  Notes are scored by the number of shared
+        tags (scoring="shared") or by tag-set Jaccard similarity
+        (scoring="jaccard"); sharing the category breaks ties.
+        """
+        if scoring not in ("shared", "jaccard"):
+            raise ValueError(f"Invalid scoring method: {scoring}")
         
-        return results
-    
-    def get_related_notes(self, note_id):
-        """Get notes related to the given note based on category and tags."""
         note = self.get_note(note_id)
-        if not note:
+        if not note or k <= 0:
             return []
         
-        related = []
         note_category = note.get("category", "general")
         note_tags = set(note.get("tags", []))
         
-        if not os.path.exists(self.notes_dir):
-            return related
-        
-        for filename in os.listdir(self.notes_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.notes_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        other_note = json.load(f)
-                        
-                        # Skip the same note
-                        if other_note["id"] == note_id:
-                            continue
-                        
-                        # Check if same category or has common tags
-                        other_category = other_note.get("category", "general")
-                        other_tags = set(other_note.get("tags", []))
-                        common_tags = note_tags.intersection(other_tags)
-                        
-                        if other_category == note_category or len(common_tags) > 0:
-                            related.append({
-                                "id": other_note["id"],
-                                "title": other_note["title"],
-                                "category": other_category,
-                                "common_tags": list(common_tags),
-                                "match_type": "category" if other_category == note_category else "tags"
-                            })
-                except Exception:
-                    continue
+        # Merge the tag posting lists, counting shared tags per note
+        shared = Counter()
+        for tag in note_tags:
+            shared.update(self.storage.ids_with_tag(tag))
+        shared.pop(note_id, None)
+        
+        # Category-only matches all score the same, so at most k of them
+        # (beyond the tag matches) can ever make the cut
+        candidates = set(shared)
+        for other_id in self.storage.ids_in_category(note_category, limit=len(candidates) + k + 1):
+            if other_id != note_id:
+                candidates.add(other_id)
+        
+        metadata = self.storage.metadata_for(candidates)
+        
+        def score(other):
+            other_tags = set(other["tags"])
+            common = shared.get(other["id"], 0)
+            if scoring == "jaccard" and common:
+                value = common / len(note_tags | other_tags)
+            else:
+                value = common
+            return (value, other["category"] == note_category, other["created_at"])
         
-        # Sort by number of common tags (descending), then by match type
-        related.sort(key=lambda x: (len(x.get("common_tags", [])), x["match_type"] == "category"), reverse=True)
+        related = []
+        for other in heapq.nlargest(k, metadata.values(), key=score):
+            same_category = other["category"] == note_category
+            related.append({
+                "id": other["id"],
+                "title": other["title"],
+                "category": other["category"],
+                "common_tags": [tag for tag in other["tags"] if tag in note_tags],
+                "match_type": "category" if same_category else "tags",
+                "score": score(other)[0]
+            })
         return related
     
-    def get_notes_by_category(self, category):
-        """Get all notes in a specific category."""
-        results = []
+    def _content_index(self):
+        """Return the content similarity index, building it on first use.
+        
+        The index subscribes to storage changes, so after the initial build it
+        is maintained incrementally as notes are written and deleted.
+        """
+        with self._similarity_lock:
+            if self._similarity is None:
+                self._similarity = ContentSimilarityIndex()
+                self.storage.add_listener(self._on_note_change)
+                for note in self.storage.iter_notes():
+                    self._on_note_change(note["id"], note)
+        self.storage.refresh()
+        return self._similarity
+    
+    def _on_note_change(self, note_id, note):
+        """Keep the content similarity index in step with a storage change."""
+        index = self._similarity
+        if index is None:
+            return
+        if note is None:
+            index.remove(note_id)
+        else:
+            index.add(note_id, f"{note['title']}\n{note['content']}")
+    
+    def close(self):
+        """Detach the indexes built on top of storage.
+        
+        JSON storage shares one catalog per directory for the life of the
+        process, so a manager that is thrown away must unsubscribe from it.
+        The storage itself is left open, as it may be shared.
+        """
+        with self._similarity_lock:
+            if self._similarity is not None:
+                self.storage.remove_listener(self._on_note_change)
+                self._similarity = None
+    
+    def get_similar_notes(self, note_id, k=5):
+        """Get up to k notes whose title and content read most like the given note.
         
-        if not os.path.exists(self.notes_dir):
-            return results
+        Unlike get_related_notes this ignores tags and category, so untagged
+        notes about the same technique still link up.
+        """
+        if not self.get_note(note_id):
+            return []
         
-        for filename in os.listdir(self.notes_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.notes_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        note = json.load(f)
-                        if note.get("category", "general") == category:
-                            results.append(note)
-                except Exception:
-                    continue
+        matches = self._content_index().similar(note_id, k=k)
+        metadata = self.storage.metadata_for(other_id for other_id, _ in matches)
+        return [{
+            "id": other_id,
+            "title": metadata[other_id]["title"],
+            "category": metadata[other_id]["category"],
+            "similarity": round(similarity, 3)
+        } for other_id, similarity in matches if other_id in metadata]
+    
+    def _note_from_record(self, record):
+        """Validate an imported record and build a note from it.
+        
+        Any id in the record is ignored; the note gets a fresh ID.  created_at
+        and updated_at are kept when given so archived notes keep their dates.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Record must be a JSON object")
+        title = record.get("title")
+        content = record.get("content")
+        if not isinstance(title, str) or not isinstance(content, str) or not title.strip() or not content.strip():
+            raise ValueError("Title and content are required")
+        
+        tags = record.get("tags") or []
+        if isinstance(tags, str):
+            tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            raise ValueError("tags must be a list of strings")
+        category = record.get("category") or "general"
+        if not isinstance(category, str):
+            raise ValueError("category must be a string")
+        
+        now = datetime.now().isoformat()
+        created_at = record.get("created_at") or now
+        updated_at = record.get("updated_at") or created_at
+        try:
+            created = datetime.fromisoformat(created_at)
+            datetime.fromisoformat(updated_at)
+        except (TypeError, ValueError):
+            raise ValueError("created_at and updated_at must be ISO 8601 timestamps")
+        
+        return {
+            "id": self._base_id(title.strip(), created),
+            "title": title.strip(),
+            "content": content.strip(),
+            "tags": tags,
+            "category": category.strip() or "general",
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+    
+    def _write_batch(self, batch, reserved):
+        """Store the valid notes of a batch in one write and yield every report.
         
-        return results
+        batch holds (line number, note or None, error or None) in line order.
+        """
+        notes = [note for _, note, _ in batch if note is not None]
+        save_error = None
+        try:
+            with self.storage.lock():
+                ids = self._unique_ids([note["id"] for note in notes], reserved)
+                for note, note_id in zip(notes, ids):
+                    note["id"] = note_id
+                self.storage.put_many(notes)
+        except Exception as e:
+            save_error = f"Error saving note: {str(e)}"
+        for line_number, note, error in batch:
+            if note is None or save_error:
+                yield {"line": line_number, "success": False, "error": error or save_error}
+            else:
+                yield {"line": line_number, "success": True, "id": note["id"]}
+    
+    def import_notes(self, lines, batch_size=IMPORT_BATCH_SIZE):
+        """Import notes from newline-delimited JSON, one note object per line.
+        
+        lines may be any iterable of str or bytes lines (a file, a request
+        stream), and is consumed lazily.  Notes are written batch_size at a
+        time through the storage backend's put_many.  Yields a report for
+        every non-blank line, in order: {"line", "success": True, "id"} or
+        {"line", "success": False, "error"}.
+        """
+        batch = []
+        valid = 0
+        reserved = {}
+        for line_number, line in enumerate(lines, 1):
+            note = error = None
+            try:
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                if not line.strip():
+                    continue
+                note = self._note_from_record(json.loads(line))
+            except UnicodeDecodeError:
+                error = "Line is not valid UTF-8"
+            except json.JSONDecodeError as e:
+                error = f"Invalid JSON: {e.msg}"
+            except ValueError as e:
+                error = str(e)
+            
+            batch.append((line_number, note, error))
+            if note is not None:
+                valid += 1
+            if valid >= batch_size:
+                yield from self._write_batch(batch, reserved)
+                batch = []
+                valid = 0
+        if batch:
+            yield from self._write_batch(batch, reserved)
+    
+    def export_notes(self):
+        """Yield every note, for streaming out as newline-delimited JSON."""
+        return self.storage.iter_notes()
+    
+    def get_notes_by_category(self, category):
+        """Get all notes in a specific category."""
+        notes = (self.storage.get(meta["id"]) for meta in self.storage.list_metadata(category=category))
+        return [note for note in notes if note]
     
     def get_all_categories(self):
         """Get list of all categories used in notes."""
-        categories = set()
-        
-        if not os.path.exists(self.notes_dir):
-            return []
-        
-        for filename in os.listdir(self.notes_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.notes_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        note = json.load(f)
-                        categories.add(note.get("category", "general"))
-                except Exception:
-                    continue
-        
-        return sorted(list(categories))
+        return self.storage.categories()
     
     def save_conversation(self, conversation_text):
         """Save a conversation as a note."""
@@ -0,0 +1,248 @@
+"""Directed graph of moves between positions, with precomputed distances and chains."""
+
+from array import array
+from .technique_catalog import _index_key
+
+SIDES = ("top", "bottom")
+
+# Most chains returned for one query, and how many moves longer than the
+# shortest chain an alternative may be
+MAX_CHAINS = 10
+MAX_EXTRA_STEPS = 2
+
+_UNREACHABLE = 255
+
+
+class PositionGraph:
+    """Positions linked by the techniques that move from one to another.
+
+    A node is a position or one of its variations, such as closed_guard, on
+    one side (top or bottom) as seen by the player making the moves.  Every
+    technique with a to_position is an edge; the moves from a position also
+    work from each of its variations, and reaching a variation reaches its
+    position.  Edges between the same two nodes are merged, and kept as
+    compact adjacency arrays.
+
+    Everything a query needs is computed when the graph is built.  The
+    fewest moves between every pair of nodes come from a breadth-first
+    search from each node, kept in one byte array.  The shortest chains
+    between every pair (up to MAX_CHAINS of them, at most MAX_EXTRA_STEPS
+    moves longer than the shortest) come from a depth-first search pruned
+    with that table, and are kept in flat arrays.  A query only merges the
+    stored chains of the node pairs it covers.  A graph can be pickled with
+    the rest of the compiled reference data.
+    """
+
+    def __init__(self, positions, records):
+        """Build the graph from the positions dict and Technique records."""
+        self.names = {key: position["name"] for key, position in positions.items()}
+        parents = {}
+        for key, position in positions.items():
+            for variation in position["types"]:
+                ref = _index_key(variation)
+                if ref not in self.names:
+                    self.names[ref] = variation
+                    parents[ref] = key
+
+        self.nodes = tuple((ref, side) for ref in self.names for side in SIDES)
+        self._ids = {node: number for number, node in enumerate(self.nodes)}
+        self._parents = array("i", [self._ids[(parents[ref], side)] if ref in parents else -1
+                                    for ref, side in self.nodes])
+
+        direct = [{} for _ in self.nodes]
+        for record in records:
+            if record.to_position is None:
+                continue
+            start = self._ids[(_index_key(record.from_position or record.position), record.side)]
+            end = self._ids[(_index_key(record.to_position), record.to_side)]
+            if start != end:
+                direct[start].setdefault(end, []).append(record.name)
+
+        # Adjacency in compressed rows: node n's edges are
+        # _targets[_offsets[n]:_offsets[n + 1]], with their techniques in _moves
+        self._offsets = array("I", [0])
+        self._targets = array("I")
+        moves = []
+        for node, edges in enumerate(direct):
+            edges = {end: list(names) for end, names in edges.items()}
+            parent = self._parents[node]
+            if parent >= 0:
+                for end, names in direct[parent].items():
+                    if end != node:
+                        merged = edges.setdefault(end, [])
+                        merged.extend(name for name in names if name not in merged)
+            for end in sorted(edges):
+                self._targets.append(end)
+                moves.append(tuple(edges[end]))
+            self._offsets.append(len(self._targets))
+        self._moves = tuple(moves)
+
+        # Positions some move starts or ends in, offered as query choices
+        reached = set(self._targets)
+        self.connected = tuple(ref for ref in self.names
+                               if any(self._degree(node) or node in reached
+                                      for node in (self._ids[(ref, side)] for side in SIDES)))
+
+        # _distances[source * count + goal]: fewest moves from source to goal
+        # or one of its variations, _UNREACHABLE if there is no chain
+        count = len(self.nodes)
+        self._distances = array("B", [_UNREACHABLE]) * (count * count)
+        for source in range(count):
+            self._distances[source * count:(source + 1) * count] = self._bfs(source)
+
+        # Chains of the pair source * count + goal are numbered
+        # _pair_chains[pair] to _pair_chains[pair + 1] - 1, shortest first;
+        # chain c visits _chain_nodes[_chain_offsets[c]:_chain_offsets[c + 1]]
+        self._pair_chains = array("I", [0])
+        self._chain_offsets = array("I", [0])
+        self._chain_nodes = array("I")
+        on_path = bytearray(count)
+        for source in range(count):
+            for goal in range(count):
+                distance = self._distances[source * count + goal]
+                if (distance != _UNREACHABLE and source != goal and
+                        self._parents[source] != goal):
+                    found = []
+                    for length in range(distance, distance + MAX_EXTRA_STEPS + 1):
+                        self._chains(source, goal, length, found, on_path)
+                        if len(found) >= MAX_CHAINS:
+                            break
+                    for path in found:
+                        self._chain_nodes.extend(path)
+                        self._chain_offsets.append(len(self._chain_nodes))
+                self._pair_chains.append(len(self._chain_offsets) - 1)
+
+    def _degree(self, node):
+        """Return the number of edges leaving node."""
+        return self._offsets[node + 1] - self._offsets[node]
+
+    def _bfs(self, source):
+        """Return the row of distances from source, as a byte array."""
+        offsets, targets = self._offsets, self._targets
+        row = array("B", [_UNREACHABLE]) * len(self.nodes)
+        row[source] = 0
+        frontier = [source]
+        steps = 0
+        while frontier and steps < _UNREACHABLE - 1:
+            steps += 1
+            next_frontier = []
+            for node in frontier:
+                for edge in range(offsets[node], offsets[node + 1]):
+                    end = targets[edge]
+                    if row[end] == _UNREACHABLE:
+                        row[end] = steps
+                        next_frontier.append(end)
+            frontier = next_frontier
+
+        # Reaching a variation reaches its position
+        for node, parent in enumerate(self._parents):
+            if parent >= 0 and row[node] < row[parent]:
+                row[parent] = row[node]
+        return row
+
+    def _node_ids(self, ref, side):
+        """Return the nodes for a position key on one side, or on both if side is None."""
+        if ref not in self.names:
+            raise ValueError(f"Unknown position '{ref}'")
+        if side is not None and side not in SIDES:
+            raise ValueError(f"Unknown side '{side}', expected one of {', '.join(SIDES)}")
+        return [self._ids[(ref, option)] for option in SIDES if side in (None, option)]
+
+    def _edge_moves(self, start, end):
+        """Return the techniques moving from start to end."""
+        for edge in range(self._offsets[start], self._offsets[start + 1]):
+            if self._targets[edge] == end:
+                return self._moves[edge]
+        return ()
+
+    def _describe(self, path):
+        """Return a chain as {"steps", "positions", "moves"}."""
+        return {
+            "steps": len(path) - 1,
+            "positions": [{"key": self.nodes[node][0], "name": self.names[self.nodes[node][0]],
+                           "side": self.nodes[node][1]} for node in path],
+            "moves": [list(self._edge_moves(start, end)) for start, end in zip(path, path[1:])]
+        }
+
+    def distance(self, start, goal, start_side=None, goal_side=None):
+        """Return the fewest moves from start to goal position keys, or None if unreachable."""
+        count = len(self.nodes)
+        best = min(self._distances[source * count + target]
+                   for source in self._node_ids(start, start_side)
+                   for target in self._node_ids(goal, goal_side))
+        return None if best == _UNREACHABLE else best
+
+    def _chains(self, source, goal, length, found, on_path):
+        """Add loop-free chains of exactly length moves from source to goal to found.
+
+        This is a depth-first search of the graph, stopping once found holds
+        MAX_CHAINS chains; a move is only followed if the goal is still at
+        most the remaining number of moves away, so every branch followed can
+        lead to the goal.  on_path is a zeroed bytearray with a byte per node,
+        marking the nodes on the current path, and is left zeroed.
+        """
+        offsets, targets, parents = self._offsets, self._targets, self._parents
+        distances = self._distances
+        count = len(self.nodes)
+        path = [source]
+        on_path[source] = 1
+
+        def extend(remaining):
+            for edge in range(offsets[path[-1]], offsets[path[-1] + 1]):
+                end = targets[edge]
+                if on_path[end] or distances[end * count + goal] > remaining - 1:
+                    continue
+                path.append(end)
+                on_path[end] = 1
+                if end == goal or parents[end] == goal:
+                    # A chain ends where it first reaches the goal
+                    if remaining == 1:
+                        found.append(path[:])
+                elif remaining > 1:
+                    extend(remaining - 1)
+                on_path[end] = 0
+                path.pop()
+                if len(found) >= MAX_CHAINS:
+                    return
+
+        extend(length)
+        on_path[source] = 0
+
+    def find_chains(self, start, goal, limit=3, start_side=None, goal_side=None):
+        """Return up to limit of the shortest chains from start to goal, shortest first.
+
+        start and goal are position keys or variation keys; without a side,
+        chains from and to either side are included.  Each chain lists its
+        positions and, for each move, the techniques that make it.  After
+        the shortest chains come alternatives up to MAX_EXTRA_STEPS moves
+        longer.  Raises ValueError for an unknown position or side.
+        """
+        count = len(self.nodes)
+        limit = min(limit, MAX_CHAINS)
+        pairs = [(source, target)
+                 for source in self._node_ids(start, start_side)
+                 for target in self._node_ids(goal, goal_side)
+                 if source != target and self._parents[source] != target]
+        if not pairs:
+            return []
+        best = min(self._distances[source * count + target] for source, target in pairs)
+        if best == _UNREACHABLE:
+            return []
+
+        # Each pair's chains are stored shortest first, so merging them one
+        # length at a time keeps the result shortest first
+        stored = []
+        for source, target in pairs:
+            pair = source * count + target
+            chains = range(self._pair_chains[pair], self._pair_chains[pair + 1])
+            stored.append([(self._chain_offsets[chain], self._chain_offsets[chain + 1])
+                           for chain in chains])
+        paths = []
+        for length in range(best, best + MAX_EXTRA_STEPS + 1):
+            for chains in stored:
+                for first, end in chains:
+                    if end - first - 1 == length:
+                        paths.append(self._chain_nodes[first:end])
+                        if len(paths) >= limit:
+                            return [self._describe(path) for path in paths]
+        return [self._describe(path) for path in paths]
@@ -0,0 +1,324 @@
+"""Reference dataset loading, validation and compiled snapshots."""
+
+import gc
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+from collections import Counter, namedtuple
+from .fuzzy_search import FuzzyIndex
+from .position_graph import PositionGraph
+from .technique_catalog import Technique, TechniqueCatalog, _index_key, nest_techniques
+
+try:
+    import yaml
+    _PARSE_ERRORS = (ValueError, yaml.YAMLError)
+except ImportError:  # YAML dataset files need PyYAML; JSON files never do
+    yaml = None
+    _PARSE_ERRORS = (ValueError,)
+
+# Directory holding the bundled reference dataset
+DEFAULT_REFERENCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "data", "reference")
+
+# Dataset layout this code reads, the "format" in dataset.json
+DATASET_FORMAT = 1
+
+# Bump when the compiled structures change so existing snapshots are rebuilt
+SNAPSHOT_VERSION = 3
+
+MANIFEST_NAME = "dataset.json"
+DATA_EXTENSIONS = (".json", ".yaml", ".yml")
+
+# Most validation problems listed in one error
+MAX_REPORTED_ERRORS = 20
+
+# Allowed fields and their types; lists hold non-empty strings
+POSITION_FIELDS = {"name": str, "description": str, "types": list, "key_concepts": list,
+                   "aliases": list}
+REQUIRED_POSITION_FIELDS = ("name", "description", "types", "key_concepts")
+TECHNIQUE_FIELDS = {"name": str, "category": str, "sub_category": str, "position": str,
+                    "from_position": str, "target": str, "type": str, "side": str,
+                    "to_position": str, "to_side": str, "aliases": list}
+REQUIRED_TECHNIQUE_FIELDS = ("name", "category")
+
+# Fields describing a move to another position; all or none must be given
+TRANSITION_FIELDS = ("side", "to_position", "to_side")
+SIDES = ("top", "bottom")
+
+_KEY_RE = re.compile(r"^[a-z0-9_]+$")
+
+# The compiled dataset: the public reference structures and their indexes
+Reference = namedtuple("Reference", [
+    "version", "positions", "techniques", "concepts", "technique_aliases",
+    "position_aliases", "catalog", "position_index", "position_graph"
+])
+
+logger = logging.getLogger(__name__)
+
+
+def _read_dataset(data_dir):
+    """Return the raw (file name, bytes) of the manifest and every data file, in order."""
+    manifest_path = os.path.join(data_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No reference dataset in {data_dir}: {MANIFEST_NAME} is missing")
+
+    names = sorted(name for name in os.listdir(data_dir)
+                   if name.endswith(DATA_EXTENSIONS) and name != MANIFEST_NAME)
+    files = []
+    for name in [MANIFEST_NAME] + names:
+        with open(os.path.join(data_dir, name), "rb") as f:
+            files.append((name, f.read()))
+    return files
+
+
+def _content_hash(files):
+    """Return the SHA-256 of the dataset files' names and contents."""
+    digest = hashlib.sha256(f"snapshot-{SNAPSHOT_VERSION}".encode())
+    for name, content in files:
+        digest.update(f"\0{name}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def _parse(name, content):
+    """Parse one JSON or YAML dataset file."""
+    try:
+        if name.endswith(".json"):
+            return json.loads(content.decode("utf-8"))
+        if yaml is None:
+            raise ValueError("install PyYAML to read YAML dataset files")
+        return yaml.safe_load(content)
+    except _PARSE_ERRORS as e:
+        raise ValueError(f"Error reading reference file {name}: {str(e)}")
+
+
+def _check_fields(entry, fields, required, where, errors):
+    """Record problems with an entry's fields; return True if it can be compiled."""
+    if not isinstance(entry, dict):
+        errors.append(f"{where}: expected an object")
+        return False
+    ok = True
+    for field in required:
+        if field not in entry:
+            errors.append(f"{where}: missing '{field}'")
+            ok = False
+    for field, value in entry.items():
+        expected = fields.get(field)
+        if expected is None:
+            errors.append(f"{where}: unknown field '{field}'")
+            ok = False
+        elif not isinstance(value, expected):
+            errors.append(f"{where}: '{field}' must be a {'list' if expected is list else 'string'}")
+            ok = False
+        elif expected is str and not value.strip():
+            errors.append(f"{where}: '{field}' is empty")
+            ok = False
+        elif expected is list and not all(isinstance(item, str) and item.strip() for item in value):
+            errors.append(f"{where}: '{field}' must be a list of non-empty strings")
+            ok = False
+    return ok
+
+
+def compile_reference(files):
+    """Validate parsed dataset files and build the reference structures and indexes.
+
+    files is a list of (file name, parsed content), the manifest first.
+    Every data file may hold "positions" (keyed by position key),
+    "techniques" and "concepts" (lists); they are merged in file order.
+    Besides the field checks, a technique's position, from_position and
+    to_position must name a position key or one of the positions' types,
+    such as "closed_guard".  Raises ValueError listing the problems found.
+    """
+    errors = []
+    (manifest_name, manifest), documents = files[0], files[1:]
+    if not isinstance(manifest, dict) or manifest.get("format") != DATASET_FORMAT:
+        errors.append(f"{manifest_name}: 'format' must be {DATASET_FORMAT}")
+    version = manifest.get("version") if isinstance(manifest, dict) else None
+    if not isinstance(version, str) or not version.strip():
+        errors.append(f"{manifest_name}: missing 'version'")
+
+    positions = {}
+    position_aliases = {}
+    entries = []
+    concepts = []
+    for name, document in documents:
+        if not isinstance(document, dict):
+            errors.append(f"{name}: expected an object with positions, techniques or concepts")
+            continue
+        for section in sorted(set(document) - {"positions", "techniques", "concepts"}):
+            errors.append(f"{name}: unknown section '{section}'")
+
+        section = document.get("positions", {})
+        if not isinstance(section, dict):
+            errors.append(f"{name}: 'positions' must be an object keyed by position")
+            section = {}
+        for key, position in section.items():
+            where = f"{name}: positions.{key}"
+            if not _KEY_RE.match(key):
+                errors.append(f"{where}: keys are lowercase letters, digits and underscores")
+            elif key in positions:
+                errors.append(f"{where}: defined more than once")
+            elif _check_fields(position, POSITION_FIELDS, REQUIRED_POSITION_FIELDS, where, errors):
+                position = dict(position)
+                aliases = position.pop("aliases", None)
+                if aliases:
+                    position_aliases[key] = aliases
+                positions[key] = position
+
+        section = document.get("techniques", [])
+        if not isinstance(section, list):
+            errors.append(f"{name}: 'techniques' must be a list")
+            section = []
+        for number, technique in enumerate(section):
+            where = f"{name}: techniques[{number}]"
+            if _check_fields(technique, TECHNIQUE_FIELDS, REQUIRED_TECHNIQUE_FIELDS, where, errors):
+                entries.append((f"{where} ({technique['name']})", technique))
+
+        section = document.get("concepts", [])
+        if not isinstance(section, list) or not all(isinstance(item, str) and item.strip()
+                                                    for item in section):
+            errors.append(f"{name}: 'concepts' must be a list of non-empty strings")
+            section = []
+        concepts.extend(section)
+
+    # Techniques refer to positions by key or by a slugified variation
+    position_refs = set(positions)
+    for position in positions.values():
+        position_refs.update(_index_key(variation) for variation in position["types"])
+
+    records = []
+    technique_aliases = {}
+    seen = set()
+    grouped = {}   # category -> whether its techniques have sub-categories
+    for where, technique in entries:
+        has_sub_category = "sub_category" in technique
+        if grouped.setdefault(technique["category"], has_sub_category) != has_sub_category:
+            errors.append(f"{where}: techniques in '{technique['category']}' must all have "
+                          "a sub_category or none")
+        for field in ("category", "sub_category"):
+            if field in technique and not _KEY_RE.match(technique[field]):
+                errors.append(f"{where}: '{field}' must be lowercase letters, digits and underscores")
+        for field in ("position", "from_position", "to_position"):
+            if field in technique and _index_key(technique[field]) not in position_refs:
+                errors.append(f"{where}: unknown {field} '{technique[field]}'")
+        given = [field for field in TRANSITION_FIELDS if field in technique]
+        if given and len(given) < len(TRANSITION_FIELDS):
+            errors.append(f"{where}: a move to another position needs {', '.join(TRANSITION_FIELDS)}")
+        if given and "position" not in technique and "from_position" not in technique:
+            errors.append(f"{where}: a move to another position needs a position or from_position")
+        for field in ("side", "to_side"):
+            if field in technique and technique[field] not in SIDES:
+                errors.append(f"{where}: '{field}' must be one of {', '.join(SIDES)}")
+        if technique["name"].lower() in seen:
+            errors.append(f"{where}: technique defined more than once")
+        seen.add(technique["name"].lower())
+        if technique.get("aliases"):
+            technique_aliases[technique["name"]] = technique["aliases"]
+        records.append(Technique(
+            name=technique["name"],
+            category=technique["category"],
+            sub_category=technique.get("sub_category"),
+            position=technique.get("position"),
+            from_position=technique.get("from_position"),
+            target=technique.get("target"),
+            type=technique.get("type"),
+            side=technique.get("side"),
+            to_position=technique.get("to_position"),
+            to_side=technique.get("to_side")
+        ))
+
+    repeated = sorted(concept for concept, count in Counter(concepts).items() if count > 1)
+    if repeated:
+        errors.append(f"concepts: listed more than once: {', '.join(repeated)}")
+
+    if errors:
+        shown = errors[:MAX_REPORTED_ERRORS]
+        if len(errors) > len(shown):
+            shown.append(f"... and {len(errors) - len(shown)} more")
+        raise ValueError("Invalid reference data:\n  " + "\n  ".join(shown))
+
+    position_index = FuzzyIndex()
+    for key, position in positions.items():
+        position_index.add(key, [position["name"]] + position["types"] +
+                           position_aliases.get(key, []))
+
+    return Reference(
+        version=version,
+        positions=positions,
+        techniques=nest_techniques(records),
+        concepts=concepts,
+        technique_aliases=technique_aliases,
+        position_aliases=position_aliases,
+        catalog=TechniqueCatalog(records, technique_aliases),
+        position_index=position_index,
+        position_graph=PositionGraph(positions, records)
+    )
+
+
+def _load_snapshot(snapshot_path, content_hash):
+    """Return the Reference stored in a snapshot for content_hash, or None."""
+    gc_enabled = gc.isenabled()
+    try:
+        with open(snapshot_path, "rb") as f:
+            # A small header comes first, so a stale snapshot is not read in full
+            header = pickle.load(f)
+            if header != {"version": SNAPSHOT_VERSION, "hash": content_hash}:
+                return None
+            # Unpickling creates millions of containers and none are garbage;
+            # collecting while it runs would make loading many times slower
+            gc.disable()
+            return pickle.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # A truncated or incompatible snapshot is rebuilt like a stale one
+        logger.warning(f"Ignoring unreadable reference snapshot {snapshot_path}: {str(e)}")
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _write_snapshot(snapshot_path, content_hash, reference):
+    """Write a snapshot atomically; a failure only costs a recompile next time."""
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump({"version": SNAPSHOT_VERSION, "hash": content_hash}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(reference, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path)
+    except OSError as e:
+        logger.warning(f"Could not write reference snapshot {snapshot_path}: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_reference(data_dir=None, snapshot_path=None, force=False):
+    """Load the reference dataset, from its compiled snapshot when it is current.
+
+    data_dir defaults to REFERENCE_DATA_DIR or the bundled dataset, and
+    snapshot_path to REFERENCE_SNAPSHOT_PATH or data_dir/.reference.pickle.
+    The snapshot is keyed by a hash of the dataset files, so editing any of
+    them (or adding one) compiles and validates the dataset again; otherwise
+    only the snapshot is unpickled.  force recompiles regardless.  Returns
+    (reference, source), source being "snapshot" or "compiled".  Raises
+    ValueError if the dataset is missing or invalid.
+    """
+    data_dir = data_dir or os.getenv("REFERENCE_DATA_DIR", DEFAULT_REFERENCE_DIR)
+    snapshot_path = (snapshot_path or os.getenv("REFERENCE_SNAPSHOT_PATH") or
+                     os.path.join(data_dir, ".reference.pickle"))
+
+    files = _read_dataset(data_dir)
+    content_hash = _content_hash(files)
+    if not force:
+        reference = _load_snapshot(snapshot_path, content_hash)
+        if reference is not None:
+            return reference, "snapshot"
+
+    reference = compile_reference([(name, _parse(name, content)) for name, content in files])
+    _write_snapshot(snapshot_path, content_hash, reference)
+    return reference, "compiled"
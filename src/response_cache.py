@@ -0,0 +1,241 @@
+"""Cache of chat completions for repeated first questions."""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_prompt(text):
+    """Return text with case, punctuation and spacing differences removed."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(re.sub(r"[^\w\s]+", " ", text).split())
+
+
+def make_key(model, temperature, system_prompt, prompt):
+    """Return the cache key for a first question sent with these settings."""
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    material = json.dumps([model, temperature, system_hash, normalize_prompt(prompt)])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """A completion being computed that other callers are waiting on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    """Two-level cache of chat responses with TTL, size limits and single-flight.
+
+    Responses live in an in-memory LRU of max_entries and, with a path, in a
+    SQLite database there holding up to max_disk_entries, so they survive
+    restarts and are shared by worker processes.  Entries expire ttl seconds
+    after they were stored.  While one caller computes a response, callers
+    asking for the same key wait for it, for up to wait_timeout seconds,
+    instead of making their own request.  Each entry remembers how long it
+    took to compute, so stats() can report the latency hits have saved.
+
+    The in-memory state has its own lock, and the database another, so a
+    memory hit never waits for disk I/O.
+    """
+
+    def __init__(self, max_entries=1000, ttl=7 * 24 * 3600, path=None, max_disk_entries=10000,
+                 wait_timeout=60.0):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()   # key -> (response, latency, created)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "collapsed": 0, "timeouts": 0, "saved_seconds": 0.0}
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "latency REAL NOT NULL, created REAL NOT NULL)")
+            self._db.commit()
+
+    def _hit(self, level, entry):
+        """Count a hit and return its response; the caller holds the lock."""
+        self._stats[level] += 1
+        self._stats["saved_seconds"] += entry[1]
+        return entry[0]
+
+    def _find(self, key, now):
+        """Return the live in-memory entry for key, or None; the caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry[2] <= self.ttl:
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+        return None
+
+    def _read_disk(self, key, now):
+        """Return the live (response, latency, created) row for key from disk, or None.
+
+        Called without the memory lock held.
+        """
+        if self._db is None:
+            return None
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT response, latency, created FROM responses WHERE key = ? AND created >= ?",
+                (key, now - self.ttl)).fetchone()
+
+    def _remember(self, key, entry):
+        """Add an entry to the in-memory LRU; the caller holds the lock."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, key):
+        """Return the cached response for key, or None, without waiting."""
+        now = time.time()
+        with self._lock:
+            entry = self._find(key, now)
+            if entry is not None:
+                return self._hit("memory_hits", entry)
+        row = self._read_disk(key, now)
+        if row is None:
+            return None
+        with self._lock:
+            self._remember(key, row)
+            return self._hit("disk_hits", row)
+
+    def store(self, key, response, latency):
+        """Cache a response that took latency seconds to compute.
+
+        Empty responses are not cached; a model that answered with nothing
+        is asked again next time.
+        """
+        if not response:
+            return
+        now = time.time()
+        entry = (response, latency, now)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is None:
+                return
+            self._writes += 1
+            trim = self._writes % 100 == 0
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, latency, created) "
+                "VALUES (?, ?, ?, ?)", (key,) + entry)
+            if trim:
+                self._trim(now)
+
+    def _trim(self, now):
+        """Drop expired rows and the oldest rows over max_disk_entries; the caller holds _db_lock."""
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+
+    def claim(self, key, timeout=None):
+        """Return the cached response for key, or None if the caller should compute it.
+
+        If another caller is already computing key, this waits for it and
+        returns its response.  After timeout seconds (wait_timeout by
+        default) it stops waiting and returns None, so a stuck request
+        cannot hold up every caller asking the same question.  A caller that
+        gets None must call release() with the response (or None if it
+        failed) once it is done; if it had timed out, release() also answers
+        the callers still waiting.
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        while True:
+            now = time.time()
+            with self._lock:
+                entry = self._find(key, now)
+                if entry is not None:
+                    return self._hit("memory_hits", entry)
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = _Flight()
+                    break
+
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                return None
+            if flight.value is not None:
+                with self._lock:
+                    self._stats["collapsed"] += 1
+                    self._stats["saved_seconds"] += flight.value[1]
+                return flight.value[0]
+            # The computing caller failed; claim again, possibly computing it ourselves
+
+        # This caller holds the claim; the disk is read without the memory lock
+        row = self._read_disk(key, now)
+        if row is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._remember(key, row)
+            response = self._hit("disk_hits", row)
+        self._finish(key, (row[0], row[1]))
+        return response
+
+    def _finish(self, key, value):
+        """End the flight for key, handing value (or None on failure) to its waiters."""
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.value = value
+            flight.done.set()
+
+    def release(self, key, response, latency=0.0, keep=True):
+        """Finish a claim, caching response and waking callers waiting on key.
+
+        With keep=False the waiting callers still get response, but it is
+        not cached.
+        """
+        if response is not None and keep:
+            self.store(key, response, latency)
+        self._finish(key, (response, latency) if response is not None else None)
+
+    def get_or_compute(self, key, compute):
+        """Return the response for key, calling compute() once on a miss."""
+        response = self.claim(key)
+        if response is not None:
+            return response
+        started = time.perf_counter()
+        response = None
+        try:
+            response = compute()
+            return response
+        finally:
+            self.release(key, response, time.perf_counter() - started)
+
+    def stats(self):
+        """Return hit, miss and saved-latency counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"] + stats["collapsed"]
+            stats["entries"] = len(self._entries)
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
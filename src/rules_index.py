@@ -0,0 +1,271 @@
+"""Chunked, keyword-indexed IBJJF rule documents."""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from .context_window import count_tokens
+from .note_retrieval import question_terms
+from .search_index import InvertedIndex, tokenize
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDFs are skipped unless pypdf is installed or their chunks are cached
+    PdfReader = None
+
+# Directory holding the rule documents (the project root by default)
+DEFAULT_RULES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when extraction or chunking changes so cached chunks are rebuilt
+CHUNK_VERSION = 1
+
+# Words per chunk, and words repeated between neighbouring chunks
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+
+RULE_FIELD_WEIGHTS = {"heading": 2.0, "text": 1.0}
+
+logger = logging.getLogger(__name__)
+
+
+def _clean(text):
+    """Normalize extracted text: fold ligatures and collapse whitespace."""
+    # Some PDF exports drop the "ti" ligature glyph as a NUL character
+    text = unicodedata.normalize("NFKC", text.replace("\x00", "ti"))
+    return " ".join(text.split())
+
+
+def _window(words, heading, source, page, chunks):
+    """Append overlapping CHUNK_WORDS-word chunks of words to chunks."""
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step):
+        piece = words[start:start + CHUNK_WORDS]
+        if piece:
+            chunks.append({
+                "id": f"{source}#{len(chunks) + 1}",
+                "source": source,
+                "page": page,
+                "heading": heading,
+                "text": " ".join(piece)
+            })
+
+
+def _chunk_markdown(text, source):
+    """Split a Markdown document into chunks, one section at a time."""
+    chunks = []
+    heading = ""
+    lines = []
+
+    def flush():
+        words = _clean(re.sub(r"[*_>#|`]+|-{3,}", " ", "\n".join(lines))).split()
+        if words:
+            _window(words, heading, source, None, chunks)
+
+    for line in text.splitlines():
+        match = re.match(r"#+\s*(.*)", line)
+        if match:
+            flush()
+            heading = _clean(match.group(1).replace("*", ""))
+            lines = []
+        else:
+            lines.append(line)
+    flush()
+    return chunks
+
+
+def _chunk_pdf(path, source):
+    """Extract a PDF's text with pypdf and split it into chunks, page by page."""
+    # pypdf warns about every font it cannot fully parse; the text is still usable
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+    chunks = []
+    for number, page in enumerate(PdfReader(path).pages, 1):
+        words = _clean(page.extract_text() or "").split()
+        if words:
+            _window(words, "", source, number, chunks)
+    return chunks
+
+
+def _file_hash(path):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_rules_markdown(path):
+    """Return True for Markdown rule handouts, as opposed to project docs."""
+    name = os.path.basename(path).lower()
+    return "ibjjf" in name or "rule" in name
+
+
+def ingest_rules(rules_dir=DEFAULT_RULES_DIR, cache_path=None, force=False):
+    """Extract and chunk every rule document in rules_dir, reusing cached chunks.
+
+    Documents are the PDFs and the Markdown rule handouts in rules_dir.
+    Chunks are cached in cache_path (rules_dir/.rules_chunks.json by default)
+    under each file's content hash, so a document is only parsed again when
+    it changes.  The cache holds nothing machine-specific and can be checked
+    in, so PDFs are searchable even where pypdf is not installed.  Each
+    file's size and mtime are kept apart from it, in a local stamps file
+    next to it, and skip the hashing while they are unchanged.  Returns
+    (chunks, report), where report maps each file name to "cached",
+    "parsed" or the reason it was skipped.
+    """
+    cache_path = cache_path or os.path.join(rules_dir, ".rules_chunks.json")
+    stamps_path = f"{os.path.splitext(cache_path)[0]}.stamps.json"
+    cache = {}
+    stamps = {}
+    if not force and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == CHUNK_VERSION:
+                cache = stored["documents"]
+        except (OSError, ValueError, KeyError):
+            cache = {}
+        try:
+            with open(stamps_path, "r", encoding="utf-8") as f:
+                stamps = json.load(f)
+        except (OSError, ValueError):
+            stamps = {}
+
+    documents = {}
+    new_stamps = {}
+    report = {}
+    paths = sorted(glob.glob(os.path.join(rules_dir, "*.pdf")) +
+                   glob.glob(os.path.join(rules_dir, "*.md")))
+    for path in paths:
+        source = os.path.basename(path)
+        if not path.endswith(".pdf") and not _is_rules_markdown(path):
+            continue
+        stat = os.stat(path)
+        entry = cache.get(source)
+        if entry and stamps.get(source) == [stat.st_size, stat.st_mtime_ns, entry["sha256"]]:
+            documents[source] = {"sha256": entry["sha256"], "chunks": entry["chunks"]}
+            new_stamps[source] = stamps[source]
+            report[source] = "cached"
+            continue
+
+        content_hash = _file_hash(path)
+        if entry and entry["sha256"] == content_hash:
+            chunks = entry["chunks"]
+            report[source] = "cached"
+        elif path.endswith(".md"):
+            with open(path, "r", encoding="utf-8") as f:
+                chunks = _chunk_markdown(f.read(), source)
+            report[source] = "parsed"
+        elif PdfReader is None:
+            report[source] = "skipped (install pypdf to read PDFs)"
+            continue
+        else:
+            try:
+                chunks = _chunk_pdf(path, source)
+            except Exception as e:
+                report[source] = f"skipped ({str(e)})"
+                continue
+            report[source] = "parsed"
+        documents[source] = {"sha256": content_hash, "chunks": chunks}
+        new_stamps[source] = [stat.st_size, stat.st_mtime_ns, content_hash]
+
+    # Only a content change rewrites the cache, so a checked-in cache file
+    # stays untouched when a fresh checkout gives the documents new mtimes
+    if "parsed" in report.values() or set(documents) != set(cache):
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CHUNK_VERSION, "documents": documents}, f)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            # A read-only install still works; documents are just parsed again next time
+            logger.warning(f"Could not write rules cache {cache_path}: {str(e)}")
+    if new_stamps != stamps:
+        temp_path = f"{stamps_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(new_stamps, f)
+            os.replace(temp_path, stamps_path)
+        except OSError:
+            # The stamps only save hashing; without them every start hashes
+            pass
+
+    chunks = [chunk for source in sorted(documents) for chunk in documents[source]["chunks"]]
+    return chunks, report
+
+
+class RulesIndex:
+    """Keyword search over chunked rule documents.
+
+    Chunks come from ingest_rules() on first use and are indexed with BM25,
+    headings weighted above body text.  Searching matches any content word of
+    the query; a chunk must contain at least min_coverage of those words to
+    count as relevant, so ordinary technique questions don't pull in rules.
+    """
+
+    def __init__(self, rules_dir=DEFAULT_RULES_DIR, cache_path=None, k=3, max_tokens=500,
+                 min_coverage=0.6):
+        """Initialize the index; documents are loaded on first search."""
+        self.rules_dir = rules_dir
+        self.cache_path = cache_path
+        self.k = k
+        self.max_tokens = max_tokens
+        self.min_coverage = min_coverage
+        self._chunks = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Ingest the documents and build the index, once."""
+        with self._lock:
+            if self._index is None:
+                chunks, report = ingest_rules(self.rules_dir, self.cache_path)
+                for source, status in report.items():
+                    if status.startswith("skipped"):
+                        logger.warning(f"Rule document {source} {status}")
+                index = InvertedIndex(RULE_FIELD_WEIGHTS)
+                for chunk in chunks:
+                    index.add(chunk["id"], chunk)
+                self._chunks = {chunk["id"]: chunk for chunk in chunks}
+                self._index = index
+        return self._index
+
+    def search(self, query, limit=5):
+        """Return up to limit relevant chunks for query, best first, each with a score."""
+        terms = question_terms(query)
+        if not terms:
+            return []
+        index = self._load()
+        needed = max(1, round(len(terms) * self.min_coverage))
+        results = []
+        for chunk_id, score in index.search(" ".join(terms), operator="or"):
+            chunk = self._chunks[chunk_id]
+            present = set(tokenize(f"{chunk['heading']} {chunk['text']}"))
+            if sum(term in present for term in terms) >= needed:
+                results.append({**chunk, "score": round(score, 3)})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def context_message(self, question):
+        """Return the rule passages relevant to question as prompt text, or None."""
+        if self.k <= 0:
+            return None
+        lines = []
+        used = 0
+        for chunk in self.search(question, limit=self.k):
+            where = chunk["source"] + (f", page {chunk['page']}" if chunk["page"] else "")
+            line = f"[{where}] {chunk['heading'] + ': ' if chunk['heading'] else ''}{chunk['text']}"
+            cost = count_tokens(line)
+            if used + cost > self.max_tokens:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return None
+        return "\n".join(["Passages from the official IBJJF rules relevant to the question "
+                          "(base rules answers on them and cite the source):"] + lines)
@@ -0,0 +1,171 @@
+"""Inverted full-text index with BM25 ranking."""
+
+import heapq
+import math
+import re
+import threading
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def stem(token):
+    """Fold a plural term to its singular ("chokes" -> "choke").
+
+    Words of three letters or fewer and words ending in "ss", "us" or "is"
+    ("cross", "status", "this") are not plurals and are left alone.
+    """
+    if len(token) <= 3 or not token.endswith("s") or token.endswith(("ss", "us", "is")):
+        return token
+    return token[:-1]
+
+
+def tokenize(text):
+    """Split text into lowercase search terms.
+
+    Terms are stemmed so that singular and plural forms of a technique name
+    match each other.
+    """
+    return [stem(token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+def parse_query(query, operator=None):
+    """Parse a query string into (terms, operator).
+
+    Terms are combined with AND by default.  Writing OR between terms
+    (e.g. "mount OR guard") switches the whole query to OR.
+    """
+    words = query.split()
+    if operator is None:
+        operator = "or" if "OR" in words else "and"
+    operator = operator.lower()
+    if operator not in ("and", "or"):
+        raise ValueError(f"Invalid search operator: {operator}")
+    terms = []
+    for word in words:
+        if word == "OR":
+            continue
+        for term in tokenize(word):
+            if term not in terms:
+                terms.append(term)
+    return terms, operator
+
+
+class InvertedIndex:
+    """Incrementally maintained inverted index over multi-field documents.
+
+    Each field has a weight; a term's frequency in a document is the weighted
+    sum of its frequency in every field, and documents are ranked with BM25.
+    """
+
+    def __init__(self, field_weights, k1=1.2, b=0.75):
+        """Initialize an empty index with the given field weights."""
+        self.field_weights = dict(field_weights)
+        self.k1 = k1
+        self.b = b
+        self._postings = {}    # term -> {doc id: weighted term frequency}
+        self._doc_terms = {}   # doc id -> terms, used for removal
+        self._doc_len = {}     # doc id -> weighted document length
+        self._total_len = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """Return the number of indexed documents."""
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id):
+        """Return True if doc_id is indexed."""
+        return doc_id in self._doc_len
+
+    def add(self, doc_id, fields):
+        """Index a document, replacing any previous version of it.
+
+        fields maps field names to either a string or a list of strings.
+        """
+        frequencies = {}
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            value = fields.get(field) or ""
+            if isinstance(value, (list, tuple)):
+                value = " ".join(value)
+            for term in tokenize(value):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, frequency in frequencies.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+            self._doc_terms[doc_id] = tuple(frequencies)
+            self._doc_len[doc_id] = length
+            self._total_len += length
+
+    def remove(self, doc_id):
+        """Remove a document from the index if present."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        """Remove a document; the caller must hold the lock."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def clear(self):
+        """Remove every document from the index."""
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0.0
+
+    def search(self, query, limit=None, operator=None):
+        """Return [(doc id, score)] ranked by BM25, best first.
+
+        Only documents appearing in the query terms' posting lists are
+        scored, so the cost depends on the number of matches rather than
+        the size of the index.
+        """
+        terms, operator = parse_query(query, operator)
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            if operator == "and":
+                if not all(postings):
+                    return []
+                postings.sort(key=len)
+                candidates = [doc_id for doc_id in postings[0]
+                              if all(doc_id in posting for posting in postings[1:])]
+            else:
+                candidates = set()
+                for posting in postings:
+                    candidates.update(posting)
+
+            doc_count = len(self._doc_len)
+            avg_len = self._total_len / doc_count if doc_count else 0.0
+            idfs = [math.log(1 + (doc_count - len(p) + 0.5) / (len(p) + 0.5))
+                    for p in postings]
+
+            scored = []
+            for doc_id in candidates:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                score = 0.0
+                for posting, idf in zip(postings, idfs):
+                    frequency = posting.get(doc_id)
+                    if frequency:
+                        score += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                scored.append((score, doc_id))
+
+        if limit is not None:
+            top = heapq.nlargest(limit, scored)
+        else:
+            top = sorted(scored, reverse=True)
+        return [(doc_id, score) for score, doc_id in top]
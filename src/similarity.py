@@ -0,0 +1,188 @@
+"""Content similarity between notes using TF-IDF vectors and MinHash LSH."""
+
+import heapq
+import math
+import threading
+import zlib
+from array import array
+from .search_index import tokenize
+
+# Common words that say nothing about the technique a note is about
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it
+its me my of on or our she so that the their them then there they this to up
+was we were what when which while with you your
+""".split())
+
+
+class ContentSimilarityIndex:
+    """Finds notes with similar wording, independent of tags and category.
+
+    Each document is kept as a sparse term-frequency vector in compact arrays
+    and weighted with TF-IDF at query time.  Candidate neighbours come from
+    MinHash signatures bucketed by locality-sensitive hashing, so a lookup only
+    scores documents that share at least one LSH band with the query instead
+    of comparing against the whole corpus.
+    """
+
+    def __init__(self, bands=16, rows=2, max_candidates=500, seed=1):
+        """Initialize an empty index.
+
+        With bands b and rows r, documents whose term sets have Jaccard
+        similarity around (1/b) ** (1/r) or more are likely to be candidates.
+        At most max_candidates are scored per lookup, preferring the documents
+        that share the most bands with the query.
+        """
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        self._seed = seed
+        self._vocabulary = {}              # term -> term id
+        self._terms_by_id = []             # term id -> term, None once unused
+        self._free_term_ids = []           # ids of terms no document uses
+        self._doc_freq = array('I')        # term id -> number of documents
+        self._vectors = {}                 # doc id -> (term ids, term counts)
+        self._fingerprints = {}            # doc id -> crc of indexed text
+        self._band_keys = {}               # doc id -> band keys
+        self._buckets = {}                 # band key -> {doc id: None}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """Return the number of indexed documents."""
+        return len(self._vectors)
+
+    def _terms(self, text):
+        """Return the content terms of text."""
+        return [term for term in tokenize(text) if term not in STOPWORDS and len(term) > 1]
+
+    def _signature(self, terms):
+        """Return the band keys of the MinHash signature of a term set.
+
+        Uses one-permutation hashing: each term is hashed once and assigned to
+        one of bands * rows bins, keeping the minimum per bin.  Empty bins
+        borrow the value of the next non-empty bin (densification), so building
+        a signature costs O(terms) rather than O(terms * permutations).
+        """
+        size = self.bands * self.rows
+        bins = [None] * size
+        for term in terms:
+            h = zlib.crc32(term.encode("utf-8"), self._seed)
+            slot, value = h % size, h // size
+            if bins[slot] is None or value < bins[slot]:
+                bins[slot] = value
+        signature = list(bins)
+        for slot in range(size):
+            offset = 1
+            while signature[slot] is None:
+                borrowed = bins[(slot + offset) % size]
+                if borrowed is not None:
+                    signature[slot] = (borrowed, offset)
+                offset += 1
+        return [(band, hash(tuple(signature[band * self.rows:(band + 1) * self.rows])))
+                for band in range(self.bands)]
+
+    def add(self, doc_id, text):
+        """Index (or re-index) a document's text."""
+        fingerprint = zlib.crc32(text.encode("utf-8"))
+        counts = {}
+        for term in self._terms(text):
+            counts[term] = counts.get(term, 0) + 1
+
+        with self._lock:
+            if self._fingerprints.get(doc_id) == fingerprint:
+                return
+            self._remove(doc_id)
+            if not counts:
+                return
+            term_ids = array('I')
+            frequencies = array('f')
+            for term, count in sorted(counts.items()):
+                term_id = self._vocabulary.get(term)
+                if term_id is None:
+                    term_id = self._new_term_id(term)
+                self._doc_freq[term_id] += 1
+                term_ids.append(term_id)
+                frequencies.append(count)
+            self._vectors[doc_id] = (term_ids, frequencies)
+            self._fingerprints[doc_id] = fingerprint
+
+            band_keys = self._signature(counts)
+            self._band_keys[doc_id] = band_keys
+            for key in band_keys:
+                self._buckets.setdefault(key, {})[doc_id] = None
+
+    def _new_term_id(self, term):
+        """Give term an id, reusing one freed by _remove; the caller holds the lock."""
+        if self._free_term_ids:
+            term_id = self._free_term_ids.pop()
+            self._terms_by_id[term_id] = term
+        else:
+            term_id = len(self._doc_freq)
+            self._terms_by_id.append(term)
+            self._doc_freq.append(0)
+        self._vocabulary[term] = term_id
+        return term_id
+
+    def remove(self, doc_id):
+        """Remove a document from the index if present."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        """Remove a document; the caller must hold the lock."""
+        self._fingerprints.pop(doc_id, None)
+        vector = self._vectors.pop(doc_id, None)
+        if vector is None:
+            return
+        for term_id in vector[0]:
+            self._doc_freq[term_id] -= 1
+            if not self._doc_freq[term_id]:
+                # Forget terms no document uses, so edits don't grow the vocabulary
+                del self._vocabulary[self._terms_by_id[term_id]]
+                self._terms_by_id[term_id] = None
+                self._free_term_ids.append(term_id)
+        for key in self._band_keys.pop(doc_id):
+            bucket = self._buckets[key]
+            bucket.pop(doc_id, None)
+            if not bucket:
+                del self._buckets[key]
+
+    def _weights(self, vector, doc_count):
+        """Return ({term id: tf-idf weight}, norm) for a stored vector."""
+        weights = {}
+        for term_id, count in zip(*vector):
+            idf = math.log((doc_count + 1) / (self._doc_freq[term_id] + 1)) + 1
+            weights[term_id] = (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return weights, norm
+
+    def similar(self, doc_id, k=5, min_similarity=0.1):
+        """Return up to k [(doc id, cosine similarity)] most similar to doc_id."""
+        with self._lock:
+            vector = self._vectors.get(doc_id)
+            if vector is None or k <= 0:
+                return []
+
+            # Documents sharing more bands are likelier to be close, so when
+            # there are too many candidates the ones colliding least are dropped
+            collisions = {}
+            for key in self._band_keys[doc_id]:
+                for other_id in self._buckets.get(key, ()):
+                    collisions[other_id] = collisions.get(other_id, 0) + 1
+            collisions.pop(doc_id, None)
+            candidates = collisions
+            if len(collisions) > self.max_candidates:
+                candidates = heapq.nlargest(self.max_candidates, collisions,
+                                            key=collisions.__getitem__)
+
+            doc_count = len(self._vectors)
+            weights, norm = self._weights(vector, doc_count)
+            scored = []
+            for other_id in candidates:
+                other_weights, other_norm = self._weights(self._vectors[other_id], doc_count)
+                dot = sum(w * weights[t] for t, w in other_weights.items() if t in weights)
+                similarity = dot / (norm * other_norm) if norm and other_norm else 0.0
+                if similarity >= min_similarity:
+                    scored.append((similarity, other_id))
+
+        return [(other_id, similarity) for similarity, other_id in heapq.nlargest(k, scored)]
@@ -0,0 +1,375 @@
+"""SQLite storage backend for notes with FTS5 full-text search."""
+
+import json
+import os
+import sqlite3
+import threading
+from .file_lock import FileLock
+from .note_storage import NoteStorage, JsonNoteStorage, SEARCH_FIELD_WEIGHTS
+from .search_index import parse_query, tokenize
+
+# The full-text table holds the terms produced by search_index.tokenize rather
+# than raw text, so that notes match the same queries as in the JSON backend.
+_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5 (
+    title, tags, content, tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+"""
+
+_SCHEMA = _SEARCH_TABLE + """
+CREATE TABLE IF NOT EXISTS notes (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '[]',
+    category TEXT NOT NULL DEFAULT 'general',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notes_created_id ON notes (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_notes_category_created_id ON notes (category, created_at, id);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_rowid INTEGER NOT NULL REFERENCES notes (rowid) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (note_rowid, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags (tag, note_rowid);
+CREATE TABLE IF NOT EXISTS note_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS notes_changed_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO note_changes (note_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_changed_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO note_changes (note_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_changed_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO note_changes (note_id) VALUES (old.id);
+END;
+CREATE TRIGGER IF NOT EXISTS note_changes_trim AFTER INSERT ON note_changes BEGIN
+    DELETE FROM note_changes WHERE seq <= new.seq - 10000;
+END;
+"""
+
+
+def _drop_single_column_indexes(conn):
+    """Drop the created_at and category indexes that paging indexes replaced."""
+    conn.execute("DROP INDEX IF EXISTS idx_notes_created_at")
+    conn.execute("DROP INDEX IF EXISTS idx_notes_category")
+
+
+def _search_text(text):
+    """Return text as the space-separated terms stored in notes_fts."""
+    return " ".join(tokenize(text))
+
+
+def _rebuild_search_table(conn):
+    """Re-index notes_fts with tokenize() terms instead of the porter stemmer."""
+    conn.execute("DROP TABLE IF EXISTS notes_fts")
+    conn.execute(_SEARCH_TABLE)
+    rows = conn.execute("SELECT rowid, title, tags, content FROM notes")
+    conn.executemany(
+        "INSERT INTO notes_fts (rowid, title, tags, content) VALUES (?, ?, ?, ?)",
+        [(row[0], _search_text(row[1]), _search_text(" ".join(json.loads(row[2]))),
+          _search_text(row[3])) for row in rows])
+
+
+# Changes to databases created by earlier versions, in order.  PRAGMA
+# user_version records how many have been applied; _SCHEMA always creates
+# the current layout, so a new database starts with all of them applied.
+_MIGRATIONS = (
+    _drop_single_column_indexes,
+    _rebuild_search_table,
+)
+
+# Columns stored directly on the notes table; any other note fields are kept
+# as JSON in the extra column so that nothing is lost in a round trip.
+_COLUMNS = ("id", "title", "content", "tags", "category", "created_at", "updated_at")
+
+_METADATA_SELECT = "SELECT id, title, created_at, tags, category FROM notes"
+
+
+def _row_to_note(row):
+    """Build a note dict from a full notes row."""
+    note = json.loads(row["extra"]) if row["extra"] else {}
+    for column in _COLUMNS:
+        note[column] = row[column]
+    note["tags"] = json.loads(row["tags"])
+    return note
+
+
+def _row_to_metadata(row):
+    """Build a listing metadata dict from a metadata row."""
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "created_at": row["created_at"],
+        "tags": json.loads(row["tags"]),
+        "category": row["category"]
+    }
+
+
+class SQLiteNoteStorage(NoteStorage):
+    """Stores notes in a SQLite database in WAL mode.
+
+    Listing and category filters use secondary indexes, tags live in a join
+    table, and search runs against an FTS5 table ranked with bm25().
+
+    The database may be shared by several processes.  Triggers record every
+    change in note_changes, and refresh() replays changes committed by
+    other processes to this process's listeners.
+    """
+
+    def __init__(self, db_path):
+        """Open (and if needed create) the database at db_path."""
+        super().__init__()
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._local = threading.local()
+        self._lock = FileLock(db_path + ".lock")
+        self._refresh_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            self._create_schema(conn)
+        self._last_change = self._latest_change(conn)
+    
+    def _create_schema(self, conn):
+        """Create the tables of a new database, or migrate an older one.
+        
+        The caller holds the file lock, so only one process migrates.
+        """
+        existing = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes'").fetchone()
+        conn.executescript(_SCHEMA)
+        if not existing:
+            conn.execute(f"PRAGMA user_version = {len(_MIGRATIONS)}")
+            return
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migrate in enumerate(_MIGRATIONS[version:], version + 1):
+            # Each migration and its version bump commit together, DDL included
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def _connection(self):
+        """Return this thread's connection to the database.
+
+        A forked child process never reuses its parent's connection; it opens
+        its own on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _latest_change(self, conn):
+        """Return the sequence number of the newest recorded change."""
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM note_changes").fetchone()[0]
+
+    def lock(self):
+        """Return a lock on db_path + ".lock" that also excludes other processes."""
+        return self._lock
+
+    def refresh(self):
+        """Notify listeners of notes changed since the last refresh.
+
+        Changes made through this object are reported a second time, which
+        listeners must tolerate.  If this process fell so far behind that
+        old changes were trimmed, every current note is reported.
+        """
+        if not self._listeners:
+            return
+        conn = self._connection()
+        with self._refresh_lock:
+            rows = conn.execute("SELECT seq, note_id FROM note_changes WHERE seq > ? ORDER BY seq",
+                                (self._last_change,)).fetchall()
+            if not rows:
+                return
+            if rows[0]["seq"] > self._last_change + 1:
+                note_ids = [row["id"] for row in conn.execute("SELECT id FROM notes")]
+            else:
+                note_ids = list(dict.fromkeys(row["note_id"] for row in rows))
+            self._last_change = rows[-1]["seq"]
+        for note_id in note_ids:
+            self._notify(note_id, self.get(note_id))
+
+    def get(self, note_id):
+        """Return the note with note_id, or None if it does not exist."""
+        row = self._connection().execute(
+            "SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+        return _row_to_note(row) if row else None
+
+    def _put(self, conn, note):
+        """Insert or replace a note within the caller's transaction."""
+        tags = list(note.get("tags", []))
+        extra = {key: value for key, value in note.items() if key not in _COLUMNS}
+        values = (note["title"], note["content"], json.dumps(tags),
+                  note.get("category", "general"), note["created_at"],
+                  note["updated_at"], json.dumps(extra) if extra else None)
+
+        row = conn.execute("SELECT rowid FROM notes WHERE id = ?", (note["id"],)).fetchone()
+        if row:
+            rowid = row["rowid"]
+            conn.execute(
+                "UPDATE notes SET title = ?, content = ?, tags = ?, category = ?, "
+                "created_at = ?, updated_at = ?, extra = ? WHERE rowid = ?",
+                values + (rowid,))
+            conn.execute("DELETE FROM note_tags WHERE note_rowid = ?", (rowid,))
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (rowid,))
+        else:
+            rowid = conn.execute(
+                "INSERT INTO notes (id, title, content, tags, category, created_at, "
+                "updated_at, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (note["id"],) + values).lastrowid
+
+        conn.executemany("INSERT OR IGNORE INTO note_tags (note_rowid, tag) VALUES (?, ?)",
+                         [(rowid, tag) for tag in tags])
+        conn.execute("INSERT INTO notes_fts (rowid, title, tags, content) VALUES (?, ?, ?, ?)",
+                     (rowid, _search_text(note["title"]), _search_text(" ".join(tags)),
+                      _search_text(note["content"])))
+
+    def put(self, note):
+        """Insert or replace a note."""
+        conn = self._connection()
+        with conn:
+            self._put(conn, note)
+        self._notify(note["id"], note)
+
+    def put_many(self, notes):
+        """Insert or replace several notes in a single transaction."""
+        notes = list(notes)
+        conn = self._connection()
+        with conn:
+            for note in notes:
+                self._put(conn, note)
+        for note in notes:
+            self._notify(note["id"], note)
+
+    def delete(self, note_id):
+        """Delete a note, returning False if it did not exist."""
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT rowid FROM notes WHERE id = ?", (note_id,)).fetchone()
+            if not row:
+                return False
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row["rowid"],))
+            conn.execute("DELETE FROM notes WHERE rowid = ?", (row["rowid"],))
+        self._notify(note_id, None)
+        return True
+
+    def iter_notes(self):
+        """Yield every stored note."""
+        for row in self._connection().execute("SELECT * FROM notes"):
+            yield _row_to_note(row)
+
+    def list_metadata(self, category=None, tag=None, limit=None, after=None):
+        """List note metadata, newest first, using the category and tag indexes.
+        
+        Paging uses a (created_at, id) keyset, so every page is an index
+        range scan regardless of how deep into the notebook it is.
+        """
+        sql = _METADATA_SELECT
+        conditions = []
+        params = []
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        if tag is not None:
+            conditions.append("rowid IN (SELECT note_rowid FROM note_tags WHERE tag = ?)")
+            params.append(tag)
+        if after is not None:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_metadata(row) for row in self._connection().execute(sql, params)]
+
+    def ids_with_tag(self, tag):
+        """Return the IDs of notes carrying tag, using the tag index."""
+        rows = self._connection().execute(
+            "SELECT notes.id FROM note_tags JOIN notes ON notes.rowid = note_tags.note_rowid "
+            "WHERE note_tags.tag = ?", (tag,))
+        return [row["id"] for row in rows]
+
+    def ids_in_category(self, category, limit=None):
+        """Return up to limit IDs of the newest notes in category."""
+        rows = self._connection().execute(
+            "SELECT id FROM notes WHERE category = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (category, -1 if limit is None else limit))
+        return [row["id"] for row in rows]
+
+    def metadata_for(self, note_ids):
+        """Return {note id: metadata} for the existing notes among note_ids."""
+        note_ids = list(note_ids)
+        found = {}
+        conn = self._connection()
+        # Stay well below SQLite's limit on bound parameters per statement
+        for start in range(0, len(note_ids), 500):
+            chunk = note_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f"{_METADATA_SELECT} WHERE id IN ({placeholders})", chunk):
+                found[row["id"]] = _row_to_metadata(row)
+        return found
+
+    def search(self, query, limit=None, operator=None):
+        """Return notes matching query, ranked by FTS5 bm25()."""
+        terms, operator = parse_query(query, operator)
+        if not terms:
+            return []
+        match = f" {operator.upper()} ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        weights = ", ".join(str(SEARCH_FIELD_WEIGHTS[field]) for field in ("title", "tags", "content"))
+        sql = (f"SELECT notes.* FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid "
+               f"WHERE notes_fts MATCH ? ORDER BY bm25(notes_fts, {weights})")
+        params = [match]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_note(row) for row in self._connection().execute(sql, params)]
+
+    def categories(self):
+        """Return the sorted list of categories in use."""
+        rows = self._connection().execute("SELECT DISTINCT category FROM notes ORDER BY category")
+        return [row["category"] for row in rows]
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate_json_to_sqlite(notes_dir, db_path):
+    """Copy every JSON note in notes_dir into the SQLite database at db_path.
+
+    Notes already present in the database are replaced, so the migration can
+    be re-run safely.  Returns the number of notes migrated.
+    """
+    source = JsonNoteStorage(notes_dir)
+    target = SQLiteNoteStorage(db_path)
+    try:
+        notes = list(source.iter_notes())
+        target.put_many(notes)
+        return len(notes)
+    finally:
+        target.close()
@@ -0,0 +1,177 @@
+"""Flat technique records and their indexes."""
+
+from collections import namedtuple
+from types import MappingProxyType
+from .fuzzy_search import FuzzyIndex
+
+# One flat, immutable record per technique; fields a technique lacks are None
+# side, to_position and to_side describe a move to another position, as the
+# side ("top" or "bottom") its performer starts and ends on
+Technique = namedtuple("Technique", [
+    "name", "category", "sub_category", "position", "from_position", "target", "type",
+    "side", "to_position", "to_side"
+])
+
+INDEXED_FIELDS = ("category", "sub_category", "position", "target", "type")
+
+
+def _index_key(value):
+    """Normalize an index value or query: lowercase, spaces as underscores."""
+    return value.strip().lower().replace(" ", "_")
+
+
+def flatten_techniques(techniques):
+    """Flatten a {category: [technique] or {sub_category: [technique]}} dict into records."""
+    records = []
+
+    for category, items in techniques.items():
+        groups = items.items() if isinstance(items, dict) else [(None, items)]
+        for sub_category, group in groups:
+            for technique in group:
+                records.append(Technique(
+                    name=technique["name"],
+                    category=category,
+                    sub_category=sub_category,
+                    position=technique.get("position"),
+                    from_position=technique.get("from_position"),
+                    target=technique.get("target"),
+                    type=technique.get("type"),
+                    side=technique.get("side"),
+                    to_position=technique.get("to_position"),
+                    to_side=technique.get("to_side")
+                ))
+
+    return records
+
+
+def nest_techniques(records):
+    """Group records back into a {category: [technique] or {sub_category: [technique]}} dict.
+
+    The inverse of flatten_techniques(); each technique is a dict of the
+    fields it has, other than its category and sub-category.
+    """
+    techniques = {}
+
+    for record in records:
+        technique = {field: value for field, value in record._asdict().items()
+                     if value is not None and field not in ("category", "sub_category")}
+        if record.sub_category is None:
+            techniques.setdefault(record.category, []).append(technique)
+        else:
+            techniques.setdefault(record.category, {}).setdefault(
+                record.sub_category, []).append(technique)
+
+    return techniques
+
+
+class TechniqueCatalog:
+    """Technique records with indexes by category, sub-category, position, target and type.
+
+    Everything is built once, so a lookup is a dictionary access returning
+    shared, read-only results.  Each technique is also available as a
+    read-only mapping of just the fields it has, which is what the lookup
+    functions return.  A catalog can be pickled; the read-only mappings are
+    stored as plain data and wrapped again on loading.
+    """
+
+    __slots__ = ("records", "views", "indexes", "_names", "_fuzzy")
+
+    def __init__(self, records, aliases=None):
+        """Build the catalog and its indexes from Technique records.
+
+        aliases maps a technique name to other names it is searchable by.
+        """
+        aliases = aliases or {}
+        self.records = tuple(records)
+        self.views = tuple(
+            MappingProxyType({field: value for field, value in record._asdict().items()
+                              if value is not None})
+            for record in self.records
+        )
+        self._names = tuple(record.name.lower() for record in self.records)
+        # Indexed by record number, so the index holds plain, picklable data
+        self._fuzzy = FuzzyIndex()
+        for number, record in enumerate(self.records):
+            self._fuzzy.add(number, [record.name] + aliases.get(record.name, []))
+
+        indexes = {field: {} for field in INDEXED_FIELDS}
+        for number, record in enumerate(self.records):
+            for field in INDEXED_FIELDS:
+                value = getattr(record, field)
+                # The position a sweep or escape starts from counts as its position
+                if field == "position" and value is None:
+                    value = record.from_position
+                if value is not None:
+                    indexes[field].setdefault(_index_key(value), []).append(number)
+        self._set_indexes(indexes)
+
+    def _set_indexes(self, indexes):
+        """Build the read-only indexes from {field: {key: [record number]}}."""
+        views = self.views
+        self.indexes = {
+            field: MappingProxyType({key: tuple([views[number] for number in numbers])
+                                     for key, numbers in index.items()})
+            for field, index in indexes.items()
+        }
+
+    def __getstate__(self):
+        """Return the catalog as plain data for pickling."""
+        numbers = {id(view): number for number, view in enumerate(self.views)}
+        return {
+            # Plain tuples load much faster than namedtuples
+            "records": [tuple(record) for record in self.records],
+            "views": [dict(view) for view in self.views],
+            "indexes": {field: {key: [numbers[id(view)] for view in views]
+                                for key, views in index.items()}
+                        for field, index in self.indexes.items()},
+            "names": self._names,
+            "fuzzy": self._fuzzy
+        }
+
+    def __setstate__(self, state):
+        """Restore a pickled catalog."""
+        self.records = tuple(map(Technique._make, state["records"]))
+        self.views = tuple([MappingProxyType(view) for view in state["views"]])
+        self._names = state["names"]
+        self._fuzzy = state["fuzzy"]
+        self._set_indexes(state["indexes"])
+
+    def lookup(self, field, value):
+        """Return the techniques whose field equals value, or an empty tuple."""
+        return self.indexes[field].get(_index_key(value), ())
+
+    def find(self, **criteria):
+        """Return the techniques matching every given field (category, position, ...)."""
+        results = None
+
+        # Start from the smallest index entry and filter it by the others
+        for field, value in sorted(criteria.items(), key=lambda item: len(self.lookup(*item))):
+            matches = self.lookup(field, value)
+            if results is None:
+                results = matches
+            else:
+                wanted = {id(view) for view in matches}
+                results = tuple(view for view in results if id(view) in wanted)
+            if not results:
+                return ()
+
+        return self.views if results is None else results
+
+    def search(self, query, limit=None):
+        """Return the techniques named like query, best first, up to limit if given.
+
+        Names containing query come first, as typed, in catalog order; the
+        trigram index narrows down which names to check.  Then come names
+        and aliases that are close spellings of it.
+        """
+        query_lower = query.lower()
+        candidates = self._fuzzy.containing(query)
+        if candidates is None:
+            candidates = range(len(self._names))
+        numbers = [number for number in candidates if query_lower in self._names[number]]
+        if limit is None or len(numbers) < limit:
+            found = set(numbers)
+            for number in self._fuzzy.search(query, limit=limit):
+                if number not in found:
+                    numbers.append(number)
+        return tuple(self.views[number] for number in numbers[:limit])
@@ -0,0 +1,35 @@
+"""Shared fixtures for the test suite."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def run_python():
+    """Return a function that starts `python -c code` from the repository root.
+
+    The child gets stdin and stdout pipes, so a test can wait for it to
+    print a line and tell it to go on by writing one.
+    """
+    children = []
+
+    def start(code):
+        child = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, text=True,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        children.append(child)
+        return child
+
+    yield start
+    for child in children:
+        if child.poll() is None:
+            child.kill()
+        child.wait()
@@ -0,0 +1,89 @@
+"""Prefix trie autocomplete over reference names and note tags and titles."""
+
+import pytest
+
+from src.autocomplete import MAX_SUGGESTIONS, Autocomplete, PrefixTrie
+from src.notes_manager import NotesManager
+
+
+def test_trie_completes_from_any_word_start():
+    trie = PrefixTrie()
+    trie.add("Rear Naked Choke", "technique")
+    trie.add("Triangle Choke", "technique")
+    assert [label for label, _, _ in trie.complete("nak")] == ["Rear Naked Choke"]
+    assert [label for label, _, _ in trie.complete("cho")] == ["Triangle Choke",
+                                                               "Rear Naked Choke"]
+    assert trie.complete("ear") == []
+
+
+def test_trie_ranks_by_count_then_length():
+    trie = PrefixTrie()
+    trie.add("guard passing", "tag")
+    trie.add("guard", "tag")
+    trie.add("guard retention", "tag", count=3)
+    assert [label for label, _, _ in trie.complete("gu")] == [
+        "guard retention", "guard", "guard passing"]
+
+    trie.remove("guard retention", count=3)
+    assert [label for label, _, _ in trie.complete("gu")] == ["guard", "guard passing"]
+    assert len(trie) == 2
+
+
+def test_trie_keeps_only_the_best_suggestions_per_node():
+    trie = PrefixTrie()
+    for number in range(MAX_SUGGESTIONS * 2):
+        trie.add(f"drill {number:02d}", "tag", count=number)
+    best = trie.complete("dri")
+    assert len(best) == MAX_SUGGESTIONS
+    assert best[0] == ("drill 39", "tag", 39)
+
+
+def test_trie_handles_very_long_labels():
+    trie = PrefixTrie()
+    label = "x" * 5000
+    trie.add(label, "title")
+    trie.add("xy", "title", count=2)
+    assert [entry[0] for entry in trie.complete("x")] == ["xy", label]
+    trie.remove(label)
+    assert trie.complete("xx") == []
+
+
+def test_autocomplete_follows_note_writes(tmp_path):
+    manager = NotesManager(str(tmp_path / "notes"))
+    first = manager.save_note("Closed guard drills", "...", tags=["guard", "drills"])
+    autocomplete = Autocomplete(manager)
+    assert autocomplete.complete("gua", kinds=["tag"]) == [
+        {"label": "guard", "kind": "tag", "count": 1}]
+
+    manager.save_note("Guard retention", "...", tags=["guard"])
+    assert autocomplete.complete("gua", kinds=["tag"])[0]["count"] == 2
+    assert [suggestion["label"] for suggestion in autocomplete.complete("ret", kinds=["title"])
+            ] == ["Guard retention"]
+
+    manager.delete_note(first)
+    assert autocomplete.complete("dri", kinds=["tag"]) == []
+    assert autocomplete.complete("gua", kinds=["tag"])[0]["count"] == 1
+
+
+def test_autocomplete_suggests_reference_names_and_rejects_unknown_kinds():
+    autocomplete = Autocomplete()
+    labels = [suggestion["label"] for suggestion in autocomplete.complete("kim")]
+    assert "Kimura" in labels
+    with pytest.raises(ValueError):
+        autocomplete.complete("kim", kinds=["colour"])
+
+
+def test_closed_autocomplete_stops_listening(tmp_path):
+    manager = NotesManager(str(tmp_path / "notes"))
+    manager.save_note("Closed guard drills", "...", tags=["guard"])
+    catalog = manager.storage._catalog
+    listeners = len(catalog._listeners)
+    autocomplete = Autocomplete(manager)
+    assert autocomplete.complete("gua", kinds=["tag"])
+    assert len(catalog._listeners) == listeners + 1
+
+    autocomplete.close()
+    assert len(catalog._listeners) == listeners
+    manager.save_note("Guard retention", "...", tags=["guard"])
+    assert autocomplete.complete("gua", kinds=["tag"])[0]["count"] == 2
+    autocomplete.close()
@@ -0,0 +1,60 @@
+"""IBJJF legality lookups."""
+
+import pytest
+
+from src.bjj_rules import (ADULT_BELTS, LEGALITY_TABLE, RULE_DIVISIONS, RULE_ITEMS,
+                           check_legality, get_legality_matrix)
+
+
+def test_lookups_accept_names_and_spellings():
+    for item in ("heel_hook", "Heel hook", "heel-hook", "  HEEL   HOOK "):
+        verdict = check_legality("Adult Gi", "Brown", item)
+        assert verdict["key"] == "heel_hook"
+        assert verdict["division"] == "adult_gi" and verdict["belt"] == "brown"
+
+
+def test_chart_columns_by_division_and_belt():
+    assert not check_legality("adult_gi", "black", "heel hook")["legal"]
+    assert check_legality("adult_nogi", "black", "heel hook")["legal"]
+    assert check_legality("adult_gi", "brown", "knee bar")["legal"]
+    knee_bar = check_legality("masters_gi", "purple", "knee bar")
+    assert not knee_bar["legal"] and knee_bar["penalty"] == "Disqualification"
+    # White belts share the juvenile column whatever their age
+    assert not check_legality("adult_gi", "white", "wrist lock")["legal"]
+    assert check_legality("adult_gi", "blue", "wrist lock")["legal"]
+    assert not check_legality("adult_nogi", "black", "slam")["legal"]
+
+
+@pytest.mark.parametrize("division", ["adult_gi", "adult_nogi", "masters_gi", "masters_nogi"])
+def test_reaping_lookups_agree(division):
+    for belt in ADULT_BELTS:
+        reaping = check_legality(division, belt, "knee reaping")
+        crossing = check_legality(division, belt, "foot_across_midline")
+        assert reaping["legal"] == crossing["legal"] == (belt in ("brown", "black"))
+        # Twisting the knee is illegal for everyone
+        assert not check_legality(division, belt, "inward_knee_torque")["legal"]
+
+
+def test_belt_rules_apply_in_every_division():
+    for division, info in RULE_DIVISIONS.items():
+        if "white" in info["belts"]:
+            verdict = check_legality(division, "white", "jump_to_closed_guard")
+            assert not verdict["legal"] and verdict["severity"] == "serious foul"
+    assert check_legality("adult_gi", "blue", "jump_to_closed_guard")["note"] is None
+
+
+def test_matrix_covers_every_item():
+    matrix = get_legality_matrix("juvenile", "blue")
+    assert [verdict["key"] for verdict in matrix] == list(RULE_ITEMS)
+    assert len(LEGALITY_TABLE) == len(RULE_ITEMS) * sum(
+        len(info["belts"]) for info in RULE_DIVISIONS.values())
+
+
+@pytest.mark.parametrize("division, belt, item, message", [
+    ("olympic", "black", "heel hook", "Unknown division"),
+    ("juvenile", "brown", "heel hook", "do not compete"),
+    ("adult_gi", "black", "flying scissor", "Unknown technique")
+])
+def test_unknown_values_are_rejected(division, belt, item, message):
+    with pytest.raises(ValueError, match=message):
+        check_legality(division, belt, item)
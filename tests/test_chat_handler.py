@@ -0,0 +1,167 @@
+"""Chat handler turns: failures, streaming and abandoned streams."""
+
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from src.chat_handler import AsyncBJJChatHandler, BJJChatHandler, ChatError
+from src.response_cache import ResponseCache
+
+
+def chunk(content):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeStream:
+    """A streamed completion that can fail after some chunks."""
+
+    def __init__(self, pieces, error=None):
+        self.pieces = pieces
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            yield chunk(piece)
+        if self.error is not None:
+            raise self.error
+
+    async def __aiter__(self):
+        for piece in self:
+            yield piece
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Stands in for OpenAI, answering with the given responses in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **options):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeAsyncClient(FakeClient):
+    async def _create(self, **options):
+        return super()._create(**options)
+
+
+def roles(handler):
+    return [message["role"] for message in handler.conversation_history]
+
+
+def test_failed_chat_raises_and_leaves_history_unchanged():
+    handler = BJJChatHandler(client=FakeClient(RuntimeError("timeout")), cache=ResponseCache())
+    with pytest.raises(ChatError, match="timeout"):
+        handler.chat("How do I escape mount?")
+    assert roles(handler) == ["system"]
+
+
+def test_stream_adds_the_turn_once_complete():
+    handler = BJJChatHandler(client=FakeClient(FakeStream(["Frame ", "and bridge."])))
+    assert list(handler.chat_stream("How do I escape mount?")) == ["Frame ", "and bridge."]
+    assert roles(handler) == ["system", "user", "assistant"]
+    assert handler.conversation_history[-1]["content"] == "Frame and bridge."
+
+
+def test_failed_stream_raises_and_leaves_history_unchanged():
+    handler = BJJChatHandler(client=FakeClient(RuntimeError("timeout")))
+    with pytest.raises(ChatError):
+        list(handler.chat_stream("How do I escape mount?"))
+    assert roles(handler) == ["system"]
+
+    stream = FakeStream(["Frame "], error=RuntimeError("connection reset"))
+    handler = BJJChatHandler(client=FakeClient(stream))
+    with pytest.raises(ChatError, match="connection reset"):
+        list(handler.chat_stream("How do I escape mount?"))
+    assert roles(handler) == ["system"]
+    assert stream.closed
+
+
+def test_stream_closed_early_drops_the_turn():
+    stream = FakeStream(["Frame ", "and ", "bridge."])
+    handler = BJJChatHandler(client=FakeClient(stream))
+    tokens = handler.chat_stream("How do I escape mount?")
+    assert next(tokens) == "Frame "
+    tokens.close()
+    assert stream.closed
+    assert roles(handler) == ["system"]
+
+
+def test_async_stream_closed_early_drops_the_turn():
+    stream = FakeAsyncStream(["Frame ", "and ", "bridge."])
+    handler = AsyncBJJChatHandler(client=FakeAsyncClient(stream))
+
+    async def read_one():
+        tokens = handler.chat_stream("How do I escape mount?")
+        first = await tokens.__anext__()
+        await tokens.aclose()
+        return first
+
+    assert asyncio.run(read_one()) == "Frame "
+    assert stream.closed
+    assert roles(handler) == ["system"]
+
+
+def test_async_stream_failure_raises_and_leaves_history_unchanged():
+    stream = FakeAsyncStream(["Frame "], error=RuntimeError("connection reset"))
+    handler = AsyncBJJChatHandler(client=FakeAsyncClient(stream))
+
+    async def read_all():
+        return [token async for token in handler.chat_stream("How do I escape mount?")]
+
+    with pytest.raises(ChatError):
+        asyncio.run(read_all())
+    assert roles(handler) == ["system"]
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    # The app creates its notes directory in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("web_app")
+
+
+class BrokenHandler:
+    """A handler whose stream fails with an unexpected error part way."""
+
+    def chat_stream(self, user_message):
+        yield "Frame "
+        raise KeyError("bug")
+
+
+def test_unexpected_stream_errors_end_with_an_error_event(web_app, monkeypatch):
+    monkeypatch.setattr(web_app, "create_chat_handler", lambda *args, **kwargs: BrokenHandler())
+    client = web_app.app.test_client()
+    body = client.post("/api/chat/stream", json={"message": "Escape mount?"}).get_data(
+        as_text=True)
+    assert body.endswith(web_app.STREAM_ERROR_EVENT)
+    assert "event: done" not in body
+    with client.session_transaction() as session:
+        assert web_app.conversation_store.get(session["chat_id"]) == []
+
+
+def test_failed_chat_is_reported_and_not_stored(web_app, monkeypatch):
+    monkeypatch.setattr(web_app, "create_chat_handler", lambda *args, **kwargs: BJJChatHandler(
+        client=FakeClient(RuntimeError("timeout")), cache=ResponseCache()))
+    client = web_app.app.test_client()
+    response = client.post("/api/chat", json={"message": "Escape mount?"})
+    assert response.status_code == 502
+    assert response.get_json()["success"] is False
+    with client.session_transaction() as session:
+        assert web_app.conversation_store.get(session["chat_id"]) == []
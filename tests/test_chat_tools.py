@@ -0,0 +1,89 @@
+"""Local tool calling: results, stats and which tool answers get cached."""
+
+import json
+from types import SimpleNamespace
+
+from src.chat_handler import BJJChatHandler
+from src.chat_tools import MAX_RESULT_CHARS, UNKNOWN_TOOL, ChatTools
+from src.response_cache import ResponseCache
+
+
+def completion(content=None, tool_calls=None):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class FakeClient:
+    """Stands in for OpenAI, answering with the given responses in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **options):
+        self.requests.append(options)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeRetriever:
+    def retrieve(self, query):
+        return [{"title": "Guard notes", "excerpt": "Keep your knees in."}]
+
+
+def test_answers_from_reference_tools_are_cached():
+    cache = ResponseCache()
+    client = FakeClient(completion(tool_calls=[tool_call("1", "search_techniques",
+                                                         '{"query": "kimura"}')]),
+                        completion("Kimura from guard."))
+    BJJChatHandler(client=client, cache=cache, tools=ChatTools()).chat("What is a kimura?")
+    assert BJJChatHandler(client=client, cache=cache, tools=ChatTools()).chat(
+        "what is a kimura") == "Kimura from guard."
+    assert client.responses == []
+
+
+def test_answers_that_searched_notes_are_not_cached():
+    cache = ResponseCache()
+    tools = ChatTools(note_retriever=FakeRetriever())
+    client = FakeClient(completion(tool_calls=[tool_call("1", "search_notes",
+                                                         '{"query": "guard"}')]),
+                        completion("Your notes say: knees in."),
+                        completion("Fresh answer."))
+    assert BJJChatHandler(client=client, cache=cache, tools=tools).chat(
+        "What do my notes say about guard?") == "Your notes say: knees in."
+    assert BJJChatHandler(client=client, cache=cache, tools=tools).chat(
+        "What do my notes say about guard?") == "Fresh answer."
+
+
+def test_long_tool_results_stay_valid_json():
+    tools = ChatTools()
+    tools.functions["long"] = lambda: [{"name": f"Technique {number}", "detail": "x" * 50}
+                                       for number in range(500)]
+    result = json.loads(tools.call("long", "{}"))
+    assert result["truncated"] is True
+    assert 0 < len(result["results"]) < 500
+    assert len(json.dumps(result)) <= MAX_RESULT_CHARS
+
+
+def test_unknown_tools_share_one_stats_entry():
+    tools = ChatTools()
+    for number in range(5):
+        assert "error" in json.loads(tools.call(f"invented_{number}", "{}"))
+    stats = tools.stats()["tools"]
+    assert stats[UNKNOWN_TOOL]["calls"] == 5
+    assert not any(name.startswith("invented_") for name in stats)
+
+
+def test_tool_results_and_errors_are_json():
+    tools = ChatTools()
+    techniques = json.loads(tools.call("search_techniques", '{"query": "kimura"}'))
+    assert any(technique["name"] == "Kimura" for technique in techniques)
+    assert "error" in json.loads(tools.call("search_techniques", "not json"))
+    assert tools.stats()["tools"]["search_techniques"]["calls"] == 2
@@ -0,0 +1,88 @@
+"""Token-budgeted context window over a chat conversation."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.chat_handler import BJJChatHandler
+from src.context_window import ContextWindow, count_tokens, message_tokens
+from src.response_cache import ResponseCache
+
+SYSTEM = {"role": "system", "content": "You are a BJJ coach."}
+
+
+def conversation(turns, words=40):
+    history = [SYSTEM]
+    for number in range(turns):
+        history.append({"role": "user",
+                        "content": f"Question {number}. " + "guard " * words})
+        history.append({"role": "assistant",
+                        "content": f"Answer {number}. " + "frame " * words})
+    return history
+
+
+def total_tokens(messages):
+    return sum(message_tokens(message) for message in messages)
+
+
+def test_short_conversations_are_sent_whole():
+    history = conversation(3)
+    assert ContextWindow(max_tokens=3000).build(history) == history
+
+
+def test_recent_whole_turns_fit_the_budget():
+    history = conversation(30)
+    window = ContextWindow(max_tokens=600, summary_tokens=100)
+    messages = window.build(history)
+
+    assert messages[0] == SYSTEM
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"].startswith("Summary of earlier parts")
+    kept = messages[2:]
+    # Kept messages are a whole number of turns from the end of the history
+    assert kept[0]["role"] == "user" and len(kept) % 2 == 0
+    assert kept == history[-len(kept):]
+    assert total_tokens([SYSTEM] + kept) <= 600 - 100
+    assert message_tokens(messages[1]) <= 100
+    # One more turn would not have fit
+    assert total_tokens([SYSTEM] + history[-len(kept) - 2:]) > 600 - 100
+
+
+def test_summary_quotes_the_latest_dropped_turns():
+    history = conversation(30)
+    messages = ContextWindow(max_tokens=600, summary_tokens=100).build(history)
+    dropped_turns = (len(history) - 1 - len(messages[2:])) // 2
+    summary = messages[1]["content"]
+    assert f"Answer {dropped_turns - 1}." in summary
+    assert "Question 0." not in summary
+
+
+def test_newest_turn_is_sent_even_over_budget():
+    history = conversation(2) + [{"role": "user", "content": "guard " * 2000}]
+    messages = ContextWindow(max_tokens=300, summary_tokens=50).build(history)
+    assert messages[-1] == history[-1]
+    assert messages[0] == SYSTEM
+
+
+def test_summary_must_be_smaller_than_the_window():
+    with pytest.raises(ValueError):
+        ContextWindow(max_tokens=100, summary_tokens=100)
+
+
+def test_messages_without_text_count_as_empty():
+    assert count_tokens(None) == 0
+    history = conversation(30) + [{"role": "assistant", "content": None}]
+    assert ContextWindow(max_tokens=600, summary_tokens=100).build(history)[-1]["content"] is None
+
+
+def test_reply_without_content_is_stored_as_empty_text():
+    def completion(content):
+        message = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    responses = [completion(None), completion("Frame and bridge.")]
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **options: responses.pop(0))))
+    handler = BJJChatHandler(client=client, cache=ResponseCache())
+    assert handler.chat("first") == ""
+    assert handler.chat("second") == "Frame and bridge."
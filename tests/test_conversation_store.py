@@ -0,0 +1,83 @@
+"""Server-side chat history: eviction, expiry and sharing through SQLite."""
+
+import time
+
+import pytest
+
+from src.conversation_store import ConversationStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "chat" / "conversations.db")
+
+
+def test_turns_are_appended_in_order():
+    store = ConversationStore()
+    store.append("a", "hi", "hello")
+    store.append("a", "escape mount?", "bridge and roll")
+    assert store.get("a") == [{"user": "hi", "assistant": "hello"},
+                              {"user": "escape mount?", "assistant": "bridge and roll"}]
+    assert store.get("unknown") == []
+
+    store.clear("a")
+    assert store.get("a") == []
+
+
+def test_least_recently_used_conversations_are_evicted():
+    store = ConversationStore(max_conversations=2)
+    for conversation_id in ("a", "b"):
+        store.append(conversation_id, "question", "answer")
+    store.get("a")
+    store.append("c", "question", "answer")
+    assert len(store) == 2
+    assert store.get("b") == []
+    assert store.get("a") and store.get("c")
+
+
+def test_memory_limit_keeps_the_newest_conversation():
+    store = ConversationStore(max_bytes=1000)
+    store.append("a", "x" * 400, "y")
+    store.append("b", "x" * 2000, "y")
+    assert store.get("a") == []
+    assert store.get("b")
+
+
+def test_idle_conversations_expire():
+    store = ConversationStore(ttl=60)
+    store.append("a", "question", "answer")
+    turns, size, _ = store._conversations["a"]
+    store._conversations["a"] = (turns, size, time.time() - 61)
+    assert store.get("a") == []
+
+
+def test_evicted_conversations_are_reloaded_from_the_database(path):
+    store = ConversationStore(max_conversations=1, path=path)
+    store.append("a", "first", "answer")
+    store.append("b", "second", "answer")
+    assert len(store) == 1
+    assert store.get("a") == [{"user": "first", "assistant": "answer"}]
+
+
+def test_processes_sharing_a_path_see_each_others_turns(path):
+    first, second = ConversationStore(path=path), ConversationStore(path=path)
+    first.append("a", "one", "1")
+    assert second.get("a") == [{"user": "one", "assistant": "1"}]
+
+    # Each store now holds the conversation in memory; turns added by one
+    # must still reach the other
+    second.append("a", "two", "2")
+    first.append("a", "three", "3")
+    assert [turn["user"] for turn in second.get("a")] == ["one", "two", "three"]
+
+    second.clear("a")
+    assert first.get("a") == []
+
+
+def test_expired_conversations_are_purged(path):
+    store = ConversationStore(ttl=60, path=path)
+    store.append("a", "question", "answer")
+    store._db.execute("UPDATE conversations SET last_used = ?", (time.time() - 61,))
+    assert ConversationStore(ttl=60, path=path).get("a") == []
+    store.purge_expired()
+    assert store._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0
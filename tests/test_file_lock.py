@@ -0,0 +1,101 @@
+"""Cross-process locking and multi-process note writes."""
+
+import threading
+
+from src.file_lock import FileLock
+from src.log_storage import LogNoteStorage
+from src.notes_manager import NotesManager
+
+HOLD_LOCK = """
+import sys
+from src.file_lock import FileLock
+lock = FileLock({path!r})
+with lock:
+    print("locked", flush=True)
+    sys.stdin.readline()
+"""
+
+SAVE_NOTES = """
+from src.notes_manager import NotesManager
+manager = NotesManager({notes_dir!r})
+for number in range({count}):
+    manager.save_note("Same title", "note %d" % number, tags=["drill"])
+print("saved", flush=True)
+"""
+
+
+def test_lock_is_reentrant_within_a_thread(tmp_path):
+    lock = FileLock(str(tmp_path / "lock"))
+    with lock:
+        with lock:
+            assert lock.acquire(blocking=False)
+            lock.release()
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_lock_excludes_other_threads(tmp_path):
+    lock = FileLock(str(tmp_path / "lock"))
+    results = []
+    with lock:
+        thread = threading.Thread(target=lambda: results.append(lock.acquire(blocking=False)))
+        thread.start()
+        thread.join()
+    assert results == [False]
+
+
+def test_lock_excludes_other_processes(tmp_path, run_python):
+    path = str(tmp_path / "lock")
+    child = run_python(HOLD_LOCK.format(path=path))
+    assert child.stdout.readline().strip() == "locked"
+
+    lock = FileLock(path)
+    assert not lock.acquire(blocking=False)
+
+    child.stdin.write("\n")
+    child.stdin.flush()
+    assert child.wait(timeout=30) == 0
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_processes_saving_at_once_get_distinct_ids(tmp_path, run_python):
+    notes_dir = str(tmp_path / "notes")
+    NotesManager(notes_dir)
+    children = [run_python(SAVE_NOTES.format(notes_dir=notes_dir, count=15)) for _ in range(4)]
+    for child in children:
+        assert child.stdout.readline().strip() == "saved", child.stderr.read()
+        assert child.wait(timeout=60) == 0
+
+    notes = NotesManager(notes_dir).list_notes()
+    assert len(notes) == 60
+    assert len({note["id"] for note in notes}) == 60
+
+
+def test_notes_saved_by_another_process_become_visible(tmp_path, run_python):
+    notes_dir = str(tmp_path / "notes")
+    manager = NotesManager(notes_dir)
+    assert manager.list_notes() == []
+
+    child = run_python(SAVE_NOTES.format(notes_dir=notes_dir, count=2))
+    assert child.stdout.readline().strip() == "saved", child.stderr.read()
+    assert child.wait(timeout=60) == 0
+
+    assert len(manager.list_notes()) == 2
+    assert manager.list_notes(tag="drill")[0]["title"] == "Same title"
+
+
+def test_note_log_refuses_a_second_process(tmp_path, run_python):
+    log_dir = str(tmp_path / "log")
+    storage = LogNoteStorage(log_dir)
+    try:
+        child = run_python(
+            f"from src.log_storage import LogNoteStorage\nLogNoteStorage({log_dir!r})")
+        assert child.wait(timeout=60) != 0
+        assert "already open in another process" in child.stderr.read()
+    finally:
+        storage.close()
+
+    # Once closed, the log can be opened again
+    LogNoteStorage(log_dir).close()
+
@@ -0,0 +1,54 @@
+"""Typo-tolerant name matching with a trigram index."""
+
+import pytest
+
+from src.bjj_reference import search_techniques
+from src.fuzzy_search import FuzzyIndex, bounded_edit_distance, fold, max_typos
+
+
+@pytest.fixture
+def fuzzy():
+    index = FuzzyIndex()
+    index.add("rnc", ["Rear Naked Choke", "RNC", "Mata Leão"])
+    index.add("kimura", ["Kimura", "Double Wristlock"])
+    index.add("triangle", ["Triangle Choke"])
+    index.add("armbar", ["Armbar from Guard"])
+    return index
+
+
+def test_fold_removes_case_accents_and_punctuation():
+    assert fold("Mata-Leão!") == "mata leao"
+
+
+def test_bounded_edit_distance():
+    assert bounded_edit_distance("kimura", "kimura", 2) == 0
+    assert bounded_edit_distance("kimora", "kimura", 2) == 1
+    assert bounded_edit_distance("armbar", "amrbar", 2) == 2
+    # Anything past the bound is reported as bound + 1
+    assert bounded_edit_distance("armbar", "triangle", 2) == 3
+
+
+def test_longer_queries_allow_more_typos():
+    assert max_typos("rnc") <= max_typos("kimura") <= max_typos("rear naked choke")
+
+
+def test_fuzzy_search_finds_misspellings_and_aliases(fuzzy):
+    assert fuzzy.search("kimora") == ["kimura"]
+    assert fuzzy.search("tringle choke") == ["triangle"]
+    assert fuzzy.search("mata leao") == ["rnc"]
+    assert fuzzy.search("rnc") == ["rnc"]
+    assert fuzzy.search("armbr") == ["armbar"]
+    assert fuzzy.search("guillotine") == []
+
+
+def test_fuzzy_search_returns_each_item_once(fuzzy):
+    assert sorted(fuzzy.search("choke")) == ["rnc", "triangle"]
+    assert len(fuzzy.search("choke", limit=1)) == 1
+
+
+def test_technique_search_puts_exact_matches_before_close_spellings():
+    assert search_techniques("kimora")[0]["name"] == "Kimura"
+    assert search_techniques("rnc")[0]["name"] == "Rear Naked Choke"
+    names = [technique["name"] for technique in search_techniques("choke")]
+    assert "Rear Naked Choke" in names and "Triangle Choke" in names
+    assert all("choke" in name.lower() for name in names[:2])
@@ -0,0 +1,194 @@
+"""Log-structured note storage: crash replay and compaction."""
+
+import os
+
+import pytest
+
+from src.log_storage import LogNoteStorage, _SEGMENT_RE
+
+
+def make_note(number, content="body", created_at=None):
+    return {
+        "id": f"note_{number:03d}",
+        "title": f"Note {number}",
+        "content": content,
+        "tags": ["drill"] if number % 2 else ["guard"],
+        "category": "technique",
+        "created_at": created_at or f"2026-01-01T00:00:{number % 60:02d}.{number:06d}",
+        "updated_at": "2026-01-01T00:00:00"
+    }
+
+
+def segment_files(log_dir):
+    return sorted(name for name in os.listdir(log_dir) if _SEGMENT_RE.match(name))
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    return str(tmp_path / "log")
+
+
+def test_reopening_replays_puts_and_deletes(log_dir):
+    storage = LogNoteStorage(log_dir)
+    storage.put_many([make_note(number) for number in range(10)])
+    storage.put(make_note(3, content="rewritten"))
+    assert storage.delete("note_004")
+    assert not storage.delete("note_004")
+    storage.close()
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert storage.get("note_003")["content"] == "rewritten"
+        assert storage.get("note_004") is None
+        assert len(storage.list_metadata()) == 9
+        assert sorted(storage.ids_with_tag("guard")) == ["note_000", "note_002", "note_006",
+                                                         "note_008"]
+    finally:
+        storage.close()
+
+
+def test_torn_record_at_the_end_is_truncated(log_dir):
+    storage = LogNoteStorage(log_dir)
+    storage.put_many([make_note(number) for number in range(3)])
+    storage.close()
+
+    # A crash mid-write leaves part of a record at the end of the active segment
+    path = os.path.join(log_dir, segment_files(log_dir)[-1])
+    valid_size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"\x00\x01\x02 partial record")
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert os.path.getsize(path) == valid_size
+        assert [meta["id"] for meta in storage.list_metadata()] == [
+            "note_002", "note_001", "note_000"]
+        # New writes land after the truncated tail and survive another restart
+        storage.put(make_note(7))
+    finally:
+        storage.close()
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert storage.get("note_007")["title"] == "Note 7"
+        assert len(storage.list_metadata()) == 4
+    finally:
+        storage.close()
+
+
+def test_corrupted_record_ends_the_replay(log_dir):
+    storage = LogNoteStorage(log_dir)
+    storage.put(make_note(1))
+    storage.put(make_note(2))
+    storage.close()
+
+    # Flip a byte inside the last record so its checksum no longer matches
+    path = os.path.join(log_dir, segment_files(log_dir)[-1])
+    with open(path, "r+b") as f:
+        f.seek(-5, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-5, os.SEEK_END)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert storage.get("note_001") is not None
+        assert storage.get("note_002") is None
+    finally:
+        storage.close()
+
+
+def test_unfinished_compaction_output_is_removed(log_dir):
+    storage = LogNoteStorage(log_dir)
+    storage.put(make_note(1))
+    storage.close()
+    leftover = os.path.join(log_dir, "segment-00000001-0001.log.tmp")
+    with open(leftover, "wb") as f:
+        f.write(b"half-written compaction")
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert not os.path.exists(leftover)
+        assert storage.get("note_001") is not None
+    finally:
+        storage.close()
+
+
+def test_compaction_keeps_only_live_records(log_dir):
+    storage = LogNoteStorage(log_dir, segment_size=2048, compaction_threshold=1.1)
+    for version in range(5):
+        for number in range(10):
+            storage.put(make_note(number, content=f"version {version} " + "x" * 100))
+    for number in range(5):
+        storage.delete(f"note_{number:03d}")
+    sealed_before = len(segment_files(log_dir)) - 1
+    assert sealed_before > 1
+    assert storage.dead_ratio() > 0.5
+
+    storage.compact()
+    try:
+        assert storage.dead_ratio() == 0.0
+        assert len(segment_files(log_dir)) == 2
+        assert [storage.get(f"note_{number:03d}") for number in range(5)] == [None] * 5
+        for number in range(5, 10):
+            assert storage.get(f"note_{number:03d}")["content"].startswith("version 4 ")
+    finally:
+        storage.close()
+
+    # The compacted segment replays before the active one
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert len(storage.list_metadata()) == 5
+        assert storage.get("note_009")["content"].startswith("version 4 ")
+    finally:
+        storage.close()
+
+
+def test_writes_during_compaction_win(log_dir, monkeypatch):
+    storage = LogNoteStorage(log_dir, segment_size=1024, compaction_threshold=1.1)
+    for version in range(3):
+        storage.put_many([make_note(number, content=f"v{version} " + "y" * 80)
+                          for number in range(8)])
+
+    # Write once the live records are copied but before they are switched over
+    replace = os.replace
+
+    def replace_after_a_write(source, destination):
+        storage.put(make_note(0, content="written during compaction"))
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", replace_after_a_write)
+    storage.compact()
+    monkeypatch.undo()
+    try:
+        assert storage.get("note_000")["content"] == "written during compaction"
+    finally:
+        storage.close()
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert storage.get("note_000")["content"] == "written during compaction"
+        assert len(storage.list_metadata()) == 8
+    finally:
+        storage.close()
+
+
+def test_background_compaction_starts_past_the_threshold(log_dir):
+    storage = LogNoteStorage(log_dir, segment_size=1024, compaction_threshold=0.3)
+    for version in range(6):
+        for number in range(4):
+            storage.put(make_note(number, content=f"v{version} " + "z" * 120))
+    # close() waits for a running compaction
+    storage.close()
+
+    # A compacted segment gets a newer generation than the ones it replaced
+    generations = [int(_SEGMENT_RE.match(name).group(2)) for name in segment_files(log_dir)]
+    assert max(generations) > 0
+
+    storage = LogNoteStorage(log_dir)
+    try:
+        assert len(storage.list_metadata()) == 4
+        assert all(storage.get(f"note_{number:03d}")["content"].startswith("v5 ")
+                   for number in range(4))
+    finally:
+        storage.close()
@@ -0,0 +1,101 @@
+"""Process-wide note catalog: sharing and revalidation against the files."""
+
+import json
+import os
+
+import pytest
+
+from src.note_storage import JsonNoteStorage, _NoteCatalog
+
+
+def make_note(note_id, title, tags=("guard",)):
+    return {"id": note_id, "title": title, "content": f"{title} details", "tags": list(tags),
+            "category": "technique", "created_at": f"2026-01-01T10:00:{note_id[-2:]}",
+            "updated_at": "2026-01-01T10:00:00"}
+
+
+def write_by_hand(notes_dir, note, mtime_ns=None):
+    """Write a note file the way another program would, without the catalog."""
+    path = os.path.join(notes_dir, f"{note['id']}.json")
+    with open(path, "w") as f:
+        json.dump(note, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def titles(catalog):
+    return sorted(meta["title"] for meta in catalog.select())
+
+
+@pytest.fixture
+def notes_dir(tmp_path):
+    notes_dir = str(tmp_path / "notes")
+    JsonNoteStorage(notes_dir).put_many([make_note("note_01", "Kimura"),
+                                         make_note("note_02", "Armbar")])
+    return notes_dir
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count the note files parsed by any catalog."""
+    parsed = []
+    read_file = _NoteCatalog._read_file
+
+    def counting(self, filepath):
+        parsed.append(os.path.basename(filepath))
+        return read_file(self, filepath)
+
+    monkeypatch.setattr(_NoteCatalog, "_read_file", counting)
+    return parsed
+
+
+def test_storages_of_one_directory_share_a_catalog(notes_dir):
+    first, second = JsonNoteStorage(notes_dir), JsonNoteStorage(notes_dir + os.sep)
+    assert first._catalog is second._catalog
+    first.put(make_note("note_03", "Triangle"))
+    assert second.get("note_03")["title"] == "Triangle"
+
+
+def test_unchanged_files_are_not_parsed_again(notes_dir, parses):
+    catalog = _NoteCatalog(notes_dir, revalidate_interval=0)
+    catalog.notes()
+    parses.clear()
+    catalog.refresh()
+    assert catalog.notes() and parses == []
+
+
+def test_files_edited_in_place_are_reparsed(notes_dir, parses):
+    catalog = _NoteCatalog(notes_dir, revalidate_interval=0)
+    assert titles(catalog) == ["Armbar", "Kimura"]
+    parses.clear()
+    # Same size as before, so only the mtime tells the edit apart
+    mtime_ns = os.stat(os.path.join(notes_dir, "note_01.json")).st_mtime_ns
+    write_by_hand(notes_dir, make_note("note_01", "Kimuro"), mtime_ns + 1_000_000)
+    assert titles(catalog) == ["Armbar", "Kimuro"]
+    assert parses == ["note_01.json"]
+
+
+def test_edits_wait_for_the_revalidate_interval(notes_dir):
+    catalog = _NoteCatalog(notes_dir, revalidate_interval=3600)
+    assert titles(catalog) == ["Armbar", "Kimura"]
+    write_by_hand(notes_dir, make_note("note_01", "Kimura trap"))
+    assert titles(catalog) == ["Armbar", "Kimura"]
+    # A single note is always checked against its file
+    assert catalog.get("note_01")["title"] == "Kimura trap"
+    assert titles(catalog) == ["Armbar", "Kimura trap"]
+
+
+def test_added_and_removed_files_are_noticed_at_once(notes_dir):
+    catalog = _NoteCatalog(notes_dir, revalidate_interval=3600)
+    assert titles(catalog) == ["Armbar", "Kimura"]
+    write_by_hand(notes_dir, make_note("note_03", "Triangle", tags=("closed guard",)))
+    os.remove(os.path.join(notes_dir, "note_02.json"))
+    assert titles(catalog) == ["Kimura", "Triangle"]
+    assert catalog.ids_with_tag("closed guard") == ["note_03"]
+    assert catalog.get("note_02") is None
+
+
+def test_unreadable_files_are_skipped(notes_dir):
+    with open(os.path.join(notes_dir, "broken.json"), "w") as f:
+        f.write("{not json")
+    assert titles(_NoteCatalog(notes_dir)) == ["Armbar", "Kimura"]
@@ -0,0 +1,73 @@
+"""Bulk JSONL import and export of notes."""
+
+import json
+
+import pytest
+
+from src.notes_manager import NotesManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return NotesManager(str(tmp_path / "notes"))
+
+
+def record(title="Kimura", created_at="2026-01-01T10:00:00", **fields):
+    return json.dumps({"title": title, "content": f"{title} details",
+                       "created_at": created_at, **fields})
+
+
+def test_duplicate_ids_are_suffixed_across_batches(manager):
+    lines = [record() for _ in range(5)]
+    reports = list(manager.import_notes(lines, batch_size=2))
+    ids = [report["id"] for report in reports]
+    base = "20260101_100000_kimura"
+    assert ids == [base, f"{base}_2", f"{base}_3", f"{base}_4", f"{base}_5"]
+    assert [report["line"] for report in reports] == [1, 2, 3, 4, 5]
+
+    # A second import continues after the notes already stored
+    assert [report["id"] for report in manager.import_notes([record()])] == [f"{base}_6"]
+    assert len(manager.storage.list_metadata()) == 6
+
+
+def test_every_bad_line_is_reported_and_the_rest_imported(manager):
+    lines = [
+        record("Armbar", tags="arm, mount"),
+        "{not json",
+        "",
+        json.dumps(["a", "list"]),
+        json.dumps({"title": "No content"}),
+        record("Triangle", tags=[1, 2]),
+        record("Omoplata", created_at="yesterday"),
+        b"\xff\xfe",
+        record("Triangle", id="ignored", category="submissions").encode("utf-8")
+    ]
+    reports = list(manager.import_notes(lines))
+    assert [report["line"] for report in reports] == [1, 2, 4, 5, 6, 7, 8, 9]
+    assert [report["success"] for report in reports] == [
+        True, False, False, False, False, False, False, True]
+    errors = [report["error"] for report in reports if not report["success"]]
+    assert errors[0].startswith("Invalid JSON")
+    assert errors[1:] == ["Record must be a JSON object", "Title and content are required",
+                          "tags must be a list of strings",
+                          "created_at and updated_at must be ISO 8601 timestamps",
+                          "Line is not valid UTF-8"]
+
+    armbar = manager.get_note(reports[0]["id"])
+    assert armbar["tags"] == ["arm", "mount"]
+    assert armbar["updated_at"] == armbar["created_at"] == "2026-01-01T10:00:00"
+    triangle = manager.get_note(reports[-1]["id"])
+    assert triangle["id"] != "ignored" and triangle["category"] == "submissions"
+
+
+def test_export_round_trips_through_import(manager, tmp_path):
+    # Reports are generated lazily, so nothing is imported until they are read
+    manager.import_notes([record("Guillotine")])
+    list(manager.import_notes([record("Kimura", tags=["arm"]), record("Armbar")]))
+    exported = [json.dumps(note) for note in manager.export_notes()]
+    assert len(exported) == 2
+
+    copy = NotesManager(str(tmp_path / "copy"))
+    assert all(report["success"] for report in copy.import_notes(exported))
+    assert sorted((note["id"], note["title"], note["tags"]) for note in copy.export_notes()) == \
+        sorted((note["id"], note["title"], note["tags"]) for note in manager.export_notes())
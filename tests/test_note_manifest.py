@@ -0,0 +1,89 @@
+"""Metadata manifest: cold starts without parsing, and recovery when stale."""
+
+import os
+
+import pytest
+
+from src.note_storage import MANIFEST_NAME, JsonNoteStorage, _NoteCatalog
+
+
+def make_note(number):
+    return {"id": f"note_{number:02d}", "title": f"Drill {number}",
+            "content": f"Drill number {number}", "tags": ["drill"], "category": "drills",
+            "created_at": f"2026-01-01T10:00:{number:02d}", "updated_at": "2026-01-01T10:00:00"}
+
+
+@pytest.fixture
+def notes_dir(tmp_path):
+    notes_dir = str(tmp_path / "notes")
+    JsonNoteStorage(notes_dir).put_many([make_note(number) for number in range(10)])
+    return notes_dir
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count the note files parsed by any catalog."""
+    parsed = []
+    read_file = _NoteCatalog._read_file
+
+    def counting(self, filepath):
+        parsed.append(os.path.basename(filepath))
+        return read_file(self, filepath)
+
+    monkeypatch.setattr(_NoteCatalog, "_read_file", counting)
+    return parsed
+
+
+def cold_start(notes_dir):
+    """Return the listing seen by a catalog starting as a new process would."""
+    return [meta["id"] for meta in _NoteCatalog(notes_dir).select()]
+
+
+def manifest_path(notes_dir):
+    return os.path.join(notes_dir, MANIFEST_NAME)
+
+
+def test_cold_start_lists_notes_without_parsing_them(notes_dir, parses):
+    assert cold_start(notes_dir) == [f"note_{number:02d}" for number in reversed(range(10))]
+    assert parses == []
+
+
+def test_changed_files_are_parsed_and_the_manifest_updated(notes_dir, parses):
+    with open(os.path.join(notes_dir, "note_03.json"), "w") as f:
+        f.write('{"id": "note_03", "title": "Edited by hand", "created_at": "2026-01-01"}')
+    catalog = _NoteCatalog(notes_dir)
+    assert catalog.metadata_for(["note_03"])["note_03"]["title"] == "Edited by hand"
+    assert parses == ["note_03.json"]
+
+    parses.clear()
+    assert cold_start(notes_dir)[-1] == "note_03"
+    assert parses == []
+
+
+@pytest.mark.parametrize("contents", ["{not json", '{"version": 99, "files": {}}',
+                                      '{"version": 1, "files": {"note_01.json": 5}}'])
+def test_unusable_manifest_is_rebuilt_from_the_files(notes_dir, parses, contents):
+    # Fold the journal into the snapshot, then spoil the snapshot
+    _NoteCatalog(notes_dir)._manifest.write_snapshot({}, {})
+    with open(manifest_path(notes_dir), "w") as f:
+        f.write(contents)
+    assert len(cold_start(notes_dir)) == 10
+    assert len(parses) == 10
+
+    parses.clear()
+    assert len(cold_start(notes_dir)) == 10
+    assert parses == []
+
+
+def test_torn_journal_line_is_ignored(notes_dir, parses):
+    journal = manifest_path(notes_dir) + ".log"
+    with open(journal, "a") as f:
+        f.write('{"f": "note_04.json", "d": tr')
+    assert len(cold_start(notes_dir)) == 10
+    assert parses == []
+
+
+def test_missing_files_drop_out_of_a_cold_start(notes_dir, parses):
+    os.remove(os.path.join(notes_dir, "note_05.json"))
+    assert "note_05" not in cold_start(notes_dir)
+    assert parses == []
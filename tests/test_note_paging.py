@@ -0,0 +1,97 @@
+"""Cursor paging of note listings on every storage backend."""
+
+import pytest
+
+from src.log_storage import LogNoteStorage
+from src.note_storage import JsonNoteStorage
+from src.notes_manager import NotesManager
+from src.sqlite_storage import SQLiteNoteStorage
+
+BACKENDS = {
+    "json": lambda path: JsonNoteStorage(str(path / "notes")),
+    "sqlite": lambda path: SQLiteNoteStorage(str(path / "notes.db")),
+    "log": lambda path: LogNoteStorage(str(path / "log"))
+}
+
+
+def make_note(number):
+    return {
+        "id": f"note_{number:03d}",
+        "title": f"Note {number}",
+        "content": f"Drill number {number}",
+        "tags": ["drill", "even"] if number % 2 == 0 else ["drill"],
+        "category": "technique" if number % 3 == 0 else "general",
+        # Pairs of notes share a timestamp, so ties are broken by id
+        "created_at": f"2026-01-01T10:{number // 2:02d}:00",
+        "updated_at": f"2026-01-01T10:{number // 2:02d}:00"
+    }
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def manager(request, tmp_path):
+    storage = BACKENDS[request.param](tmp_path)
+    storage.put_many([make_note(number) for number in range(25)])
+    yield NotesManager(str(tmp_path / "notes"), storage=storage)
+    if hasattr(storage, "close"):
+        storage.close()
+
+
+def all_pages(manager, limit, **filters):
+    """Return every page of a listing, following the cursors."""
+    pages = [manager.list_notes(limit=limit, **filters)]
+    while pages[-1].next_cursor:
+        pages.append(manager.list_notes(limit=limit, cursor=pages[-1].next_cursor, **filters))
+    return pages
+
+
+def test_pages_cover_every_note_once_newest_first(manager):
+    pages = all_pages(manager, limit=10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [note["id"] for page in pages for note in page]
+    assert ids == [note["id"] for note in manager.list_notes()]
+    expected = sorted((make_note(number) for number in range(25)),
+                      key=lambda note: (note["created_at"], note["id"]), reverse=True)
+    assert ids == [note["id"] for note in expected]
+
+
+def test_listings_hold_metadata_only(manager):
+    note = manager.list_notes(limit=1)[0]
+    assert {"id", "title", "created_at", "tags", "category"} <= set(note)
+    assert "content" not in note
+
+
+def test_exact_last_page_has_no_cursor(manager):
+    pages = all_pages(manager, limit=5)
+    assert len(pages) == 5
+    assert pages[-1].next_cursor is None
+
+
+def test_filtered_pages(manager):
+    pages = all_pages(manager, limit=4, tag="even")
+    ids = [note["id"] for page in pages for note in page]
+    assert ids == [f"note_{number:03d}" for number in range(24, -1, -2)]
+
+    pages = all_pages(manager, limit=3, category="technique")
+    ids = [note["id"] for page in pages for note in page]
+    assert ids == [f"note_{number:03d}" for number in range(24, -1, -3)]
+
+
+def test_unused_filters_list_nothing(manager):
+    assert list(manager.list_notes(limit=5, tag="unused")) == []
+    assert list(manager.list_notes(limit=5, category="unused")) == []
+    assert list(manager.list_notes(limit=5, tag="unused", category="technique")) == []
+
+
+def test_pages_stay_stable_while_notes_are_added(manager):
+    first = manager.list_notes(limit=10)
+    manager.storage.put({**make_note(99), "created_at": "2027-01-01T00:00:00"})
+    second = manager.list_notes(limit=10, cursor=first.next_cursor)
+    assert second[0]["id"] == "note_014"
+    assert not {note["id"] for note in first} & {note["id"] for note in second}
+
+
+def test_bad_cursor_and_limit_are_rejected(manager):
+    with pytest.raises(ValueError):
+        manager.list_notes(limit=10, cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        manager.list_notes(limit=0)
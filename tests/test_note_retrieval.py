@@ -0,0 +1,82 @@
+"""Note excerpts sent with chat messages."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.chat_handler import BJJChatHandler
+from src.context_window import count_tokens
+from src.note_retrieval import NoteRetriever, excerpt, question_terms
+from src.notes_manager import NotesManager
+
+KIMURA = ("Warm up with shoulder rolls. Kimura from closed guard starts by breaking posture. "
+          "Talk to the coach about the open mat. Trap the wrist with a figure four grip. "
+          "Rotate the shoulder slowly to finish the kimura.")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = NotesManager(str(tmp_path / "notes"))
+    manager.save_note("Kimura", KIMURA)
+    manager.save_note("Armbar", "Pinch the knees. Fall back and lift the hips.")
+    manager.save_note("Kimura trap", "From side control, trap the far arm for the kimura.")
+    return manager
+
+
+def test_question_terms_skip_common_words():
+    assert question_terms("How do I finish the kimura from guard? Explain the kimura grips") == [
+        "finish", "kimura", "guard", "grip"]
+    assert question_terms("What is the best way?") == []
+
+
+def test_excerpt_keeps_matching_sentences_in_order():
+    text = excerpt(KIMURA, ["kimura", "wrist"], max_tokens=40)
+    assert text == ("Kimura from closed guard starts by breaking posture. ... "
+                    "Trap the wrist with a figure four grip. "
+                    "Rotate the shoulder slowly to finish the kimura.")
+
+
+def test_excerpt_stays_within_budget():
+    first = "Kimura from closed guard starts by breaking posture."
+    assert excerpt(KIMURA, ["kimura"], max_tokens=count_tokens(first)) == first
+    # A best sentence longer than the budget is cut short
+    assert excerpt(KIMURA, ["kimura"], max_tokens=4) == "Kimura from ..."
+
+
+def test_retrieve_returns_the_best_notes_within_budget(manager):
+    results = NoteRetriever(manager, k=2, max_tokens=60).retrieve("How do I finish the kimura?")
+    assert [result["title"] for result in results] == ["Kimura", "Kimura trap"]
+    assert all(count_tokens(result["title"]) + count_tokens(result["excerpt"]) <= 30
+               for result in results)
+    assert "open mat" not in results[0]["excerpt"]
+
+
+def test_questions_without_matches_add_no_context(manager):
+    retriever = NoteRetriever(manager)
+    assert retriever.context_message("What is the best way?") is None
+    assert retriever.context_message("guillotine defence") is None
+    assert NoteRetriever(manager, k=0).retrieve("kimura") == []
+
+
+def test_context_is_sent_with_the_message(manager):
+    sent = []
+
+    def create(**options):
+        sent.append(options["messages"])
+        message = SimpleNamespace(content="Keep the elbow tight.", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    class BrokenRetriever:
+        def context_message(self, question):
+            raise OSError("index unavailable")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    handler = BJJChatHandler(client=client, cache=None,
+                             retrievers=[BrokenRetriever(), NoteRetriever(manager)])
+    assert handler.chat("How do I finish the kimura?") == "Keep the elbow tight."
+    context = sent[0][1]
+    assert context["role"] == "system"
+    assert context["content"].startswith("Excerpts from the student's own notes")
+    assert "[Kimura] " in context["content"]
+    # The excerpts are not kept in the conversation
+    assert all("Excerpts" not in message["content"] for message in handler.conversation_history)
@@ -0,0 +1,117 @@
+"""Full-text note search: terms, BM25 ranking and AND/OR on every backend."""
+
+import sqlite3
+
+import pytest
+
+from src.log_storage import LogNoteStorage
+from src.note_storage import JsonNoteStorage
+from src.search_index import InvertedIndex, tokenize
+from src.sqlite_storage import SQLiteNoteStorage
+
+BACKENDS = {
+    "json": lambda path: JsonNoteStorage(str(path / "notes")),
+    "sqlite": lambda path: SQLiteNoteStorage(str(path / "notes.db")),
+    "log": lambda path: LogNoteStorage(str(path / "log"))
+}
+
+NOTES = [
+    ("armbar", "Armbar from mount", "Isolate the arm, pinch the knees and fall back.",
+     ["submissions"]),
+    ("passing", "Guard passing basics", "Break the grips, then pass to side control.",
+     ["passes"]),
+    ("mount", "Mount escapes", "Bridge and roll, or frame and shrimp back to guard.",
+     ["escapes"]),
+    ("chokes", "Chokes from the back", "This covers the rear naked choke and the bow and arrow.",
+     ["submissions", "back"]),
+    ("cross", "Cross collar choke", "Deep grip in the collar, then the second grip across.",
+     ["submissions"]),
+    ("status", "Status of my guard", "My half_guard sweeps work; the closed guard needs this.",
+     ["journal"])
+]
+
+
+def make_note(note_id, title, content, tags):
+    return {"id": note_id, "title": title, "content": content, "tags": tags,
+            "category": "general", "created_at": "2026-01-01T10:00:00",
+            "updated_at": "2026-01-01T10:00:00"}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def storage(request, tmp_path):
+    storage = BACKENDS[request.param](tmp_path)
+    storage.put_many([make_note(*note) for note in NOTES])
+    yield storage
+    if hasattr(storage, "close"):
+        storage.close()
+
+
+def ids(notes):
+    return [note["id"] for note in notes]
+
+
+def test_plurals_fold_to_the_singular():
+    assert tokenize("Chokes, Sweeps and Passes") == ["choke", "sweep", "and", "passe"]
+    assert tokenize("this cross status thesis gis") == ["this", "cross", "status", "thesis", "gis"]
+    assert tokenize("Half_Guard leão") == ["half_guard", "leão"]
+
+
+def test_title_matches_outrank_content_matches():
+    index = InvertedIndex({"title": 3.0, "content": 1.0})
+    index.add("content", {"title": "Drills", "content": "A guard retention drill"})
+    index.add("title", {"title": "Guard retention", "content": "Drills"})
+    index.add("other", {"title": "Mount", "content": "Bridge"})
+    assert [doc_id for doc_id, _ in index.search("guard")] == ["title", "content"]
+
+
+def test_terms_are_combined_with_and_unless_or_is_given(storage):
+    assert set(ids(storage.search("guard"))) == {"passing", "mount", "status"}
+    assert set(ids(storage.search("guard bridge"))) == {"mount"}
+    assert set(ids(storage.search("armbar OR bridge"))) == {"armbar", "mount"}
+    assert set(ids(storage.search("armbar bridge", operator="or"))) == {"armbar", "mount"}
+    assert storage.search("guard armbar") == []
+
+
+def test_every_backend_matches_the_same_terms(storage):
+    assert set(ids(storage.search("choke"))) == {"chokes", "cross"}
+    assert set(ids(storage.search("submission"))) == {"armbar", "chokes", "cross"}
+    # Words that only look like plurals are matched whole
+    assert set(ids(storage.search("this"))) == {"chokes", "status"}
+    assert ids(storage.search("cross")) == ["cross"]
+    assert ids(storage.search("status")) == ["status"]
+    assert ids(storage.search("half_guard")) == ["status"]
+    # Only the whole-word form is indexed, so parts of it do not match
+    assert storage.search("half") == []
+    assert storage.search("pas") == []
+
+
+def test_best_match_ranks_first_with_a_limit(storage):
+    assert ids(storage.search("choke", limit=1)) == ["chokes"]
+
+
+def test_search_table_of_an_older_database_is_rebuilt(tmp_path):
+    db_path = str(tmp_path / "notes.db")
+    storage = SQLiteNoteStorage(db_path)
+    storage.put_many([make_note(*note) for note in NOTES])
+    storage.close()
+    # Recreate the porter-stemmed table of version 1 holding the raw text
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        DROP TABLE notes_fts;
+        CREATE VIRTUAL TABLE notes_fts USING fts5 (
+            title, tags, content, tokenize = 'porter unicode61'
+        );
+        INSERT INTO notes_fts (rowid, title, tags, content)
+            SELECT rowid, title, tags, content FROM notes;
+        PRAGMA user_version = 1;
+    """)
+    conn.close()
+
+    storage = SQLiteNoteStorage(db_path)
+    try:
+        # The old table split "half_guard" and stemmed "status" to "statu"
+        assert storage.search("half") == []
+        assert ids(storage.search("half_guard")) == ["status"]
+        assert ids(storage.search("status")) == ["status"]
+    finally:
+        storage.close()
@@ -0,0 +1,161 @@
+"""Position transition graph: distances and chain queries."""
+
+import pickle
+import random
+
+import pytest
+
+from src.bjj_reference import find_position_chains
+from src.position_graph import MAX_CHAINS, MAX_EXTRA_STEPS, PositionGraph
+from src.technique_catalog import Technique
+
+POSITIONS = {
+    "guard": {"name": "Guard", "types": ["Closed Guard", "Open Guard"]},
+    "mount": {"name": "Mount", "types": []},
+    "side_control": {"name": "Side Control", "types": []},
+    "back_control": {"name": "Back Control", "types": []},
+    "turtle": {"name": "Turtle", "types": []}
+}
+
+
+def move(name, start, end, side="bottom", to_side="top"):
+    return Technique(name=name, category="transitions", sub_category=None, position=None,
+                     from_position=start, target=None, type=None, side=side,
+                     to_position=end, to_side=to_side)
+
+
+@pytest.fixture
+def graph():
+    return PositionGraph(POSITIONS, [
+        move("Scissor Sweep", "closed_guard", "mount"),
+        move("Hip Bump Sweep", "closed_guard", "mount"),
+        move("Flower Sweep", "guard", "mount"),
+        move("Mount to Back", "mount", "back_control", "top", "top"),
+        move("Knee Cut", "open_guard", "side_control", "top", "top"),
+        move("Mount from Side", "side_control", "mount", "top", "top"),
+        move("Take the Back", "turtle", "back_control", "top", "top"),
+        # Techniques without a destination are not moves
+        Technique("Armbar", "submissions", None, "mount", None, "arm", None, None, None, None)
+    ])
+
+
+def chain_positions(chain):
+    return [(position["key"], position["side"]) for position in chain["positions"]]
+
+
+def test_distances(graph):
+    assert graph.distance("closed_guard", "mount") == 1
+    assert graph.distance("closed_guard", "back_control") == 2
+    assert graph.distance("guard", "back_control", start_side="bottom") == 2
+    assert graph.distance("open_guard", "back_control", start_side="top") == 3
+    assert graph.distance("back_control", "guard") is None
+
+
+def test_variation_inherits_its_positions_moves(graph):
+    chains = graph.find_chains("closed_guard", "mount", start_side="bottom")
+    assert chains[0]["moves"] == [["Scissor Sweep", "Hip Bump Sweep", "Flower Sweep"]]
+
+
+def test_reaching_a_variation_reaches_its_position(graph):
+    extra = PositionGraph(POSITIONS, [move("Pull Guard", "turtle", "open_guard", "top",
+                                           "bottom")])
+    assert extra.distance("turtle", "guard", goal_side="bottom") == 1
+    assert chain_positions(extra.find_chains("turtle", "guard")[0]) == [
+        ("turtle", "top"), ("open_guard", "bottom")]
+
+
+def test_chains_come_shortest_first(graph):
+    chains = graph.find_chains("guard", "back_control", limit=MAX_CHAINS)
+    assert [chain["steps"] for chain in chains] == sorted(chain["steps"] for chain in chains)
+    assert chain_positions(chains[0]) == [("guard", "bottom"), ("mount", "top"),
+                                          ("back_control", "top")]
+    assert chains[0]["moves"] == [["Flower Sweep"], ["Mount to Back"]]
+    assert all(len(chain["moves"]) == chain["steps"] for chain in chains)
+
+
+def test_unknown_positions_and_sides_are_rejected(graph):
+    with pytest.raises(ValueError):
+        graph.find_chains("guard", "lasso")
+    with pytest.raises(ValueError):
+        graph.find_chains("guard", "mount", start_side="left")
+
+
+def test_unreachable_and_same_position_give_no_chains(graph):
+    assert graph.find_chains("back_control", "guard") == []
+    assert graph.find_chains("mount", "mount") == []
+
+
+def test_graph_survives_pickling(graph):
+    copy = pickle.loads(pickle.dumps(graph))
+    assert copy.find_chains("guard", "back_control") == graph.find_chains("guard", "back_control")
+
+
+def brute_force_chains(graph, start, goal):
+    """Every loop-free path from start to the goal node or a variation of it."""
+    goals = {index for index, node in enumerate(graph.nodes)
+             if index == goal or graph._parents[index] == goal}
+    found = []
+
+    def extend(path):
+        node = path[-1]
+        for edge in range(graph._offsets[node], graph._offsets[node + 1]):
+            end = graph._targets[edge]
+            if end in path:
+                continue
+            if end in goals:
+                found.append(path + [end])
+            else:
+                extend(path + [end])
+
+    extend([start])
+    return found
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chains_match_a_brute_force_search(seed):
+    rng = random.Random(seed)
+    positions = {f"p{number}": {"name": f"P{number}",
+                                "types": [f"p{number} v{variation}"
+                                          for variation in range(rng.randint(0, 2))]}
+                 for number in range(6)}
+    refs = list(positions) + [variation.replace(" ", "_")
+                              for position in positions.values()
+                              for variation in position["types"]]
+    records = [move(f"m{number}", rng.choice(refs), rng.choice(refs),
+                    rng.choice(["top", "bottom"]), rng.choice(["top", "bottom"]))
+               for number in range(rng.randint(6, 18))]
+    graph = PositionGraph(positions, records)
+
+    for start in range(len(graph.nodes)):
+        for goal in range(len(graph.nodes)):
+            if start == goal or graph._parents[start] == goal:
+                continue
+            (start_ref, start_side), (goal_ref, goal_side) = graph.nodes[start], graph.nodes[goal]
+            expected = brute_force_chains(graph, start, goal)
+            distance = graph.distance(start_ref, goal_ref, start_side, goal_side)
+            chains = graph.find_chains(start_ref, goal_ref, MAX_CHAINS, start_side, goal_side)
+            if not expected:
+                assert distance is None and chains == []
+                continue
+
+            best = min(len(path) - 1 for path in expected)
+            assert distance == best
+            wanted = sorted(len(path) - 1 for path in expected
+                            if len(path) - 1 <= best + MAX_EXTRA_STEPS)[:MAX_CHAINS]
+            assert [chain["steps"] for chain in chains] == wanted
+            paths = {tuple(graph.nodes[node] for node in path) for path in expected}
+            assert all(tuple(chain_positions(chain)) in paths for chain in chains)
+
+
+def test_bundled_reference_chains():
+    chains = find_position_chains("Closed Guard", "back control", limit=3)
+    assert chains and chains[0]["positions"][0]["key"] == "closed_guard"
+    assert chains[0]["positions"][-1]["key"] == "back_control"
+    assert [chain["steps"] for chain in chains] == sorted(chain["steps"] for chain in chains)
+
+
+def test_chains_are_stored_when_the_graph_is_built(graph, monkeypatch):
+    # Queries read the stored chains and never search the graph
+    monkeypatch.setattr(PositionGraph, "_chains", None)
+    assert graph.find_chains("guard", "back_control")
+    assert graph._pair_chains[-1] == len(graph._chain_offsets) - 1
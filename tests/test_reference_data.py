@@ -0,0 +1,129 @@
+"""Reference dataset validation and compiled snapshots."""
+
+import json
+import os
+
+import pytest
+
+from src.reference_data import MAX_REPORTED_ERRORS, load_reference
+
+POSITIONS = {
+    "closed_guard": {"name": "Closed Guard", "description": "Legs locked around the waist",
+                     "types": ["Closed Guard"], "key_concepts": ["Break posture"]},
+    "mount": {"name": "Mount", "description": "Sitting on the torso", "types": ["Mount"],
+              "key_concepts": ["Base"], "aliases": ["full mount"]}
+}
+TECHNIQUES = [
+    {"name": "Kimura", "category": "submissions", "position": "closed_guard"},
+    {"name": "Hip Bump Sweep", "category": "sweeps", "from_position": "closed_guard",
+     "side": "bottom", "to_position": "mount", "to_side": "top"}
+]
+
+
+def write_dataset(data_dir, positions=POSITIONS, techniques=TECHNIQUES, **extra):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "dataset.json"), "w") as f:
+        json.dump({"format": 1, "version": "1.0.0"}, f)
+    with open(os.path.join(data_dir, "data.json"), "w") as f:
+        json.dump({"positions": positions, "techniques": techniques, **extra}, f)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = str(tmp_path / "reference")
+    write_dataset(data_dir, concepts=["Posture"])
+    return data_dir
+
+
+def errors(data_dir, **changes):
+    write_dataset(data_dir, **changes)
+    with pytest.raises(ValueError) as raised:
+        load_reference(data_dir)
+    return [line.strip() for line in str(raised.value).splitlines()[1:]]
+
+
+def test_dataset_is_compiled_once_then_loaded_from_the_snapshot(data_dir):
+    reference, source = load_reference(data_dir)
+    assert source == "compiled"
+    assert reference.version == "1.0.0" and reference.concepts == ["Posture"]
+    assert reference.position_aliases == {"mount": ["full mount"]}
+    assert "aliases" not in reference.positions["mount"]
+
+    again, source = load_reference(data_dir)
+    assert source == "snapshot"
+    assert again.positions == reference.positions
+    assert again.catalog.search("kimura") == reference.catalog.search("kimura")
+    assert load_reference(data_dir, force=True)[1] == "compiled"
+
+
+def test_edited_or_added_files_invalidate_the_snapshot(data_dir):
+    load_reference(data_dir)
+    write_dataset(data_dir, concepts=["Posture", "Base"])
+    reference, source = load_reference(data_dir)
+    assert source == "compiled" and reference.concepts == ["Posture", "Base"]
+
+    with open(os.path.join(data_dir, "more.json"), "w") as f:
+        json.dump({"concepts": ["Pressure"]}, f)
+    reference, source = load_reference(data_dir)
+    assert source == "compiled" and reference.concepts[-1] == "Pressure"
+    assert load_reference(data_dir)[1] == "snapshot"
+
+
+def test_unreadable_snapshot_is_rebuilt(data_dir, tmp_path):
+    snapshot_path = str(tmp_path / "reference.pickle")
+    load_reference(data_dir, snapshot_path=snapshot_path)
+    with open(snapshot_path, "r+b") as f:
+        f.truncate(os.path.getsize(snapshot_path) // 2)
+    assert load_reference(data_dir, snapshot_path=snapshot_path)[1] == "compiled"
+    assert load_reference(data_dir, snapshot_path=snapshot_path)[1] == "snapshot"
+
+
+def test_every_problem_is_reported_together(data_dir):
+    techniques = TECHNIQUES + [
+        {"name": "Kimura", "category": "submissions"},
+        {"name": "Armbar", "category": "submissions", "position": "side_control"},
+        {"name": "Bridge", "category": "escapes", "side": "bottom"},
+        {"name": "Upa", "category": "escapes", "from_position": "mount", "side": "under",
+         "to_position": "closed_guard", "to_side": "top"},
+        {"name": "Omoplata", "category": "submissions", "sub_category": "shoulder"},
+        {"category": "drills", "reps": 10}
+    ]
+    positions = {**POSITIONS, "Back": {"name": "Back"}}
+    assert errors(data_dir, positions=positions, techniques=techniques, sweeps=[]) == [
+        "data.json: unknown section 'sweeps'",
+        "data.json: positions.Back: keys are lowercase letters, digits and underscores",
+        "data.json: techniques[7]: missing 'name'",
+        "data.json: techniques[7]: unknown field 'reps'",
+        "data.json: techniques[2] (Kimura): technique defined more than once",
+        "data.json: techniques[3] (Armbar): unknown position 'side_control'",
+        "data.json: techniques[4] (Bridge): a move to another position needs side, "
+        "to_position, to_side",
+        "data.json: techniques[4] (Bridge): a move to another position needs a position "
+        "or from_position",
+        "data.json: techniques[5] (Upa): 'side' must be one of top, bottom",
+        "data.json: techniques[6] (Omoplata): techniques in 'submissions' must all have "
+        "a sub_category or none"
+    ]
+
+
+def test_long_error_lists_are_cut_short(data_dir):
+    techniques = [{"name": f"Move {number}", "category": "drills", "position": "nowhere"}
+                  for number in range(MAX_REPORTED_ERRORS + 5)]
+    reported = errors(data_dir, techniques=techniques)
+    assert len(reported) == MAX_REPORTED_ERRORS + 1
+    assert reported[-1] == "... and 5 more"
+
+
+def test_missing_or_malformed_files(tmp_path, data_dir):
+    with pytest.raises(ValueError, match="dataset.json is missing"):
+        load_reference(str(tmp_path / "empty"))
+    with open(os.path.join(data_dir, "data.json"), "w") as f:
+        f.write("{broken")
+    with pytest.raises(ValueError, match="Error reading reference file data.json"):
+        load_reference(data_dir)
+
+
+def test_bundled_dataset_is_valid(tmp_path):
+    reference, source = load_reference(snapshot_path=str(tmp_path / "bundled.pickle"))
+    assert source == "compiled"
+    assert reference.positions and reference.techniques and reference.concepts
@@ -0,0 +1,93 @@
+"""Related notes by shared tags and category on every storage backend."""
+
+import random
+
+import pytest
+
+from src.log_storage import LogNoteStorage
+from src.note_storage import JsonNoteStorage
+from src.notes_manager import NotesManager
+from src.sqlite_storage import SQLiteNoteStorage
+
+BACKENDS = {
+    "json": lambda path: JsonNoteStorage(str(path / "notes")),
+    "sqlite": lambda path: SQLiteNoteStorage(str(path / "notes.db")),
+    "log": lambda path: LogNoteStorage(str(path / "log"))
+}
+
+TAGS = ["guard", "mount", "back", "choke", "armlock", "sweep", "pass", "escape"]
+CATEGORIES = ["technique", "drill", "competition"]
+
+
+def make_note(number, tags, category):
+    return {"id": f"note_{number:03d}", "title": f"Note {number}", "content": "",
+            "tags": tags, "category": category,
+            "created_at": f"2026-01-01T10:{number // 60:02d}:{number % 60:02d}",
+            "updated_at": "2026-01-01T10:00:00"}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def storage(request, tmp_path):
+    storage = BACKENDS[request.param](tmp_path)
+    yield storage
+    if hasattr(storage, "close"):
+        storage.close()
+
+
+def scan(notes, note, k, scoring):
+    """Score every other note directly, as the posting lists must agree with."""
+    tags = set(note["tags"])
+    scored = []
+    for other in notes:
+        if other["id"] == note["id"]:
+            continue
+        common = len(tags & set(other["tags"]))
+        same_category = other["category"] == note["category"]
+        if not common and not same_category:
+            continue
+        value = common / len(tags | set(other["tags"])) if scoring == "jaccard" and common else common
+        scored.append(((value, same_category, other["created_at"]), other["id"]))
+    return [note_id for _, note_id in sorted(scored, reverse=True)[:k]]
+
+
+def test_most_shared_tags_rank_first(storage, tmp_path):
+    storage.put_many([
+        make_note(1, ["guard", "sweep", "choke"], "technique"),
+        make_note(2, ["guard", "sweep"], "drill"),
+        make_note(3, ["guard"], "technique"),
+        make_note(4, ["guard"], "drill"),
+        make_note(5, [], "technique"),
+        make_note(6, ["mount"], "competition")
+    ])
+    manager = NotesManager(str(tmp_path / "notes"), storage=storage)
+    related = manager.get_related_notes("note_001")
+    assert [note["id"] for note in related] == ["note_002", "note_003", "note_004", "note_005"]
+    assert related[0]["common_tags"] == ["guard", "sweep"]
+    assert related[0]["match_type"] == "tags" and related[0]["score"] == 2
+    # A shared category breaks ties between notes sharing as many tags
+    assert related[1]["match_type"] == "category"
+    assert related[3]["common_tags"] == [] and related[3]["score"] == 0
+    assert [note["id"] for note in manager.get_related_notes("note_001", k=2)] == [
+        "note_002", "note_003"]
+
+
+@pytest.mark.parametrize("scoring", ["shared", "jaccard"])
+def test_top_k_matches_scoring_every_note(storage, tmp_path, scoring):
+    rng = random.Random(4)
+    notes = [make_note(number, rng.sample(TAGS, rng.randint(0, 4)), rng.choice(CATEGORIES))
+             for number in range(150)]
+    storage.put_many(notes)
+    manager = NotesManager(str(tmp_path / "notes"), storage=storage)
+    for note in notes[:20]:
+        for k in (1, 5, 40):
+            related = manager.get_related_notes(note["id"], k=k, scoring=scoring)
+            assert [other["id"] for other in related] == scan(notes, note, k, scoring)
+
+
+def test_unknown_notes_and_bad_arguments(storage, tmp_path):
+    storage.put(make_note(1, ["guard"], "technique"))
+    manager = NotesManager(str(tmp_path / "notes"), storage=storage)
+    assert manager.get_related_notes("missing") == []
+    assert manager.get_related_notes("note_001", k=0) == []
+    with pytest.raises(ValueError):
+        manager.get_related_notes("note_001", scoring="cosine")
@@ -0,0 +1,165 @@
+"""Response cache: keys, expiry, the disk layer and single-flight."""
+
+import threading
+import time
+
+from src.response_cache import ResponseCache, make_key
+
+
+def run_concurrently(count, target):
+    """Run target() in count threads started together; return their results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return results
+
+
+def test_key_ignores_case_punctuation_and_spacing():
+    key = make_key("gpt-4o-mini", 0.7, "system", "What is a kimura?")
+    assert make_key("gpt-4o-mini", 0.7, "system", "  what IS a   Kimura ") == key
+    assert make_key("gpt-4o-mini", 0.7, "system", "What is an armbar?") != key
+    assert make_key("gpt-4o", 0.7, "system", "What is a kimura?") != key
+    assert make_key("gpt-4o-mini", 0.7, "other system", "What is a kimura?") != key
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttl=60)
+    cache.store("key", "answer", 1.5)
+    assert cache.lookup("key") == "answer"
+
+    cache._entries["key"] = ("answer", 1.5, time.time() - 61)
+    assert cache.lookup("key") is None
+
+
+def test_memory_layer_is_bounded():
+    cache = ResponseCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.store(key, key.upper(), 0.1)
+    assert cache.lookup("a") is None
+    assert cache.lookup("c") == "C"
+
+
+def test_disk_layer_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache" / "responses.db")
+    ResponseCache(path=path).store("key", "answer", 2.0)
+
+    other = ResponseCache(path=path)
+    assert other.lookup("key") == "answer"
+    assert other.stats()["disk_hits"] == 1
+    assert other.lookup("key") == "answer"
+    assert other.stats()["memory_hits"] == 1
+
+
+def test_identical_requests_are_computed_once():
+    cache = ResponseCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    results = run_concurrently(8, lambda: cache.get_or_compute("key", compute))
+    assert results == ["answer"] * 8
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["collapsed"] + stats["memory_hits"] == 7
+
+
+def test_waiters_compute_themselves_when_the_first_caller_fails():
+    cache = ResponseCache()
+    calls = []
+    lock = threading.Lock()
+
+    def compute():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        time.sleep(0.1)
+        if first:
+            raise RuntimeError("upstream failed")
+        return "answer"
+
+    results = run_concurrently(4, lambda: cache.get_or_compute("key", compute))
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    assert results.count("answer") == 3
+    # After the failure one waiter computes again and the rest share its answer
+    assert len(calls) == 2
+    assert cache.lookup("key") == "answer"
+
+
+def test_release_without_keep_answers_waiters_but_caches_nothing():
+    cache = ResponseCache()
+    assert cache.claim("key") is None
+
+    waiter = []
+    thread = threading.Thread(target=lambda: waiter.append(cache.claim("key")))
+    thread.start()
+    time.sleep(0.05)
+    cache.release("key", "personal answer", 1.0, keep=False)
+    thread.join(timeout=30)
+
+    assert waiter == ["personal answer"]
+    assert cache.lookup("key") is None
+
+
+def test_failed_claim_lets_the_next_caller_compute():
+    cache = ResponseCache()
+    assert cache.claim("key") is None
+    cache.release("key", None)
+    assert cache.claim("key") is None
+    cache.release("key", "answer", 0.5)
+    assert cache.lookup("key") == "answer"
+
+
+def test_waiters_stop_waiting_after_the_timeout():
+    cache = ResponseCache(wait_timeout=0.1)
+    assert cache.claim("key") is None
+
+    started = time.perf_counter()
+    assert cache.claim("key") is None
+    assert time.perf_counter() - started < 5
+    assert cache.stats()["timeouts"] == 1
+
+    # The caller that gave up computes the answer, and its release answers the rest
+    waiter = []
+    thread = threading.Thread(target=lambda: waiter.append(cache.claim("key", timeout=30)))
+    thread.start()
+    time.sleep(0.05)
+    cache.release("key", "answer", 1.0)
+    thread.join(timeout=30)
+    assert waiter == ["answer"]
+    # The stuck caller finishing later does no harm
+    cache.release("key", "late answer", 1.0)
+    assert cache.lookup("key") == "late answer"
+
+
+def test_empty_answers_are_not_cached(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.db"))
+    assert cache.claim("key") is None
+    cache.release("key", "", 1.0)
+    assert cache.lookup("key") is None
+    assert cache.claim("key") is None
+    cache.release("key", None)
+
+
+def test_memory_hits_do_not_wait_for_the_disk(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.db"))
+    cache.store("key", "answer", 1.0)
+    with cache._db_lock:
+        # A slow disk read or write is in progress on another thread
+        result = run_concurrently(1, lambda: cache.lookup("key"))
+    assert result == ["answer"]
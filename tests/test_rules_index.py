@@ -0,0 +1,123 @@
+"""Rule document ingestion, its chunk cache, and rule search."""
+
+import json
+import os
+
+import pytest
+
+from src import rules_index
+from src.rules_index import CHUNK_VERSION, RulesIndex, ingest_rules
+
+HANDOUT = """# Knee Reaping Handout
+
+## Definition
+Knee reaping is placing the thigh behind the opponent's leg and the foot
+beyond the midline while applying pressure on the knee.
+
+## Brown and black belts
+Crossing the midline is permitted provided no twisting pressure is applied.
+"""
+
+
+@pytest.fixture
+def rules_dir(tmp_path):
+    with open(tmp_path / "Reaping_Rules.md", "w") as f:
+        f.write(HANDOUT)
+    with open(tmp_path / "README.md", "w") as f:
+        f.write("# Project\nKnee reaping is mentioned here but this is not a rule document.")
+    return tmp_path
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Record the Markdown documents chunked by ingest_rules."""
+    sources = []
+    chunk_markdown = rules_index._chunk_markdown
+
+    def counting(text, source):
+        sources.append(source)
+        return chunk_markdown(text, source)
+
+    monkeypatch.setattr(rules_index, "_chunk_markdown", counting)
+    return sources
+
+
+def cache_path(rules_dir):
+    return str(rules_dir / ".rules_chunks.json")
+
+
+def test_documents_are_chunked_once_and_then_cached(rules_dir, parsed):
+    chunks, report = ingest_rules(str(rules_dir))
+    assert report == {"Reaping_Rules.md": "parsed"}
+    assert [chunk["heading"] for chunk in chunks] == ["Definition", "Brown and black belts"]
+    assert chunks[0]["id"] == "Reaping_Rules.md#1" and chunks[0]["page"] is None
+
+    assert ingest_rules(str(rules_dir)) == (chunks, {"Reaping_Rules.md": "cached"})
+    assert parsed == ["Reaping_Rules.md"]
+
+
+def test_new_mtime_with_the_same_content_keeps_the_cache_file(rules_dir, parsed):
+    ingest_rules(str(rules_dir))
+    written = os.stat(cache_path(rules_dir)).st_mtime_ns
+    os.utime(rules_dir / "Reaping_Rules.md", ns=(1, 1))
+
+    assert ingest_rules(str(rules_dir))[1] == {"Reaping_Rules.md": "cached"}
+    assert parsed == ["Reaping_Rules.md"]
+    assert os.stat(cache_path(rules_dir)).st_mtime_ns == written
+    with open(cache_path(rules_dir)) as f:
+        assert "mtime" not in f.read()
+
+
+def test_changed_and_removed_documents_update_the_cache(rules_dir):
+    ingest_rules(str(rules_dir))
+    with open(rules_dir / "Reaping_Rules.md", "a") as f:
+        f.write("\n## Children\nReaping is a severe foul.\n")
+    chunks, report = ingest_rules(str(rules_dir))
+    assert report == {"Reaping_Rules.md": "parsed"}
+    assert chunks[-1]["heading"] == "Children"
+
+    os.remove(rules_dir / "Reaping_Rules.md")
+    assert ingest_rules(str(rules_dir)) == ([], {})
+    with open(cache_path(rules_dir)) as f:
+        assert json.load(f)["documents"] == {}
+
+
+def test_cache_from_another_chunk_version_is_rebuilt(rules_dir, parsed):
+    ingest_rules(str(rules_dir))
+    with open(cache_path(rules_dir)) as f:
+        stored = json.load(f)
+    stored["version"] = CHUNK_VERSION + 1
+    with open(cache_path(rules_dir), "w") as f:
+        json.dump(stored, f)
+    assert ingest_rules(str(rules_dir))[1] == {"Reaping_Rules.md": "parsed"}
+    assert parsed == ["Reaping_Rules.md"] * 2
+
+
+def test_cached_pdfs_are_used_without_pypdf(rules_dir, monkeypatch):
+    with open(rules_dir / "chart.pdf", "wb") as f:
+        f.write(b"%PDF-1.4 not a real document")
+    monkeypatch.setattr(rules_index, "PdfReader", None)
+    assert ingest_rules(str(rules_dir))[1]["chart.pdf"].startswith("skipped")
+
+    # A cache made where pypdf was installed
+    with open(cache_path(rules_dir)) as f:
+        stored = json.load(f)
+    chunk = {"id": "chart.pdf#1", "source": "chart.pdf", "page": 1, "heading": "",
+             "text": "Slam is a severe foul"}
+    stored["documents"]["chart.pdf"] = {
+        "sha256": rules_index._file_hash(str(rules_dir / "chart.pdf")), "chunks": [chunk]}
+    with open(cache_path(rules_dir), "w") as f:
+        json.dump(stored, f)
+    chunks, report = ingest_rules(str(rules_dir))
+    assert report["chart.pdf"] == "cached" and chunk in chunks
+
+
+def test_search_needs_most_of_the_question(rules_dir):
+    index = RulesIndex(str(rules_dir), min_coverage=0.6)
+    results = index.search("Is crossing the midline permitted for brown belts?")
+    assert results[0]["heading"] == "Brown and black belts"
+    assert index.search("How do I finish a kimura from the knee cut pass?") == []
+
+    context = index.context_message("Can a brown belt cross the midline with the knee?")
+    assert "[Reaping_Rules.md] Brown and black belts: Crossing the midline" in context
+    assert RulesIndex(str(rules_dir), k=0).context_message("midline") is None
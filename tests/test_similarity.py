@@ -0,0 +1,105 @@
+"""Content similarity between notes."""
+
+import pytest
+
+from src.notes_manager import NotesManager
+from src.similarity import ContentSimilarityIndex
+
+KIMURA = "Kimura from closed guard: break the posture, figure four grip on the wrist, rotate the shoulder"
+KIMURA_AGAIN = "Kimura drill: figure four grip on the wrist, break the posture and rotate the shoulder"
+KIMURA_SIDE = "From side control, trap the far wrist with a figure four grip and finish the kimura"
+PASSING = "Torreando pass: grip the pants, push the knees to the mat and step around the legs"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return NotesManager(str(tmp_path / "notes"))
+
+
+def similar_ids(manager, note_id):
+    return [note["id"] for note in manager.get_similar_notes(note_id)]
+
+
+def test_nearest_note_ranks_first(manager):
+    kimura = manager.save_note("Kimura", KIMURA)
+    again = manager.save_note("Kimura drill", KIMURA_AGAIN)
+    side = manager.save_note("Side control kimura", KIMURA_SIDE)
+    passing = manager.save_note("Torreando", PASSING)
+
+    similar = manager.get_similar_notes(kimura)
+    assert [note["id"] for note in similar[:2]] == [again, side]
+    assert passing not in [note["id"] for note in similar]
+    assert similar[0]["similarity"] > similar[1]["similarity"]
+    assert similar[0]["title"] == "Kimura drill"
+
+
+def test_deleted_note_drops_out(manager):
+    kimura = manager.save_note("Kimura", KIMURA)
+    again = manager.save_note("Kimura drill", KIMURA_AGAIN)
+    side = manager.save_note("Side control kimura", KIMURA_SIDE)
+    assert similar_ids(manager, kimura)[0] == again
+
+    manager.delete_note(again)
+    assert similar_ids(manager, kimura) == [side]
+    assert manager.get_similar_notes(again) == []
+
+
+def test_edited_note_is_reranked(manager):
+    kimura = manager.save_note("Kimura", KIMURA)
+    again = manager.save_note("Kimura drill", KIMURA_AGAIN)
+    side = manager.save_note("Side control kimura", KIMURA_SIDE)
+    assert similar_ids(manager, kimura) == [again, side]
+
+    manager.update_note(again, content=PASSING)
+    assert similar_ids(manager, kimura) == [side]
+
+    manager.update_note(side, content=KIMURA)
+    assert similar_ids(manager, kimura)[0] == side
+
+
+def test_unrelated_and_unknown_notes_have_no_neighbours():
+    index = ContentSimilarityIndex()
+    index.add("a", KIMURA)
+    index.add("b", PASSING)
+    assert index.similar("a") == []
+    assert index.similar("missing") == []
+
+
+def test_candidates_sharing_more_bands_are_kept():
+    index = ContentSimilarityIndex(max_candidates=1)
+    index.add("query", KIMURA)
+    # Notes sharing only the opening words collide with the query in few bands
+    opening = " ".join(KIMURA.split()[:6])
+    for number in range(20):
+        index.add(f"filler{number}", f"{opening} {number}w {number}x {number}y {number}z")
+    index.add("near", KIMURA_AGAIN)
+    assert [doc_id for doc_id, _ in index.similar("query")] == ["near"]
+
+
+def test_removed_terms_leave_the_vocabulary():
+    index = ContentSimilarityIndex()
+    index.add("a", KIMURA)
+    size = len(index._vocabulary)
+    index.add("b", f"{PASSING} version0")
+    peak = len(index._doc_freq)
+    for version in range(1, 10):
+        index.add("b", f"{PASSING} version{version}")
+    # Terms dropped by an edit free their ids for the new ones
+    assert len(index._doc_freq) == peak
+    index.remove("b")
+    assert len(index._vocabulary) == size
+
+
+def test_closed_manager_stops_listening(manager):
+    kimura = manager.save_note("Kimura", KIMURA)
+    manager.save_note("Kimura drill", KIMURA_AGAIN)
+    catalog = manager.storage._catalog
+    listeners = len(catalog._listeners)
+    assert similar_ids(manager, kimura)
+    assert len(catalog._listeners) == listeners + 1
+
+    manager.close()
+    assert len(catalog._listeners) == listeners
+    # A closed manager builds its index again when next asked
+    assert similar_ids(manager, kimura)
+    manager.close()
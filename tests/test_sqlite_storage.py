@@ -0,0 +1,125 @@
+"""SQLite note storage: parity with the JSON backend and schema migrations."""
+
+import random
+import sqlite3
+
+import pytest
+
+from src.note_storage import JsonNoteStorage
+from src.sqlite_storage import _MIGRATIONS, SQLiteNoteStorage, migrate_json_to_sqlite
+
+WORDS = ["guard", "guards", "mount", "sweep", "sweeps", "choke", "armbar", "pass", "passing",
+         "escape", "bridge", "frame", "status", "this", "collar", "half_guard"]
+TAGS = ["drill", "competition", "gi", "nogi", "fundamentals"]
+
+
+def indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def backends(tmp_path):
+    """Return a JSON and a SQLite storage holding the same random notebook."""
+    rng = random.Random(7)
+    notes = []
+    for number in range(120):
+        notes.append({
+            "id": f"note_{number:03d}",
+            "title": " ".join(rng.choices(WORDS, k=3)),
+            "content": " ".join(rng.choices(WORDS, k=30)),
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "category": rng.choice(["technique", "drill", "general"]),
+            "created_at": f"2026-01-{number % 28 + 1:02d}T10:00:00",
+            "updated_at": "2026-02-01T10:00:00",
+            "source": "import" if number % 10 == 0 else None
+        })
+    json_storage = JsonNoteStorage(str(tmp_path / "notes"))
+    json_storage.put_many(notes)
+    assert migrate_json_to_sqlite(str(tmp_path / "notes"), str(tmp_path / "notes.db")) == 120
+    sqlite_storage = SQLiteNoteStorage(str(tmp_path / "notes.db"))
+    yield json_storage, sqlite_storage
+    sqlite_storage.close()
+
+
+def test_migrated_notes_round_trip(backends):
+    json_storage, sqlite_storage = backends
+    assert sorted(sqlite_storage.iter_notes(), key=lambda note: note["id"]) == sorted(
+        json_storage.iter_notes(), key=lambda note: note["id"])
+    assert sqlite_storage.categories() == json_storage.categories()
+
+
+def test_filters_and_search_match_the_json_backend(backends):
+    json_storage, sqlite_storage = backends
+    for tag in TAGS + ["unused"]:
+        for category in (None, "drill"):
+            assert sqlite_storage.list_metadata(category=category, tag=tag) == \
+                json_storage.list_metadata(category=category, tag=tag)
+        assert sorted(sqlite_storage.ids_with_tag(tag)) == sorted(json_storage.ids_with_tag(tag))
+    assert sqlite_storage.ids_in_category("technique", limit=5) == \
+        json_storage.ids_in_category("technique", limit=5)
+
+    for query in ["guard", "sweeps", "passing", "status this", "half_guard", "frame OR collar",
+                  "choke armbar bridge"]:
+        found = {note["id"] for note in sqlite_storage.search(query)}
+        assert found == {note["id"] for note in json_storage.search(query)}
+
+
+def test_edits_replace_tags_and_search_terms(backends):
+    _, storage = backends
+    note = dict(storage.get("note_001"), title="Berimbolo", tags=["spin"], content="Invert")
+    storage.put(note)
+    assert storage.ids_with_tag("spin") == ["note_001"]
+    assert [found["id"] for found in storage.search("berimbolo")] == ["note_001"]
+    storage.delete("note_001")
+    assert storage.ids_with_tag("spin") == [] and storage.search("berimbolo") == []
+
+
+def user_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_new_database_starts_at_the_latest_version(tmp_path):
+    db_path = str(tmp_path / "notes.db")
+    SQLiteNoteStorage(db_path).close()
+    assert user_version(db_path) == len(_MIGRATIONS)
+    assert "idx_notes_created_id" in indexes(db_path)
+    assert "idx_notes_created_at" not in indexes(db_path)
+
+
+def test_database_from_before_migrations_is_upgraded_once(tmp_path):
+    db_path = str(tmp_path / "notes.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE notes (
+            rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, title TEXT NOT NULL,
+            content TEXT NOT NULL, tags TEXT NOT NULL DEFAULT '[]',
+            category TEXT NOT NULL DEFAULT 'general', created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL, extra TEXT
+        );
+        CREATE INDEX idx_notes_created_at ON notes (created_at);
+        CREATE INDEX idx_notes_category ON notes (category);
+        INSERT INTO notes (id, title, content, created_at, updated_at)
+            VALUES ('note_1', 'Kimura', 'Figure four', '2026-01-01', '2026-01-01');
+    """)
+    conn.close()
+
+    storage = SQLiteNoteStorage(db_path)
+    try:
+        assert storage.get("note_1")["title"] == "Kimura"
+    finally:
+        storage.close()
+    assert user_version(db_path) == len(_MIGRATIONS)
+    assert not {"idx_notes_created_at", "idx_notes_category"} & indexes(db_path)
+
+    # Opening it again finds nothing left to migrate
+    SQLiteNoteStorage(db_path).close()
+    assert user_version(db_path) == len(_MIGRATIONS)
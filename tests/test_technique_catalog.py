@@ -0,0 +1,80 @@
+"""Indexed technique catalog: lookups, combined filters and name search."""
+
+import pickle
+
+import pytest
+
+from src.technique_catalog import TechniqueCatalog, Technique
+
+
+def technique(name, category, position=None, from_position=None, target=None, type=None):
+    return Technique(name=name, category=category, sub_category=None, position=position,
+                     from_position=from_position, target=target, type=type, side=None,
+                     to_position=None, to_side=None)
+
+
+@pytest.fixture
+def catalog():
+    return TechniqueCatalog([
+        technique("Kimura", "submissions", position="closed_guard", target="arm", type="lock"),
+        technique("Armbar", "submissions", position="mount", target="arm", type="lock"),
+        technique("Triangle Choke", "submissions", position="closed_guard", target="neck",
+                  type="choke"),
+        technique("Rear Naked Choke", "submissions", position="back_control", target="neck",
+                  type="choke"),
+        technique("Scissor Sweep", "sweeps", from_position="closed_guard"),
+        technique("Mata-Leão Drill", "drills")
+    ], aliases={"Rear Naked Choke": ["RNC", "Mata Leão"]})
+
+
+def names(techniques):
+    return [technique["name"] for technique in techniques]
+
+
+def test_lookup_is_case_insensitive_and_misses_are_empty(catalog):
+    assert names(catalog.lookup("target", "Neck")) == ["Triangle Choke", "Rear Naked Choke"]
+    assert catalog.lookup("target", "leg") == ()
+
+
+def test_sweeps_are_found_by_the_position_they_start_from(catalog):
+    assert names(catalog.lookup("position", "closed_guard")) == [
+        "Kimura", "Triangle Choke", "Scissor Sweep"]
+
+
+def test_find_combines_criteria(catalog):
+    assert names(catalog.find(position="closed_guard", type="choke")) == ["Triangle Choke"]
+    assert catalog.find(position="mount", type="choke") == ()
+    assert len(catalog.find()) == 6
+
+
+def test_results_are_read_only_and_omit_empty_fields(catalog):
+    kimura = catalog.lookup("type", "lock")[0]
+    assert "sub_category" not in kimura
+    with pytest.raises(TypeError):
+        kimura["name"] = "Americana"
+
+
+def test_search_lists_names_containing_the_query_first(catalog):
+    assert names(catalog.search("choke")) == ["Triangle Choke", "Rear Naked Choke"]
+    assert names(catalog.search("CHO")) == ["Triangle Choke", "Rear Naked Choke"]
+    # Too short to use the trigram index, so every name is checked
+    assert names(catalog.search("ar")) == ["Armbar", "Rear Naked Choke"]
+    assert names(catalog.search("mata-leão")) == ["Mata-Leão Drill", "Rear Naked Choke"]
+
+
+def test_search_adds_close_spellings_and_aliases(catalog):
+    assert names(catalog.search("kimora")) == ["Kimura"]
+    assert names(catalog.search("rnc")) == ["Rear Naked Choke"]
+    assert catalog.search("guillotine") == ()
+
+
+def test_search_limit(catalog):
+    assert len(catalog.search("")) == 6
+    assert names(catalog.search("choke", limit=1)) == ["Triangle Choke"]
+
+
+def test_catalog_survives_pickling(catalog):
+    copy = pickle.loads(pickle.dumps(catalog))
+    assert copy.search("choke") == catalog.search("choke")
+    assert copy.find(position="closed_guard", type="choke") == catalog.find(
+        position="closed_guard", type="choke")
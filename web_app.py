@@ -2,24 +2,91 @@
 """BJJ Notebook - Web Application."""
 
 import os
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from src.chat_handler import BJJChatHandler
+import json
+from flask import (
+    Flask, Response, render_template, request, jsonify, session, redirect, url_for,
+    stream_with_context
+)
+from src.chat_handler import ChatError, create_chat_handler, get_response_cache
+from src.chat_tools import ChatTools
+from src.autocomplete import Autocomplete, KINDS, MAX_SUGGESTIONS
+from src.conversation_store import ConversationStore
 from src.notes_manager import NotesManager
+from src.note_retrieval import NoteRetriever
+from src.rules_index import RulesIndex
 from src.bjj_reference import (
     get_all_positions,
     get_all_concepts,
     search_techniques,
-    BJJ_TECHNIQUES
+    search_positions,
+    get_technique_groups,
+    find_position_chains,
+    get_chain_positions
 )
+from src.position_graph import MAX_CHAINS, SIDES
+from src.bjj_rules import check_legality, get_legality_matrix, get_rule_divisions
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)  # For session management
+# Session cookies are signed with FLASK_SECRET_KEY.  Without it each process
+# picks a random key, so with several workers one worker would reject the
+# cookies another signed, and every restart would end all sessions.
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24)
 
 # Initialize managers
 notes_manager = NotesManager()
 
-# Chat handlers are not stored in session since they cannot be serialized
-# Each request creates a new handler which is fine for stateless API calls
+# Notes per page on the notes page and the notes listing API
+NOTES_PAGE_SIZE = 50
+MAX_NOTES_PAGE_SIZE = 500
+
+# Number of related and similar-content notes shown on a note's page
+RELATED_NOTES_LIMIT = 10
+SIMILAR_NOTES_LIMIT = 5
+
+# Chat history is kept server-side; the session cookie only carries the
+# conversation id.  Each request gets a lightweight handler that shares the
+# process-wide OpenAI client and is seeded with the stored history.
+conversation_store = ConversationStore(
+    max_conversations=int(os.getenv("CHAT_STORE_MAX_CONVERSATIONS", "1000")),
+    ttl=int(os.getenv("CHAT_STORE_TTL", str(24 * 3600))),
+    max_bytes=int(os.getenv("CHAT_STORE_MAX_MB", "64")) * 1024 * 1024,
+    path=os.getenv("CHAT_STORE_PATH") or None
+)
+
+# Excerpts of the user's own notes relevant to each chat message are sent
+# along with it; CHAT_NOTES_K=0 turns this off
+note_retriever = NoteRetriever(
+    notes_manager,
+    k=int(os.getenv("CHAT_NOTES_K", "3")),
+    max_tokens=int(os.getenv("CHAT_NOTES_TOKENS", "600"))
+)
+
+# Passages from the IBJJF rule documents relevant to each chat message are
+# sent along with it; CHAT_RULES_K=0 turns this off
+rules_index = RulesIndex(
+    k=int(os.getenv("CHAT_RULES_K", "3")),
+    max_tokens=int(os.getenv("CHAT_RULES_TOKENS", "500"))
+)
+
+# With tools on (CHAT_TOOLS, the default) the model looks up the reference,
+# the notes and the rules itself when it needs them, so nothing is retrieved
+# up front; with CHAT_TOOLS=false the retrievers above add it to each message
+if os.getenv("CHAT_TOOLS", "true").lower() == "true":
+    chat_tools = ChatTools(note_retriever, rules_index)
+    chat_retrievers = ()
+else:
+    chat_tools = None
+    chat_retrievers = (note_retriever, rules_index)
+
+# Search-as-you-type suggestions; note tags and titles follow note writes
+autocomplete = Autocomplete(notes_manager)
+
+def get_conversation_id():
+    """Return this session's conversation id, assigning a new one if needed."""
+    conversation_id = session.get('chat_id')
+    if not conversation_id:
+        conversation_id = session['chat_id'] = ConversationStore.new_id()
+    return conversation_id
 
 @app.route('/')
 def index():
@@ -49,25 +116,25 @@ def api_chat():
         return jsonify({'error': 'Message cannot be empty'}), 400
     
     try:
-        # Create a new chat handler for this request
-        # Note: This doesn't preserve conversation history between requests
-        # For production, consider using a database or Redis to store conversation state
-        chat_handler = BJJChatHandler()
+        # Resume the conversation from the server-side store
+        conversation_id = get_conversation_id()
+        chat_handler = create_chat_handler(conversation_store.get(conversation_id),
+                                           retrievers=chat_retrievers, tools=chat_tools)
         response = chat_handler.chat(user_message)
-        
-        # Store conversation in session for potential saving
-        if 'conversation' not in session:
-            session['conversation'] = []
-        session['conversation'].append({
-            'user': user_message,
-            'assistant': response
-        })
-        session.modified = True
+        conversation_store.append(conversation_id, user_message, response)
         
         return jsonify({
             'response': response,
+            'timings': chat_handler.last_timings,
             'success': True
         })
+    except ChatError as e:
+        # The turn is not stored, so the user can simply send it again
+        app.logger.error(f"Chat error: {str(e)}")
+        return jsonify({
+            'error': 'The assistant could not answer, please try again',
+            'success': False
+        }), 502
     except Exception as e:
         # Log the full error for debugging but return generic message to user
         app.logger.error(f"Chat error: {str(e)}")
@@ -76,17 +143,92 @@ def api_chat():
             'success': False
         }), 500
 
+# Ends a chat stream that failed part way; the partial answer is discarded
+STREAM_ERROR_EVENT = "event: error\ndata: {}\n\n".format(
+    json.dumps({'error': 'The assistant could not answer, please try again'}))
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """Stream a chat response as Server-Sent Events.
+    
+    Each piece of the response is sent as a `data: {"token": ...}` event as
+    soon as the model produces it, followed by a final `done` event, or by an
+    `error` event carrying {"error": ...} if the model failed.
+    """
+    data = request.get_json()
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+    
+    try:
+        conversation_id = get_conversation_id()
+        chat_handler = create_chat_handler(conversation_store.get(conversation_id),
+                                           retrievers=chat_retrievers, tools=chat_tools)
+    except Exception as e:
+        app.logger.error(f"Chat error: {str(e)}")
+        return jsonify({
+            'error': 'An error occurred while processing your request',
+            'success': False
+        }), 500
+    
+    def generate():
+        parts = []
+        tokens = chat_handler.chat_stream(user_message)
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except ChatError as e:
+            # The partial answer is not stored, so the user can send it again
+            app.logger.error(f"Chat error: {str(e)}")
+            yield STREAM_ERROR_EVENT
+            return
+        except Exception:
+            # A bug rather than the model failing; the client still gets an ending
+            app.logger.exception("Chat stream failed")
+            yield STREAM_ERROR_EVENT
+            return
+        finally:
+            # Drops the turn and closes the OpenAI stream if the client went away
+            tokens.close()
+        conversation_store.append(conversation_id, user_message, "".join(parts))
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # stop nginx from buffering the stream
+        }
+    )
+
+@app.route('/api/chat/cache', methods=['GET'])
+def chat_cache_stats():
+    """Report response cache hits, misses and saved latency."""
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({'enabled': False, 'success': True})
+    return jsonify({'enabled': True, 'stats': cache.stats(), 'success': True})
+
+@app.route('/api/chat/tools', methods=['GET'])
+def chat_tool_stats():
+    """Report calls and time spent per chat tool."""
+    if chat_tools is None:
+        return jsonify({'enabled': False, 'success': True})
+    return jsonify({'enabled': True, 'stats': chat_tools.stats(), 'success': True})
+
 @app.route('/api/chat/clear', methods=['POST'])
 def clear_chat():
     """Clear chat history."""
-    session.pop('conversation', None)
-    session.modified = True
+    conversation_store.clear(get_conversation_id())
     return jsonify({'success': True})
 
 @app.route('/api/chat/save', methods=['POST'])
 def save_conversation():
     """Save current conversation as a note."""
-    conversation = session.get('conversation', [])
+    conversation = conversation_store.get(get_conversation_id())
     
     if not conversation:
         return jsonify({'error': 'No conversation to save'}), 400
@@ -115,27 +257,91 @@ def save_conversation():
 
 @app.route('/reference')
 def reference():
-    """BJJ reference browser page."""
+    """BJJ reference browser page.
+    
+    With from and to (and optionally from_side and to_side) in the query
+    string, the page also shows the chains of techniques between them.
+    """
     positions = get_all_positions()
     concepts = get_all_concepts()
-    techniques = BJJ_TECHNIQUES
+    techniques = get_technique_groups()
+    chain_query = {field: request.args.get(field, '').strip()
+                   for field in ('from', 'to', 'from_side', 'to_side')}
+    chains = None
+    error_message = None
+    
+    if chain_query['from'] and chain_query['to']:
+        try:
+            chains = find_position_chains(chain_query['from'], chain_query['to'], limit=5,
+                                          start_side=chain_query['from_side'] or None,
+                                          goal_side=chain_query['to_side'] or None)
+        except ValueError as e:
+            error_message = str(e)
     
     return render_template('reference.html', 
                          positions=positions, 
                          concepts=concepts,
-                         techniques=techniques)
+                         techniques=techniques,
+                         chain_positions=get_chain_positions(),
+                         sides=SIDES,
+                         chain_query=chain_query,
+                         chains=chains,
+                         error_message=error_message)
 
 @app.route('/notes')
 def notes():
-    """Notes management page."""
-    all_notes = notes_manager.list_notes()
+    """Notes management page.
+    
+    Only the first page of notes is rendered; the rest is loaded from
+    /api/notes as the user scrolls.
+    """
+    category = request.args.get('category') or None
+    tag = request.args.get('tag') or None
+    first_page = notes_manager.list_notes(limit=NOTES_PAGE_SIZE, category=category, tag=tag)
     categories = notes_manager.get_all_categories()
     
     # Add default categories if no notes exist
     default_categories = ["general", "technique", "training", "competition", "concept", "chat"]
     all_categories = sorted(list(set(categories + default_categories)))
     
-    return render_template('notes.html', notes=all_notes, categories=all_categories)
+    return render_template('notes.html', notes=first_page, next_cursor=first_page.next_cursor,
+                         categories=all_categories, category=category, tag=tag,
+                         page_size=NOTES_PAGE_SIZE)
+
+@app.route('/api/notes', methods=['GET'])
+def list_notes_api():
+    """List note metadata a page at a time via API."""
+    limit = request.args.get('limit', NOTES_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor') or None
+    category = request.args.get('category') or None
+    tag = request.args.get('tag') or None
+    
+    if limit < 1 or limit > MAX_NOTES_PAGE_SIZE:
+        return jsonify({
+            'error': f'limit must be between 1 and {MAX_NOTES_PAGE_SIZE}',
+            'success': False
+        }), 400
+    
+    try:
+        page = notes_manager.list_notes(limit=limit, cursor=cursor, category=category, tag=tag)
+        return jsonify({
+            'success': True,
+            'notes': page,
+            'next_cursor': page.next_cursor
+        })
+    except ValueError as e:
+        # For validation errors, return the specific message
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 400
+    except Exception as e:
+        # Log the full error for debugging but return generic message to user
+        app.logger.error(f"List notes error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to list notes',
+            'success': False
+        }), 500
 
 @app.route('/notes/view/<note_id>')
 def view_note(note_id):
@@ -144,10 +350,34 @@ def view_note(note_id):
     if not note:
         return "Note not found", 404
     
-    # Get related notes
-    related_notes = notes_manager.get_related_notes(note_id)
+    # Get the most closely related notes
+    related_notes = notes_manager.get_related_notes(note_id, k=RELATED_NOTES_LIMIT)
+    similar_notes = notes_manager.get_similar_notes(note_id, k=SIMILAR_NOTES_LIMIT)
     
-    return render_template('view_note.html', note=note, related_notes=related_notes)
+    return render_template('view_note.html', note=note, related_notes=related_notes,
+                         similar_notes=similar_notes)
+
+@app.route('/api/notes/<note_id>/similar')
+def similar_notes_api(note_id):
+    """Get notes with similar content via API."""
+    k = request.args.get('k', SIMILAR_NOTES_LIMIT, type=int)
+    
+    if not notes_manager.get_note(note_id):
+        return jsonify({'error': 'Note not found', 'success': False}), 404
+    
+    try:
+        results = notes_manager.get_similar_notes(note_id, k=k)
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+    except Exception as e:
+        # Log the full error for debugging but return generic message to user
+        app.logger.error(f"Similar notes error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to find similar notes',
+            'success': False
+        }), 500
 
 @app.route('/api/notes', methods=['POST'])
 def create_note():
@@ -183,6 +413,44 @@ def create_note():
             'success': False
         }), 500
 
+@app.route('/api/notes/bulk', methods=['POST'])
+def bulk_import_notes():
+    """Import notes from a newline-delimited JSON request body.
+    
+    The body is read line by line as it arrives and a JSON line is streamed
+    back for every record, followed by a summary line.
+    """
+    def generate():
+        imported = failed = 0
+        try:
+            for report in notes_manager.import_notes(request.stream):
+                if report['success']:
+                    imported += 1
+                else:
+                    failed += 1
+                yield json.dumps(report) + "\n"
+        except Exception as e:
+            # Log the full error for debugging but return generic message to user
+            app.logger.error(f"Bulk import error: {str(e)}")
+            yield json.dumps({'error': 'Import aborted', 'success': False}) + "\n"
+        yield json.dumps({'done': True, 'imported': imported, 'failed': failed}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/notes/export')
+def export_notes():
+    """Stream every note as newline-delimited JSON."""
+    def generate():
+        try:
+            for note in notes_manager.export_notes():
+                yield json.dumps(note) + "\n"
+        except Exception as e:
+            # The response has already started, so the error can only be logged
+            app.logger.error(f"Export notes error: {str(e)}")
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=notes.jsonl'})
+
 @app.route('/api/notes/<note_id>', methods=['DELETE'])
 def delete_note(note_id):
     """Delete a note via API."""
@@ -208,22 +476,29 @@ def search():
     """Search techniques page."""
     query = request.args.get('q', '').strip()
     results = []
+    positions = []
     
     if query:
         results = search_techniques(query)
+        positions = search_positions(query)
     
-    return render_template('search.html', query=query, results=results)
+    return render_template('search.html', query=query, results=results, positions=positions)
 
 @app.route('/api/notes/search')
 def search_notes_api():
     """Search notes via API."""
     query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', type=int)
+    operator = request.args.get('op')
     
     if not query:
         return jsonify({'results': []})
     
+    if operator and operator.lower() not in ('and', 'or'):
+        return jsonify({'error': 'op must be "and" or "or"', 'success': False}), 400
+    
     try:
-        results = notes_manager.search_notes(query)
+        results = notes_manager.search_notes(query, limit=limit, operator=operator)
         return jsonify({
             'success': True,
             'results': results
@@ -236,6 +511,119 @@ def search_notes_api():
             'success': False
         }), 500
 
+@app.route('/api/rules/search')
+def search_rules_api():
+    """Search the IBJJF rule documents via API."""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 5, type=int)
+    
+    if not query:
+        return jsonify({'results': []})
+    
+    if limit < 1 or limit > 50:
+        return jsonify({'error': 'limit must be between 1 and 50', 'success': False}), 400
+    
+    try:
+        results = rules_index.search(query, limit=limit)
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+    except Exception as e:
+        # Log the full error for debugging but return generic message to user
+        app.logger.error(f"Search rules error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to search rules',
+            'success': False
+        }), 500
+
+@app.route('/rules')
+def rules():
+    """Competition legality page."""
+    divisions = get_rule_divisions()
+    division = request.args.get('division', 'adult_gi')
+    belt = request.args.get('belt', 'white')
+    matrix = []
+    error_message = None
+    
+    try:
+        matrix = get_legality_matrix(division, belt)
+    except ValueError as e:
+        error_message = str(e)
+    
+    return render_template('rules.html',
+                         divisions=divisions,
+                         division=division,
+                         belt=belt,
+                         matrix=matrix,
+                         error_message=error_message)
+
+@app.route('/api/rules/legality')
+def rules_legality_api():
+    """Look up technique and position legality via API."""
+    division = request.args.get('division', '').strip()
+    belt = request.args.get('belt', '').strip()
+    technique = request.args.get('technique', '').strip()
+    
+    if not division or not belt:
+        return jsonify({'error': 'division and belt are required', 'success': False}), 400
+    
+    try:
+        if technique:
+            return jsonify({'success': True, 'result': check_legality(division, belt, technique)})
+        return jsonify({'success': True, 'results': get_legality_matrix(division, belt)})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/api/reference/chains')
+def position_chains_api():
+    """Find the shortest chains of techniques between two positions via API."""
+    start = request.args.get('from', '').strip()
+    goal = request.args.get('to', '').strip()
+    limit = request.args.get('limit', 3, type=int)
+    
+    if not start or not goal:
+        return jsonify({'error': 'from and to are required', 'success': False}), 400
+    
+    if limit < 1 or limit > MAX_CHAINS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_CHAINS}', 'success': False}), 400
+    
+    try:
+        chains = find_position_chains(start, goal, limit=limit,
+                                      start_side=request.args.get('from_side') or None,
+                                      goal_side=request.args.get('to_side') or None)
+        return jsonify({'success': True, 'chains': chains})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/api/autocomplete')
+def autocomplete_api():
+    """Suggest techniques, positions, concepts, note tags and titles for a prefix.
+    
+    kinds is an optional comma-separated subset of technique, position,
+    concept, tag and title.
+    """
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    kinds = request.args.get('kinds')
+    
+    if limit < 1 or limit > MAX_SUGGESTIONS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SUGGESTIONS}', 'success': False}), 400
+    
+    kinds = [kind.strip() for kind in kinds.split(',') if kind.strip()] if kinds else KINDS
+    try:
+        results = autocomplete.complete(query, limit=limit, kinds=kinds)
+        return jsonify({'success': True, 'results': results})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    except Exception as e:
+        # Log the full error for debugging but return generic message to user
+        app.logger.error(f"Autocomplete error: {str(e)}")
+        return jsonify({
+            'error': 'Failed to load suggestions',
+            'success': False
+        }), 500
+
 def main():
     """Run the Flask application."""
     # Check if .env file exists
@@ -249,7 +637,8 @@ def main():
     
     # Run the Flask app
     # Note: debug=True should only be used in development
-    # For production, use a proper WSGI server like gunicorn
+    # For production, use a proper WSGI server like gunicorn; the JSON and
+    # SQLite note backends are safe to share between worker processes
     debug_mode = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     app.run(debug=debug_mode, host='0.0.0.0', port=5000)
 